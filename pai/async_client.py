@@ -0,0 +1,229 @@
+"""asyncio-native PAI client for overlapping Codex runs."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import shlex
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import metrics
+from response_cache import CACHE_USE
+from server import DEFAULT_CONFIG_PATH, DEFAULT_CONTEXT_PATH, PAIClient
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+
+
+class AsyncPAIClient(PAIClient):
+    """PAIClient whose ``chat``/``run_tool`` are coroutines backed by asyncio subprocesses.
+
+    Argument building, context loading, event parsing, metrics and traces
+    are inherited; only process management differs. Every Codex run acquires
+    the client-wide semaphore, so at most ``concurrency`` processes are alive
+    at once no matter how many coroutines are in flight.
+    """
+
+    def __init__(
+        self,
+        config_path: Path = DEFAULT_CONFIG_PATH,
+        context_path: Path = DEFAULT_CONTEXT_PATH,
+        *,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        super().__init__(config_path=config_path, context_path=context_path)
+        limit = concurrency or self.codex_cfg.get("max_concurrency") or DEFAULT_CONCURRENCY
+        self.concurrency = max(int(limit), 1)
+        self.timeout = timeout if timeout is not None else self.codex_cfg.get("timeout_seconds")
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def chat(  # type: ignore[override]
+        self,
+        prompt: str,
+        project: Optional[str] = None,
+        *,
+        timeout: Optional[float] = None,
+        cache_mode: str = CACHE_USE,
+        keep_raw: bool = False,
+    ) -> Dict[str, Any]:
+        payload = self._chat_payload(prompt, project)
+        LOGGER.debug("Executing async chat prompt via Codex CLI")
+        return await self._run_codex(payload, timeout=timeout, cache_mode=cache_mode, keep_raw=keep_raw)
+
+    async def run_tool(  # type: ignore[override]
+        self,
+        tool_name: str,
+        parameters: Dict[str, Any],
+        *,
+        timeout: Optional[float] = None,
+        cache_mode: str = CACHE_USE,
+        via_codex: bool = False,
+        keep_raw: bool = False,
+    ) -> Dict[str, Any]:
+        LOGGER.debug("Executing async tool: %s", tool_name)
+        if not self.tools.is_enabled(tool_name):
+            return self._stub_response(f"Tool {tool_name} is not enabled in config.json")
+        if not via_codex and self.tools.has_local(tool_name):
+            # The synchronous path already applies the timeout and records the tool metrics.
+            return await asyncio.to_thread(PAIClient.run_tool, self, tool_name, parameters, timeout=timeout)
+        prompt = f"Run tool {tool_name} with parameters: {json.dumps(parameters)}"
+        with metrics.labels(tool=tool_name):
+            with self.metrics.timer("tool_seconds", provider="codex"):
+                data = await self._run_codex(prompt, timeout=timeout, cache_mode=cache_mode, keep_raw=keep_raw)
+            status = "error" if data.get("error") else "ok"
+            self.metrics.inc("tool_calls_total", provider="codex", status=status)
+        return data
+
+    async def gather_chat(
+        self,
+        prompts: Iterable[str],
+        project: Optional[str] = None,
+        *,
+        timeout: Optional[float] = None,
+        concurrency: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Run many chat prompts concurrently; results keep the input order."""
+
+        return await self.gather(
+            [self.chat(prompt, project, timeout=timeout) for prompt in prompts],
+            concurrency=concurrency,
+        )
+
+    async def gather_tools(
+        self,
+        calls: Iterable[Tuple[str, Dict[str, Any]]],
+        *,
+        timeout: Optional[float] = None,
+        concurrency: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Run ``(tool_name, parameters)`` pairs concurrently; results keep the input order."""
+
+        return await self.gather(
+            [self.run_tool(name, params, timeout=timeout) for name, params in calls],
+            concurrency=concurrency,
+        )
+
+    async def gather(
+        self,
+        calls: Sequence[Awaitable[Dict[str, Any]]],
+        *,
+        concurrency: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Await client calls with an optional per-batch limit below the client-wide one.
+
+        A call that raises is turned into a stub response so one failure does
+        not cancel the rest of the batch.
+        """
+
+        batch_limit = asyncio.Semaphore(max(int(concurrency), 1)) if concurrency else None
+
+        async def _guarded(call: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+            try:
+                if batch_limit is None:
+                    return await call
+                async with batch_limit:
+                    return await call
+            except Exception as exc:  # pragma: no cover - runtime guard
+                LOGGER.exception("Batched Codex call failed: %s", exc)
+                return self._stub_response(f"Batched call failed: {exc}")
+
+        return list(await asyncio.gather(*(_guarded(call) for call in calls)))
+
+    async def _run_codex(  # type: ignore[override]
+        self,
+        prompt: str,
+        *,
+        timeout: Optional[float] = None,
+        cache_mode: str = CACHE_USE,
+        keep_raw: bool = False,
+    ) -> Dict[str, Any]:
+        # Cache entries hold no raw events, so ``keep_raw`` calls always run (and refresh).
+        cached = None if keep_raw else self._cache_lookup(prompt, cache_mode)
+        if cached is not None:
+            return cached
+        command = self.base_args + [prompt]
+        limit = timeout if timeout is not None else self.timeout
+        async with self._semaphore:
+            if self.pool is not None:
+                pooled = await asyncio.to_thread(self._run_pooled, prompt, limit, keep_raw=keep_raw)
+                if pooled is not None:
+                    return self._cache_store(prompt, cache_mode, pooled)
+            LOGGER.debug("Running Codex command: %s", shlex.join(command))
+            started = time.perf_counter()
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    env=self._codex_env(),
+                )
+            except FileNotFoundError as exc:
+                LOGGER.error("Codex CLI not found: %s", exc)
+                self.metrics.inc("codex_runs_total", status="missing")
+                return self._stub_response("Codex CLI not installed; install @openai/codex", stderr=str(exc))
+            spawn_seconds = time.perf_counter() - started
+            self.metrics.observe("codex_spawn_seconds", spawn_seconds, provider="exec")
+
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=limit)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                LOGGER.error("Codex CLI timed out after %ss", limit)
+                data = self._stub_response(f"Codex CLI timed out after {limit}s")
+                self._record_run(
+                    started,
+                    prompt,
+                    data,
+                    {"spawn": spawn_seconds},
+                    output_bytes=0,
+                    status="timeout",
+                    returncode=proc.returncode,
+                )
+                return data
+            except asyncio.CancelledError:
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+                raise
+
+        text = stdout.decode("utf-8", errors="replace")
+        returncode = proc.returncode if proc.returncode is not None else -1
+        data, parse_seconds = self._timed_parse(
+            returncode,
+            text,
+            stderr.decode("utf-8", errors="replace"),
+            keep_raw=keep_raw,
+        )
+        # communicate() gathers the output at once, so traces carry no per-event arrival offsets.
+        self._record_run(
+            started,
+            prompt,
+            data,
+            {"spawn": spawn_seconds, "parse": parse_seconds},
+            output_bytes=len(stdout),
+            lines=text.splitlines() if self.traces is not None else None,
+            returncode=returncode,
+        )
+        return self._cache_store(prompt, cache_mode, data)
+
+
+def run_batch(
+    prompts: Iterable[str],
+    project: Optional[str] = None,
+    *,
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """Synchronous helper for scripts: run ``prompts`` concurrently and return the results."""
+
+    async def _main() -> List[Dict[str, Any]]:
+        client = AsyncPAIClient(concurrency=concurrency, timeout=timeout)
+        return await client.gather_chat(list(prompts), project)
+
+    return asyncio.run(_main())
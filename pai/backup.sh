@@ -22,6 +22,16 @@ while [[ $# -gt 0 ]]; do
   esac
 done
 
+# Every Python module (server.py imports most of them at startup), the bin/ helpers, and the
+# memory archive with its summaries.md.
+BACKUP_PATHS=(context.md memory.md projects tools config.json pai.sh backup.sh cron_maintenance bin)
+for module in "${PAI_HOME}"/*.py; do
+  [[ -e "${module}" ]] && BACKUP_PATHS+=("$(basename "${module}")")
+done
+if [[ -d "${PAI_HOME}/archive/memory" ]]; then
+  BACKUP_PATHS+=(archive/memory)
+fi
+
 TIMESTAMP=$(date +%Y%m%d-%H%M%S)
 ARCHIVE_NAME="pai-${TIMESTAMP}.tar.gz"
 TARGET_PATH="${BACKUP_DIR}/${ARCHIVE_NAME}"
@@ -29,10 +39,10 @@ TARGET_PATH="${BACKUP_DIR}/${ARCHIVE_NAME}"
 {
   echo "[$(date --iso-8601=seconds)] Starting backup (dry_run=${DRY_RUN})"
   if [[ "${DRY_RUN}" == "true" ]]; then
-    echo "tar -czf ${TARGET_PATH} -C ${PAI_HOME} context.md memory.md projects tools config.json pai.sh server.py scheduler.py voice.py optimize_memory.py backup.sh"
+    echo "tar -czf ${TARGET_PATH} -C ${PAI_HOME} ${BACKUP_PATHS[*]}"
   else
     tar -czf "${TARGET_PATH}" \
-      -C "${PAI_HOME}" context.md memory.md projects tools config.json pai.sh server.py scheduler.py voice.py optimize_memory.py backup.sh || {
+      -C "${PAI_HOME}" "${BACKUP_PATHS[@]}" || {
         echo "Backup failed"
         exit 1
       }
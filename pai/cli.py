@@ -0,0 +1,13 @@
+"""Entry point used by ``pai.sh``.
+
+Python recompiles a script passed on the command line every run, but loads
+imported modules from cached bytecode, so keeping ``__main__`` this small
+lets each short CLI call reuse ``server``'s ``.pyc``.
+"""
+
+import sys
+
+import server
+
+if __name__ == "__main__":
+    sys.exit(server.main())
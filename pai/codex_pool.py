@@ -0,0 +1,239 @@
+"""Pool of warm interactive Codex sessions driven over pexpect."""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+import shlex
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Imported when a pool is first built: pexpect pulls in pty and inspect, which
+# one-shot CLI calls should not pay for.
+pexpect: Any = None
+
+LOGGER = logging.getLogger(__name__)
+
+# The prompt marker scripts/codex_tool_session.py waits for between turns, anchored to a
+# line of its own so reply text that mentions "codex>" does not end the turn early.
+PROMPT_PATTERN = r"(?m)^codex>\s*$"
+# Bracketed paste keeps a multi-line prompt together as one turn.
+PASTE_START = "\x1b[200~"
+PASTE_END = "\x1b[201~"
+DEFAULT_SIZE = 2
+DEFAULT_MAX_TURNS = 20
+DEFAULT_STARTUP_TIMEOUT = 30.0
+DEFAULT_TURN_TIMEOUT = 300.0
+
+
+class CodexPoolError(RuntimeError):
+    """Raised when a pooled session cannot start or finish a turn; callers fall back to exec."""
+
+
+class CodexSession:
+    """One long-lived ``codex exec --json -`` process answering prompts turn by turn."""
+
+    def __init__(self, command: List[str], env: Dict[str, str], *, startup_timeout: float) -> None:
+        LOGGER.debug("Starting pooled Codex session: %s", shlex.join(command))
+        try:
+            self.child = pexpect.spawn(
+                command[0],
+                command[1:],
+                encoding="utf-8",
+                codec_errors="replace",
+                env=env,
+                echo=False,
+                timeout=startup_timeout,
+                maxread=65536,
+            )
+            self.child.expect(PROMPT_PATTERN)
+        except (pexpect.ExceptionPexpect, OSError) as exc:
+            raise CodexPoolError(f"Codex session failed to start: {_summary(exc)}") from exc
+        # pexpect sleeps before every send by default; turns are latency-sensitive.
+        self.child.delaybeforesend = None
+        self.turns = 0
+        self.started = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return self.child.isalive()
+
+    def ask(self, prompt: str, timeout: float) -> str:
+        """Send one prompt and return the JSON event lines printed before the next prompt."""
+
+        try:
+            self.child.send(f"{PASTE_START}{prompt}{PASTE_END}")
+            self.child.sendline("")
+            self.child.expect(PROMPT_PATTERN, timeout=timeout)
+        except pexpect.TIMEOUT as exc:
+            raise CodexPoolError(f"Codex session timed out after {timeout}s") from exc
+        except (pexpect.EOF, pexpect.ExceptionPexpect, OSError) as exc:
+            raise CodexPoolError(f"Codex session exited mid-turn: {_summary(exc)}") from exc
+        self.turns += 1
+        return (self.child.before or "").replace("\r\n", "\n")
+
+    def close(self) -> None:
+        try:
+            if self.child.isalive():
+                self.child.sendline("exit")
+                self.child.expect(pexpect.EOF, timeout=2)
+        except (pexpect.ExceptionPexpect, OSError):
+            pass
+        finally:
+            self.child.close(force=True)
+
+
+class CodexSessionPool:
+    """Keeps up to ``size`` warm Codex sessions and hands each prompt to an idle one.
+
+    Sessions are started lazily (or eagerly via ``warm``), retired after
+    ``max_turns`` turns, and discarded on any error so the next caller gets
+    a fresh process. Callers that see ``CodexPoolError`` should fall back to
+    a one-shot ``codex exec`` run.
+    """
+
+    def __init__(
+        self,
+        command: List[str],
+        env: Dict[str, str],
+        *,
+        size: int = DEFAULT_SIZE,
+        max_turns: int = DEFAULT_MAX_TURNS,
+        startup_timeout: float = DEFAULT_STARTUP_TIMEOUT,
+        turn_timeout: float = DEFAULT_TURN_TIMEOUT,
+    ) -> None:
+        if not _import_pexpect():
+            raise CodexPoolError("The Codex session pool requires the 'pexpect' package")
+        self.command = command
+        self.env = env
+        self.size = max(size, 1)
+        self.max_turns = max(max_turns, 1)
+        self.startup_timeout = startup_timeout
+        self.turn_timeout = turn_timeout
+        self._idle: "queue.LifoQueue[CodexSession]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._live: List[CodexSession] = []
+        self._closed = False
+        self.stats = {"started": 0, "recycled": 0, "failed": 0, "turns": 0}
+        atexit.register(self.close)
+
+    def warm(self) -> int:
+        """Start sessions until ``size`` are idle; returns how many are ready."""
+
+        while self._idle.qsize() < self.size and len(self._live) < self.size:
+            try:
+                self._idle.put(self._start())
+            except CodexPoolError as exc:
+                LOGGER.warning("Could not warm Codex session: %s", exc)
+                break
+        return self._idle.qsize()
+
+    def run(self, prompt: str, *, timeout: Optional[float] = None) -> str:
+        """Run ``prompt`` on a pooled session and return its raw event output."""
+
+        if self._closed:
+            raise CodexPoolError("Codex session pool is closed")
+        limit = timeout if timeout is not None else self.turn_timeout
+        if not self._slots.acquire(timeout=limit):
+            raise CodexPoolError(f"No Codex session free within {limit}s")
+        session: Optional[CodexSession] = None
+        try:
+            session = self._checkout()
+            output = session.ask(prompt, limit)
+        except CodexPoolError:
+            with self._lock:
+                self.stats["failed"] += 1
+            if session is not None:
+                self._retire(session)
+            raise
+        else:
+            with self._lock:
+                self.stats["turns"] += 1
+            if session.turns >= self.max_turns or not session.alive:
+                self._retire(session, recycled=True)
+            else:
+                self._idle.put(session)
+            return output
+        finally:
+            self._slots.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, size=self.size, live=len(self._live), idle=self._idle.qsize())
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            sessions, self._live = self._live, []
+        for session in sessions:
+            session.close()
+
+    def _checkout(self) -> CodexSession:
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                return self._start()
+            if session.alive:
+                return session
+            self._retire(session)
+
+    def _start(self) -> CodexSession:
+        session = CodexSession(self.command, self.env, startup_timeout=self.startup_timeout)
+        with self._lock:
+            self._live.append(session)
+            self.stats["started"] += 1
+        return session
+
+    def _retire(self, session: CodexSession, *, recycled: bool = False) -> None:
+        with self._lock:
+            if session in self._live:
+                self._live.remove(session)
+            if recycled:
+                self.stats["recycled"] += 1
+        session.close()
+
+
+def _summary(exc: BaseException) -> str:
+    # pexpect exceptions embed a full dump of the child's state; keep the first line.
+    return (str(exc).splitlines() or [type(exc).__name__])[0]
+
+
+def _import_pexpect() -> bool:
+    global pexpect
+    if pexpect is None:
+        try:
+            import pexpect as module
+        except ModuleNotFoundError:  # pragma: no cover - optional dependency
+            return False
+        pexpect = module
+    return True
+
+
+def from_config(base_args: List[str], env: Dict[str, str], config: Dict[str, Any]) -> Optional[CodexSessionPool]:
+    """Build the pool when ``codex.pool.enabled`` (or ``PAI_CODEX_POOL=1``) is set."""
+
+    pool_cfg = config.get("codex", {}).get("pool", {})
+    enabled = os.getenv("PAI_CODEX_POOL")
+    if enabled is not None:
+        active = enabled.strip().lower() in {"1", "true", "yes", "on"}
+    else:
+        active = bool(pool_cfg.get("enabled", False))
+    if not active:
+        return None
+    if not _import_pexpect():
+        LOGGER.warning("codex.pool is enabled but pexpect is not installed; using one-shot exec")
+        return None
+    return CodexSessionPool(
+        # A trailing '-' keeps stdin open for follow-up prompts, as in codex_tool_session.py.
+        base_args + ["-"],
+        env,
+        size=int(pool_cfg.get("size", DEFAULT_SIZE)),
+        max_turns=int(pool_cfg.get("max_turns", DEFAULT_MAX_TURNS)),
+        startup_timeout=float(pool_cfg.get("startup_timeout_seconds", DEFAULT_STARTUP_TIMEOUT)),
+        turn_timeout=float(pool_cfg.get("turn_timeout_seconds", DEFAULT_TURN_TIMEOUT)),
+    )
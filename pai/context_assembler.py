@@ -0,0 +1,381 @@
+"""Assemble the Codex system prompt from PAI_HOME files with mtime-aware memoization."""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from context_budget import BudgetResult, pack_sections
+from optimize_memory import parse_sections
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from retrieval import RetrievalHit, RetrievalIndex
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_SECTIONS = 5
+DEFAULT_SUMMARY_LINES = 30
+DEFAULT_RETRIEVAL_TOP_K = 5
+DEFAULT_RETRIEVAL_MIN_SCORE = 0.1
+# Written by ``memory_store.MemoryStore.compact``; spelled out here so prompt building skips that import.
+SUMMARIES_PATH = Path("archive") / "memory" / "summaries.md"
+PROJECT_SLUG_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+# Section priorities: higher values are kept first when a budget applies.
+PRIORITY_HEADER = 100
+PRIORITY_CONTEXT = 90
+PRIORITY_PROJECT = 80
+PRIORITY_TOOLS = 60
+PRIORITY_MEMORY = 40
+PRIORITY_SUMMARIES = 30
+
+
+@dataclass
+class ContextSection:
+    """One named block of the system prompt and where it came from."""
+
+    name: str
+    text: str
+    priority: int
+    source: Optional[str] = None
+    recency: Optional[str] = None
+    required: bool = False
+    position: int = 0
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {"name": self.name, "source": self.source, "chars": len(self.text)}
+
+
+class FileMemo:
+    """Caches file contents (or values derived from them) keyed by (path, mtime, size).
+
+    A lookup costs one ``stat``; the file is only read again when its
+    modification time or size changes. Safe to share across daemon threads.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[Tuple[str, str], Tuple[Tuple[int, int], Any]] = {}
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def load(
+        self,
+        path: Path,
+        transform: Optional[Callable[[str], Any]] = None,
+        *,
+        tag: str = "text",
+    ) -> Any:
+        """Return ``transform(text)`` for ``path`` or ``None`` when the file is missing."""
+
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        key = (str(path), tag)
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        text = path.read_text(encoding="utf-8")
+        value = transform(text) if transform else text
+        with self._lock:
+            self.reads += 1
+            self._entries[key] = (stamp, value)
+        return value
+
+    def directory_stamp(self, path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+class ContextAssembler:
+    """Builds the prompt from context.md, project notes, the tool registry and memory.
+
+    Memory is the newest ``memory_sections`` of memory.md followed by the
+    newest ``summary_lines`` of ``archive/memory/summaries.md``, the
+    one-line summaries of sections that compaction moved out of the log.
+
+    Every piece is memoized through one ``FileMemo``, so daemon and batch
+    callers only touch disk for files that changed since the previous call.
+    With ``context.retrieval`` enabled and a query (the user's prompt), the
+    ``top_k`` memory, archive and project-note chunks most relevant to the
+    query are added after the newest memory sections.
+    """
+
+    def __init__(
+        self,
+        home: Path,
+        context_path: Path,
+        config: Optional[Dict[str, Any]] = None,
+        memo: Optional[FileMemo] = None,
+    ) -> None:
+        self.home = home
+        self.context_path = context_path
+        context_cfg = (config or {}).get("context", {})
+        self.include_project = bool(context_cfg.get("include_project", True))
+        self.include_tools = bool(context_cfg.get("include_tools", True))
+        self.memory_sections = int(context_cfg.get("memory_sections", DEFAULT_MEMORY_SECTIONS))
+        self.summary_lines = int(context_cfg.get("summary_lines", DEFAULT_SUMMARY_LINES))
+        budget = context_cfg.get("token_budget")
+        self.token_budget = int(budget) if budget else None
+        retrieval_cfg = context_cfg.get("retrieval", {})
+        self.retrieval_top_k = int(retrieval_cfg.get("top_k", DEFAULT_RETRIEVAL_TOP_K))
+        self.retrieval_min_score = float(retrieval_cfg.get("min_score", DEFAULT_RETRIEVAL_MIN_SCORE))
+        self.config = config or {}
+        self.memo = memo or FileMemo()
+        self._retriever: Optional["RetrievalIndex"] = None
+        self._retriever_loaded = False
+        self._retriever_lock = threading.Lock()
+        self._tool_files: Tuple[Optional[Tuple[int, int]], List[Path]] = (None, [])
+
+    def load_context(self, path: Optional[Path] = None) -> str:
+        context_path = path or self.context_path
+        text = self.memo.load(context_path)
+        if text is None:
+            LOGGER.error("Context file missing at %s", context_path)
+            raise FileNotFoundError(f"Context file not found: {context_path}")
+        return text
+
+    def sections(
+        self,
+        project: Optional[str],
+        context_path: Optional[Path] = None,
+        query: Optional[str] = None,
+    ) -> List[ContextSection]:
+        context_path = context_path or self.context_path
+        header = "Active project: none" if not project else f"Active project: {project}"
+        sections = [ContextSection("header", header, PRIORITY_HEADER, required=True)]
+        blocks = self.memo.load(context_path, split_markdown, tag="blocks")
+        if blocks is None:
+            LOGGER.error("Context file missing at %s", context_path)
+            raise FileNotFoundError(f"Context file not found: {context_path}")
+        for index, (title, text) in enumerate(blocks):
+            sections.append(
+                ContextSection(
+                    f"context:{title}",
+                    text,
+                    PRIORITY_CONTEXT,
+                    str(context_path),
+                    required=index == 0,
+                )
+            )
+        if project and self.include_project:
+            sections.extend(self._project_sections(project))
+        if self.include_tools:
+            tools_section = self._tools_section()
+            if tools_section is not None:
+                sections.append(tools_section)
+        recent = self._memory_sections() if self.memory_sections > 0 else []
+        sections.extend(recent)
+        summaries = self._summaries_section() if self.summary_lines > 0 else None
+        if summaries is not None:
+            sections.append(summaries)
+            recent = recent + [summaries]
+        retrieved = self._retrieved_sections(query, project, recent) if query else None
+        if retrieved:
+            sections.extend(retrieved)
+        for position, section in enumerate(sections):
+            section.position = position
+        return sections
+
+    def build(
+        self,
+        project: Optional[str],
+        context_path: Optional[Path] = None,
+        budget: Optional[int] = None,
+        query: Optional[str] = None,
+    ) -> BudgetResult:
+        """Rank the sections and pack them into ``budget`` (default ``context.token_budget``)."""
+
+        return pack_sections(self.sections(project, context_path, query), budget or self.token_budget)
+
+    def assemble(
+        self,
+        project: Optional[str],
+        context_path: Optional[Path] = None,
+        query: Optional[str] = None,
+    ) -> str:
+        return self.build(project, context_path, query=query).text
+
+    def _project_sections(self, slug: str) -> List[ContextSection]:
+        if not PROJECT_SLUG_PATTERN.match(slug):
+            LOGGER.warning("Ignoring project slug with unsupported characters: %s", slug)
+            return []
+        path = self.home / "projects" / f"{slug}.md"
+        blocks = self.memo.load(path, split_markdown, tag="blocks")
+        if blocks is None:
+            LOGGER.debug("No project notes at %s", path)
+            return []
+        sections = []
+        for index, (title, text) in enumerate(blocks):
+            body = f"## Active Project Notes ({slug})\n\n{text}" if index == 0 else text
+            sections.append(ContextSection(f"project:{slug}:{title}", body, PRIORITY_PROJECT, str(path)))
+        return sections
+
+    def _tools_section(self) -> Optional[ContextSection]:
+        tools_dir = self.home / "tools"
+        stamp = self.memo.directory_stamp(tools_dir)
+        if stamp is None:
+            return None
+        if self._tool_files[0] != stamp:
+            self._tool_files = (stamp, sorted(tools_dir.glob("*.md")))
+        lines = []
+        for path in self._tool_files[1]:
+            description = self.memo.load(path, _tool_description, tag="tool")
+            if description is None:
+                continue
+            lines.append(f"- `{path.stem}`: {description}" if description else f"- `{path.stem}`")
+        if not lines:
+            return None
+        return ContextSection(
+            "tools",
+            "## Available Tools\n\n" + "\n".join(lines),
+            PRIORITY_TOOLS,
+            str(tools_dir),
+        )
+
+    def _memory_sections(self) -> List[ContextSection]:
+        path = self.home / "memory.md"
+        parsed = self.memo.load(path, parse_sections, tag="sections")
+        if not parsed:
+            return []
+        recent = sorted(parsed, key=lambda item: item[0])[-self.memory_sections:]
+        return [
+            ContextSection(
+                f"memory:{heading}",
+                "\n".join([f"## Memory {heading}"] + lines).strip(),
+                PRIORITY_MEMORY,
+                str(path),
+                recency=heading,
+            )
+            for heading, lines in reversed(recent)
+        ]
+
+    def _summaries_section(self) -> Optional[ContextSection]:
+        path = self.home / SUMMARIES_PATH
+        lines = self.memo.load(path, summary_lines, tag="summaries")
+        if not lines:
+            return None
+        return ContextSection(
+            "memory:summaries",
+            "## Earlier Memory (summaries)\n\n" + "\n".join(lines[-self.summary_lines:]),
+            PRIORITY_SUMMARIES,
+            str(path),
+        )
+
+    def retriever(self) -> Optional["RetrievalIndex"]:
+        """The retrieval index, opened on first use; ``None`` when ``context.retrieval`` is off."""
+
+        with self._retriever_lock:
+            if not self._retriever_loaded:
+                import retrieval
+
+                self._retriever = retrieval.from_config(self.home, self.config)
+                self._retriever_loaded = True
+        return self._retriever
+
+    def _retrieved_sections(
+        self,
+        query: str,
+        project: Optional[str],
+        recent: List[ContextSection],
+    ) -> Optional[List[ContextSection]]:
+        """Top-k chunks for ``query`` not already in ``recent``; ``None`` when nothing was retrieved."""
+
+        index = self.retriever()
+        if index is None or self.retrieval_top_k <= 0:
+            return None
+        exclude = []
+        if project and self.include_project and PROJECT_SLUG_PATTERN.match(project):
+            # The active project's notes are already included in full.
+            exclude.append(str(self.home / "projects" / f"{project}.md"))
+        try:
+            hits = index.search(query, self.retrieval_top_k, min_score=self.retrieval_min_score, exclude_paths=exclude)
+        except Exception as exc:  # pragma: no cover - runtime guard; the prompt must still build
+            LOGGER.warning("Retrieval failed; using the newest memory sections only: %s", exc)
+            return None
+        # Sections of memory.md and summary lines that are already included are not repeated.
+        included = {section.recency for section in recent}
+        summarized = {
+            line for section in recent if section.name == "memory:summaries" for line in section.text.splitlines()
+        }
+        hits = [
+            hit
+            for hit in hits
+            if not (hit.kind == "memory" and hit.recency in included)
+            and not (hit.kind == "summary" and hit.text in summarized)
+        ]
+        if not hits:
+            return None
+        # Hits come best first and carry no recency, so packing keeps the most relevant ones.
+        return [ContextSection(f"retrieved:{hit.name}", _render_hit(hit), PRIORITY_MEMORY, hit.path) for hit in hits]
+
+
+def _render_hit(hit: "RetrievalHit") -> str:
+    heading, _, body = hit.text.partition("\n")
+    if hit.kind == "memory":
+        return f"## Memory {hit.recency}\n{body}".strip()
+    if hit.kind == "archive":
+        return f"## Archived Memory {hit.recency}\n{body}".strip()
+    if hit.kind == "summary":
+        return f"## Earlier Memory (summary)\n{hit.text}"
+    slug = Path(hit.path).stem
+    return f"## Related Project Notes ({slug})\n\n{hit.text}"
+
+
+def summary_lines(text: str) -> List[str]:
+    """The ``- <date>: <summary>`` lines of ``summaries.md``, oldest first."""
+
+    return [line for line in text.splitlines() if line.startswith("- ")]
+
+
+def split_markdown(text: str) -> List[Tuple[str, str]]:
+    """Split Markdown into ``(title, block)`` pairs at ``##`` headings outside code fences.
+
+    The text before the first ``##`` heading becomes a ``preamble`` block.
+    """
+
+    blocks: List[Tuple[str, str]] = []
+    title = "preamble"
+    buffer: List[str] = []
+    in_fence = False
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        elif not in_fence and line.startswith("## "):
+            if any(part.strip() for part in buffer):
+                blocks.append((title, "\n".join(buffer).strip()))
+            title = line[3:].strip() or "untitled"
+            buffer = []
+        buffer.append(line)
+    if any(part.strip() for part in buffer):
+        blocks.append((title, "\n".join(buffer).strip()))
+    return blocks
+
+
+def _tool_description(text: str) -> str:
+    """First paragraph under ``## Description`` in a tool markdown file."""
+
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        if line.strip().lower() == "## description":
+            paragraph: List[str] = []
+            for candidate in lines[index + 1:]:
+                stripped = candidate.strip()
+                if stripped.startswith("#"):
+                    break
+                if not stripped:
+                    if paragraph:
+                        break
+                    continue
+                paragraph.append(stripped)
+            return " ".join(paragraph)
+    return ""
@@ -0,0 +1,112 @@
+"""Token estimation and budget packing for assembled context sections."""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from context_assembler import ContextSection
+
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate BPE token count without a tokenizer dependency.
+
+    Words count as one token per four characters (rounded up) and every
+    punctuation or non-ASCII symbol counts as one token. This tracks
+    tiktoken-style counts for English prose and Markdown within ~15%, which
+    is enough for budgeting.
+    """
+
+    tokens = 0
+    for match in _WORD_PATTERN.finditer(text):
+        length = match.end() - match.start()
+        tokens += (length + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return tokens
+
+
+@dataclass
+class BudgetResult:
+    """Sections kept (in prompt order) and dropped (in rank order) for a budget."""
+
+    included: List["ContextSection"]
+    dropped: List["ContextSection"]
+    budget: Optional[int]
+    tokens: Dict[int, int] = field(default_factory=dict)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens[id(section)] for section in self.included)
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(section.text.strip() for section in self.included)
+
+    def to_payload(self) -> Dict[str, Any]:
+        included_ids = {id(section) for section in self.included}
+        ordered = sorted(self.included + self.dropped, key=lambda section: section.position)
+        return {
+            "budget": self.budget,
+            "total_tokens": self.total_tokens,
+            "sections": [
+                dict(
+                    section.to_payload(),
+                    tokens=self.tokens[id(section)],
+                    included=id(section) in included_ids,
+                )
+                for section in ordered
+            ],
+            "dropped": [section.name for section in self.dropped],
+        }
+
+
+def rank_key(section: "ContextSection") -> tuple:
+    """Required first, then priority, then newest dated section, then document order."""
+
+    return (
+        not section.required,
+        -section.priority,
+        _recency_rank(section.recency),
+        section.position,
+    )
+
+
+def pack_sections(sections: List["ContextSection"], budget: Optional[int]) -> BudgetResult:
+    """Greedily keep the best-ranked sections that fit ``budget`` tokens.
+
+    Required sections are always kept. A section that does not fit is
+    skipped and smaller, lower-ranked ones may still fill the space. The
+    kept sections are returned in their original prompt order.
+    """
+
+    tokens = {id(section): estimate_tokens(section.text) for section in sections}
+    if not budget or budget <= 0:
+        return BudgetResult(list(sections), [], None, tokens)
+
+    remaining = budget
+    kept: List["ContextSection"] = []
+    dropped: List["ContextSection"] = []
+    for section in sorted(sections, key=rank_key):
+        cost = tokens[id(section)]
+        if section.required or cost <= remaining:
+            kept.append(section)
+            remaining -= cost
+        else:
+            dropped.append(section)
+    kept.sort(key=lambda section: section.position)
+    return BudgetResult(kept, dropped, budget, tokens)
+
+
+def _recency_rank(recency: Optional[str]) -> int:
+    # Newest ISO date sorts first; undated sections sort after dated ones.
+    if not recency:
+        return 0
+    try:
+        return -date.fromisoformat(recency).toordinal()
+    except ValueError:
+        return 0
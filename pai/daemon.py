@@ -0,0 +1,350 @@
+"""Long-lived PAI daemon that keeps one warm PAIClient behind a local socket."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Any, Dict, NoReturn, Optional, Tuple
+from urllib.parse import parse_qs
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+MAX_BODY_BYTES = 4 * 1024 * 1024
+
+
+def default_socket_path(home: Path) -> Path:
+    """Location of the Unix socket that ``pai.sh`` probes before forwarding."""
+
+    override = os.getenv("PAI_SOCKET")
+    if override:
+        return Path(override)
+    return home / "tmp" / "pai.sock"
+
+
+class _CLIArgumentParser(argparse.ArgumentParser):
+    """ArgumentParser that raises ``ValueError`` with its usage or help text instead of exiting.
+
+    Requests are parsed concurrently on the worker threads, so nothing may
+    touch the process-wide ``sys.stdout``/``sys.stderr``.
+    """
+
+    def print_help(self, file: Any = None) -> None:
+        raise ValueError(self.format_help().strip())
+
+    def print_usage(self, file: Any = None) -> None:
+        raise ValueError(self.format_usage().strip())
+
+    def error(self, message: str) -> NoReturn:  # type: ignore[override]
+        raise ValueError(f"{self.format_usage()}{self.prog}: error: {message}")
+
+    def exit(self, status: int = 0, message: Optional[str] = None) -> NoReturn:  # type: ignore[override]
+        raise ValueError((message or "").strip() or f"{self.prog}: exited with status {status}")
+
+
+class _PooledServerMixin:
+    """Hand accepted connections to a bounded thread pool instead of one thread each."""
+
+    executor: ThreadPoolExecutor
+
+    def process_request(self, request, client_address) -> None:  # type: ignore[override]
+        self.executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)  # type: ignore[attr-defined]
+        except Exception:  # pragma: no cover - runtime guard
+            self.handle_error(request, client_address)  # type: ignore[attr-defined]
+        finally:
+            self.shutdown_request(request)  # type: ignore[attr-defined]
+
+    def server_close(self) -> None:
+        super().server_close()  # type: ignore[misc]
+        self.executor.shutdown(wait=True)
+
+
+class PAIUnixServer(_PooledServerMixin, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class PAITCPServer(_PooledServerMixin, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class PAIRequestHandler(BaseHTTPRequestHandler):
+    """JSON-over-HTTP front end for the resident PAIClient."""
+
+    server_version = "PAIDaemon/1.0"
+    protocol_version = "HTTP/1.0"
+
+    def address_string(self) -> str:
+        # Unix sockets report an empty peer address.
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return "unix"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - stdlib signature
+        LOGGER.debug("%s %s", self.address_string(), format % args)
+
+    def do_GET(self) -> None:  # noqa: N802 - stdlib naming
+        if self.path == "/health":
+            self._send_json(200, {"ok": True, "data": {"pid": os.getpid()}})
+            return
+        if self.path == "/metrics":
+            import metrics
+
+            snapshot = self.server.client.metrics.snapshot()  # type: ignore[attr-defined]
+            body = metrics.render_prometheus(snapshot).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self._send_json(404, {"ok": False, "data": {"error": f"unknown path: {self.path}"}})
+
+    def do_POST(self) -> None:  # noqa: N802 - stdlib naming
+        pretty = False
+        try:
+            body = self._read_body()
+            if self.path == "/cli":
+                args = self._parse_cli(body)
+                if args.command == "chat" and getattr(args, "stream", False):
+                    self._stream_chat(args)
+                    return
+                pretty = bool(getattr(args, "pretty", False))
+                status, payload = self._dispatch_cli(args)
+            elif self.path in ROUTES:
+                status, payload = self._dispatch_json(self.path, body)
+            else:
+                status, payload = 404, {"ok": False, "data": {"error": f"unknown path: {self.path}"}}
+        except ValueError as exc:
+            status, payload = 400, {"ok": False, "data": {"error": str(exc)}}
+        except Exception as exc:  # pragma: no cover - runtime guard
+            LOGGER.exception("Daemon request failed: %s", exc)
+            status, payload = 500, {"ok": False, "data": {"error": str(exc)}}
+        self._send_json(status, payload, pretty=pretty)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError("request body too large")
+        return self.rfile.read(length) if length else b""
+
+    def _parse_cli(self, body: bytes) -> Any:
+        """Parse a forwarded ``pai.sh`` argv (form field ``argv`` repeated per word).
+
+        Argparse's usage/help text comes back as a ``ValueError`` for the
+        caller. A relative ``--path`` is resolved against the client's ``cwd``
+        field, not the daemon's working directory.
+        """
+
+        import server
+
+        form = parse_qs(body.decode("utf-8"), keep_blank_values=True)
+        args = server._parse_args(form.get("argv", []), parser_class=_CLIArgumentParser)
+        cwd = form.get("cwd", [""])[0]
+        path = getattr(args, "path", None)
+        if path and cwd and not os.path.isabs(path):
+            args.path = os.path.join(cwd, path)
+        return args
+
+    def _dispatch_cli(self, args: Any) -> Tuple[int, Dict[str, Any]]:
+        import metrics
+        import server
+
+        if args.command not in server.COMMAND_HANDLERS:
+            raise ValueError(f"command not available through the daemon: {args.command}")
+        with metrics.labels(command=args.command):
+            response = server.COMMAND_HANDLERS[args.command](self.server.client, args)  # type: ignore[attr-defined]
+        return 200, {"ok": response.ok, "data": response.data}
+
+    def _dispatch_json(self, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        try:
+            request = json.loads(body.decode("utf-8") or "{}")
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"invalid JSON body: {exc}") from exc
+        if not isinstance(request, dict):
+            raise ValueError("request body must be a JSON object")
+        import metrics
+
+        with metrics.labels(command=path.lstrip("/")):
+            data = ROUTES[path](self.server.client, request)  # type: ignore[attr-defined]
+        return 200, {"ok": data.get("error") is None, "data": data}
+
+    def _stream_chat(self, args: Any) -> None:
+        """Write ``chat --stream`` JSON lines as they arrive; HTTP/1.0 ends at close."""
+
+        import server
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for line in server.stream_chat_lines(self.server.client, args):  # type: ignore[attr-defined]
+            self.wfile.write(line.encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict[str, Any], *, pretty: bool = False) -> None:
+        from server import encode_json
+
+        encoded = (encode_json(payload, pretty=pretty) + "\n").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+def _cache_mode(request: Dict[str, Any]) -> str:
+    from response_cache import CACHE_MODES, CACHE_USE
+
+    mode = request.get("cache", CACHE_USE)
+    if mode not in CACHE_MODES:
+        raise ValueError(f"'cache' must be one of {', '.join(CACHE_MODES)}")
+    return mode
+
+
+def _output_profile(client: Any, request: Dict[str, Any]) -> str:
+    from server import OUTPUT_PROFILES
+
+    profile = request.get("output") or client.output_profile
+    if profile not in OUTPUT_PROFILES:
+        raise ValueError(f"'output' must be one of {', '.join(OUTPUT_PROFILES)}")
+    return profile
+
+
+def _route_chat(client: Any, request: Dict[str, Any]) -> Dict[str, Any]:
+    from server import OUTPUT_FULL, shape_response
+
+    message = request.get("message")
+    if not isinstance(message, str) or not message.strip():
+        raise ValueError("chat requires a non-empty string 'message'")
+    profile = _output_profile(client, request)
+    data = client.chat(
+        message,
+        project=request.get("project"),
+        cache_mode=_cache_mode(request),
+        keep_raw=profile == OUTPUT_FULL,
+    )
+    return shape_response(data, profile)
+
+
+def _route_run_tool(client: Any, request: Dict[str, Any]) -> Dict[str, Any]:
+    from server import OUTPUT_FULL, shape_response
+
+    name = request.get("name")
+    if not isinstance(name, str) or not name:
+        raise ValueError("run-tool requires a string 'name'")
+    params = request.get("params") or {}
+    if not isinstance(params, dict):
+        raise ValueError("run-tool 'params' must be a JSON object")
+    profile = _output_profile(client, request)
+    data = client.run_tool(
+        name,
+        params,
+        cache_mode=_cache_mode(request),
+        via_codex=bool(request.get("via_codex", False)),
+        keep_raw=profile == OUTPUT_FULL,
+    )
+    return shape_response(data, profile)
+
+
+def _route_load_context(client: Any, request: Dict[str, Any]) -> Dict[str, Any]:
+    path = Path(request["path"]) if request.get("path") else client.context_path
+    report = client.context.build(
+        request.get("project"),
+        path,
+        budget=request.get("budget"),
+        query=request.get("query"),
+    )
+    return {"context": client.load_context(path), **report.to_payload()}
+
+
+ROUTES = {
+    "/chat": _route_chat,
+    "/run-tool": _route_run_tool,
+    "/load-context": _route_load_context,
+}
+
+
+def _socket_in_use(path: Path) -> bool:
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+    except OSError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def build_server(
+    client: Any,
+    *,
+    socket_path: Optional[Path] = None,
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    workers: int = DEFAULT_WORKERS,
+) -> socketserver.BaseServer:
+    """Bind either a Unix-domain socket (default) or a localhost TCP port."""
+
+    server: socketserver.BaseServer
+    if port is not None:
+        server = PAITCPServer((host or "127.0.0.1", port), PAIRequestHandler, bind_and_activate=False)
+    else:
+        if socket_path is None:
+            raise ValueError("socket_path is required when no TCP port is given")
+        if socket_path.exists():
+            if _socket_in_use(socket_path):
+                raise RuntimeError(f"PAI daemon already listening on {socket_path}")
+            socket_path.unlink()
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        server = PAIUnixServer(str(socket_path), PAIRequestHandler, bind_and_activate=False)
+    executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="pai-daemon")
+    server.executor = executor  # type: ignore[attr-defined]
+    server.client = client  # type: ignore[attr-defined]
+    try:
+        server.server_bind()  # type: ignore[attr-defined]
+        server.server_activate()  # type: ignore[attr-defined]
+    except Exception:
+        server.server_close()
+        raise
+    return server
+
+
+def serve(
+    client: Any,
+    *,
+    socket_path: Optional[Path] = None,
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    workers: int = DEFAULT_WORKERS,
+) -> int:
+    server = build_server(client, socket_path=socket_path, host=host, port=port, workers=workers)
+    where = f"{host or '127.0.0.1'}:{port}" if port is not None else str(socket_path)
+    LOGGER.info("PAI daemon listening on %s with %s workers", where, workers)
+    print(f"PAI daemon listening on {where}", file=sys.stderr, flush=True)
+
+    def _terminate(signum: int, _frame: Any) -> None:
+        raise KeyboardInterrupt(f"signal {signum}")
+
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        LOGGER.info("PAI daemon interrupted; shutting down")
+    finally:
+        server.server_close()
+        if port is None and socket_path is not None and socket_path.exists():
+            socket_path.unlink()
+    return 0
@@ -0,0 +1,290 @@
+"""Parallel, memory-mapped substring scanner used as the search fallback."""
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Iterable, Iterator, List, Optional, Pattern, Union
+
+SNIFF_BYTES = 8192
+MMAP_THRESHOLD = 1024 * 1024
+BATCH_SIZE = 128
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+
+
+@dataclass
+class ScanMatch:
+    path: str
+    line: int
+    text: str
+    before: List[str] = field(default_factory=list)
+    after: List[str] = field(default_factory=list)
+
+
+def iter_files(root: Path, excluded_dirs: Iterable[str] = ()) -> Iterator[str]:
+    """Yield paths (relative to ``root``) of regular files outside ``excluded_dirs``.
+
+    Excluded entries match either a directory name anywhere in the tree or a
+    root-relative path such as ``pai/tmp``.
+    """
+
+    excluded = {entry.replace("/", os.sep) for entry in excluded_dirs}
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            relative = os.path.relpath(entry.path, root)
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in excluded and relative not in excluded:
+                    subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield relative
+        # Reverse so the stack pops directories in name order.
+        stack.extend(reversed(subdirs))
+
+
+def is_binary(head: bytes) -> bool:
+    return b"\x00" in head
+
+
+@dataclass(frozen=True)
+class ByteQuery:
+    """A literal query as ASCII-lowercased bytes plus the equivalent byte regex.
+
+    ``folded`` is the casefolded query when it has non-ASCII characters; byte
+    folding cannot match those case-insensitively, so such queries are
+    matched against decoded lines instead.
+    """
+
+    needle: bytes
+    pattern: Pattern[bytes]
+    folded: Optional[str] = None
+
+
+def compile_query(query: str) -> ByteQuery:
+    """Case-insensitive matcher for a literal query; bytes-only when the query is ASCII."""
+
+    encoded = query.encode("utf-8")
+    folded = None if query.isascii() else query.casefold()
+    return ByteQuery(encoded.lower(), re.compile(re.escape(encoded), re.IGNORECASE), folded)
+
+
+def scan_file(
+    root: str,
+    relative: str,
+    query: ByteQuery,
+    *,
+    all_matches: bool = False,
+    context_lines: int = 0,
+) -> List[ScanMatch]:
+    """Search one file as bytes without decoding it; only hit lines are decoded.
+
+    Files up to ``MMAP_THRESHOLD`` are read in one call and matched with
+    ``bytes.lower().find`` (ASCII folding keeps offsets aligned); larger files
+    are memory-mapped and matched with the case-insensitive byte pattern so
+    they are never copied into Python memory whole. Non-ASCII queries decode
+    and casefold each line instead.
+    """
+
+    path = os.path.join(root, relative)
+    try:
+        with open(path, "rb") as handle:
+            head = handle.read(SNIFF_BYTES)
+            if not head or is_binary(head):
+                return []
+            if len(head) < SNIFF_BYTES:
+                return _scan_buffer(head, relative, query, all_matches, context_lines)
+            size = os.fstat(handle.fileno()).st_size
+            if size <= MMAP_THRESHOLD:
+                return _scan_buffer(head + handle.read(), relative, query, all_matches, context_lines)
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _scan_buffer(data, relative, query, all_matches, context_lines)
+    except (OSError, ValueError):
+        return []
+
+
+def _scan_buffer(
+    data: Union[bytes, mmap.mmap],
+    relative: str,
+    query: ByteQuery,
+    all_matches: bool,
+    context_lines: int,
+) -> List[ScanMatch]:
+    if query.folded is not None:
+        return _scan_folded(data, relative, query.folded, all_matches, context_lines)
+    lowered = data.lower() if isinstance(data, bytes) else None
+    matches: List[ScanMatch] = []
+    line_no = 1
+    counted_to = 0
+    position = 0
+    size = len(data)
+    while position <= size:
+        if lowered is not None:
+            hit_start = lowered.find(query.needle, position)
+            if hit_start == -1:
+                break
+            hit_end = hit_start + len(query.needle)
+        else:
+            hit = query.pattern.search(data, position)
+            if hit is None:
+                break
+            hit_start, hit_end = hit.start(), hit.end()
+        start = data.rfind(b"\n", 0, hit_start) + 1
+        end = data.find(b"\n", hit_end)
+        if end == -1:
+            end = size
+        # Slices copy only the span between hits, so the whole file is copied at most once.
+        line_no += data[counted_to:start].count(b"\n")
+        counted_to = start
+        match = ScanMatch(relative, line_no, _decode(data[start:end]))
+        if context_lines:
+            match.before = _lines_before(data, start, context_lines)
+            match.after = _lines_after(data, end, context_lines)
+        matches.append(match)
+        if not all_matches:
+            break
+        # Continue on the next line; one match per line like ripgrep.
+        position = end + 1
+    return matches
+
+
+def _scan_folded(
+    data: Union[bytes, mmap.mmap],
+    relative: str,
+    folded: str,
+    all_matches: bool,
+    context_lines: int,
+) -> List[ScanMatch]:
+    matches: List[ScanMatch] = []
+    line_no = 0
+    start = 0
+    size = len(data)
+    while start < size:
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = size
+        line_no += 1
+        text = _decode(data[start:end])
+        if folded in text.casefold():
+            match = ScanMatch(relative, line_no, text)
+            if context_lines:
+                match.before = _lines_before(data, start, context_lines)
+                match.after = _lines_after(data, end, context_lines)
+            matches.append(match)
+            if not all_matches:
+                break
+        start = end + 1
+    return matches
+
+
+def _lines_before(data: mmap.mmap, start: int, count: int) -> List[str]:
+    lines: List[str] = []
+    end = start - 1
+    while end >= 0 and len(lines) < count:
+        begin = data.rfind(b"\n", 0, end) + 1
+        lines.append(_decode(data[begin:end]))
+        end = begin - 1
+    return list(reversed(lines))
+
+
+def _lines_after(data: mmap.mmap, end: int, count: int) -> List[str]:
+    lines: List[str] = []
+    begin = end + 1
+    size = len(data)
+    while begin < size and len(lines) < count:
+        stop = data.find(b"\n", begin)
+        if stop == -1:
+            stop = size
+        lines.append(_decode(data[begin:stop]))
+        begin = stop + 1
+    return lines
+
+
+def _decode(raw: bytes) -> str:
+    return raw.decode("utf-8", errors="replace").rstrip("\r")
+
+
+def _scan_batch(
+    root: str,
+    paths: List[str],
+    query: str,
+    all_matches: bool,
+    context_lines: int,
+) -> List[ScanMatch]:
+    compiled = compile_query(query)
+    results: List[ScanMatch] = []
+    for relative in paths:
+        results.extend(
+            scan_file(root, relative, compiled, all_matches=all_matches, context_lines=context_lines)
+        )
+    return results
+
+
+def scan(
+    root: Path,
+    query: str,
+    *,
+    limit: Optional[int] = None,
+    excluded_dirs: Iterable[str] = (),
+    all_matches: bool = False,
+    context_lines: int = 0,
+    workers: Optional[int] = None,
+    use_processes: bool = False,
+) -> List[ScanMatch]:
+    """Scan ``root`` for ``query`` on a worker pool and return matches in walk order.
+
+    Files are handed out in batches with a bounded look-ahead window, so the
+    scan stops soon after ``limit`` matches are found and results stay
+    deterministic. Threads suit I/O-bound trees; ``use_processes`` spreads
+    regex work across cores for large, cached workspaces.
+    """
+
+    if not query:
+        return []
+    pool_size = max(workers or DEFAULT_WORKERS, 1)
+    executor: Executor
+    if use_processes:
+        executor = ProcessPoolExecutor(max_workers=min(pool_size, os.cpu_count() or 1))
+    else:
+        executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="pai-scan")
+
+    results: List[ScanMatch] = []
+    pending: Deque[Future] = deque()
+    batches = _batched(iter_files(root, excluded_dirs), BATCH_SIZE)
+    try:
+        for batch in batches:
+            pending.append(executor.submit(_scan_batch, str(root), batch, query, all_matches, context_lines))
+            if len(pending) >= pool_size * 2:
+                results.extend(pending.popleft().result())
+                if limit and len(results) >= limit:
+                    return results[:limit]
+        while pending:
+            results.extend(pending.popleft().result())
+            if limit and len(results) >= limit:
+                return results[:limit]
+        return results
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _batched(items: Iterator[str], size: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
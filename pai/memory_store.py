@@ -0,0 +1,409 @@
+"""Append-only ``memory.md`` log with a persistent date/offset index and atomic compaction."""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_RETENTION_DAYS = 90
+INDEX_VERSION = 2
+TAIL_BYTES = 4096
+COPY_CHUNK_BYTES = 1024 * 1024
+MEMORY_HEADER = "# PAI Memory\n"
+SUMMARIES_FILENAME = "summaries.md"
+# Same headings as ``optimize_memory.SECTION_PATTERN``, matched on raw bytes.
+HEADING_PATTERN = re.compile(rb"^##\s+(\d{4}-\d{2}-\d{2})\s*$")
+# A top-level bullet is one entry, as written by ``optimize_memory.append_entry``.
+ENTRY_PATTERN = re.compile(rb"^[-*]\s")
+
+Summarizer = Callable[[List[str]], str]
+
+
+@dataclass(frozen=True)
+class MemorySection:
+    """One ``## YYYY-MM-DD`` section: bytes ``[offset, end)`` of the log, heading included."""
+
+    heading: str
+    offset: int
+    end: int
+    entries: int = field(default=0, compare=False)
+
+    @property
+    def day(self) -> Optional[date]:
+        try:
+            return datetime.strptime(self.heading, "%Y-%m-%d").date()
+        except ValueError:
+            return None
+
+
+@dataclass
+class CompactionResult:
+    archived: List[str] = field(default_factory=list)
+    retained: int = 0
+    rewritten: bool = False
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {"archived": self.archived, "retained": self.retained, "rewritten": self.rewritten}
+
+
+class MemoryStore:
+    """Treats ``memory.md`` as an append-only log of dated sections.
+
+    A JSON index beside the other runtime state records each section's byte
+    offset. ``sections()`` only scans bytes appended since the last call and
+    falls back to one full rescan when the indexed prefix no longer matches
+    (the file was edited by hand). ``compact`` reads just the sections that
+    expired (older than ``retention_days`` or beyond the newest
+    ``max_entries``), archives them, and swaps in the shortened log with a
+    temp file and ``os.replace`` so a crash leaves the old or the new file,
+    never a partial one. Writers that go through the store hold an ``flock``.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        index_path: Path,
+        archive_dir: Path,
+        *,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        retention_days: int = DEFAULT_RETENTION_DAYS,
+    ) -> None:
+        self.path = path
+        self.index_path = index_path
+        self.archive_dir = archive_dir
+        self.max_entries = max_entries
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+
+    # -- reading ------------------------------------------------------------------
+
+    def sections(self) -> List[MemorySection]:
+        with self._locked():
+            return self._refresh()
+
+    def read(self, section: MemorySection) -> str:
+        with self.path.open("rb") as handle:
+            handle.seek(section.offset)
+            return handle.read(section.end - section.offset).decode("utf-8", errors="replace")
+
+    def read_entry(self, section: MemorySection) -> Tuple[str, List[str]]:
+        """``section`` as ``(heading, lines)``, like one item of ``parse_sections``."""
+
+        return _split_section(self.read(section).strip("\n"))
+
+    def recent(self, count: int) -> List[Tuple[str, List[str]]]:
+        """The newest ``count`` sections as ``(heading, lines)``, like ``parse_sections``."""
+
+        if count <= 0:
+            return []
+        newest = sorted(self.sections(), key=lambda section: (section.heading, section.offset))[-count:]
+        return [self.read_entry(section) for section in newest]
+
+    def expired(
+        self,
+        *,
+        retention_days: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        today: Optional[date] = None,
+    ) -> List[MemorySection]:
+        """Sections ``compact`` would archive with the same arguments, in file order."""
+
+        with self._locked():
+            return self._expired(self._refresh(), retention_days, max_entries, today)
+
+    # -- writing ------------------------------------------------------------------
+
+    def append(self, text: str, *, day: Optional[date] = None) -> MemorySection:
+        """Append ``text`` under ``## <day>`` (today in UTC by default, the clock compaction uses).
+
+        The text joins the last section when it already has that date and
+        starts a new section otherwise; existing bytes are never rewritten.
+        """
+
+        heading = (day or today_utc()).isoformat()
+        with self._locked():
+            sections = self._refresh()
+            size = self._size()
+            chunk = ""
+            if size and not self._ends_with_newline(size):
+                chunk += "\n"
+            if not sections or sections[-1].heading != heading:
+                chunk += ("\n" if size else MEMORY_HEADER + "\n") + f"## {heading}\n"
+            chunk += text.rstrip("\n") + "\n"
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as handle:
+                handle.write(chunk.encode("utf-8"))
+                handle.flush()
+                os.fsync(handle.fileno())
+            return self._refresh()[-1]
+
+    def compact(
+        self,
+        *,
+        retention_days: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        today: Optional[date] = None,
+        summarizer: Optional[Summarizer] = None,
+    ) -> CompactionResult:
+        """Archive expired sections and rewrite the log without them.
+
+        Nothing is rewritten when no section has expired. Each archived
+        section lands in ``archive/memory/memory-<date>.md`` and, when a
+        ``summarizer`` is given, as a ``- <date>: <summary>`` line in
+        ``summaries.md``. Re-running after a crash does not duplicate either.
+        The summarizer runs under the store lock, so it should be fast.
+        """
+
+        with self._locked():
+            sections = self._refresh()
+            expired = self._expired(sections, retention_days, max_entries, today)
+            if not expired:
+                return CompactionResult(retained=len(sections))
+            self._archive(expired, summarizer)
+            expired_set = set(expired)
+            retained = [section for section in sections if section not in expired_set]
+            self._rewrite(sections, retained)
+            for section in expired:
+                LOGGER.info("Archived memory section for %s", section.heading)
+            return CompactionResult(
+                archived=[section.heading for section in expired],
+                retained=len(retained),
+                rewritten=True,
+            )
+
+    def _expired(
+        self,
+        sections: List[MemorySection],
+        retention_days: Optional[int],
+        max_entries: Optional[int],
+        today: Optional[date],
+    ) -> List[MemorySection]:
+        days = self.retention_days if retention_days is None else retention_days
+        limit = self.max_entries if max_entries is None else max_entries
+        cutoff = (today or today_utc()) - timedelta(days=days)
+        dated = [section for section in sections if section.day is not None]
+        newest = sorted(dated, key=lambda section: (section.heading, section.offset))
+        overflow = set(newest[:-limit]) if 0 < limit < len(newest) else set()
+        return [section for section in dated if section.day <= cutoff or section in overflow]  # type: ignore[operator]
+
+    def _archive(self, expired: List[MemorySection], summarizer: Optional[Summarizer]) -> None:
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        summary_lines: List[str] = []
+        for section in expired:
+            text = self.read(section).strip("\n")
+            archive_path = self.archive_dir / f"memory-{section.heading}.md"
+            existing = archive_path.read_text(encoding="utf-8") if archive_path.exists() else ""
+            if text not in existing:
+                merged = existing.rstrip("\n") + "\n\n" + text if existing else text
+                _atomic_write(archive_path, (merged + "\n").encode("utf-8"))
+            if summarizer is not None:
+                heading, lines = _split_section(text)
+                summary_lines.append(f"- {heading}: {summarizer(lines)}")
+        if summary_lines:
+            summaries_path = self.archive_dir / SUMMARIES_FILENAME
+            known = set(summaries_path.read_text(encoding="utf-8").splitlines()) if summaries_path.exists() else set()
+            fresh = [line for line in summary_lines if line not in known]
+            if fresh:
+                with summaries_path.open("a", encoding="utf-8") as handle:
+                    handle.write("\n".join(fresh) + "\n")
+
+    def _rewrite(self, sections: List[MemorySection], retained: List[MemorySection]) -> None:
+        """Copy the preamble and ``retained`` byte ranges into a temp file and swap it in."""
+
+        preamble_end = sections[0].offset if sections else 0
+        ranges = [(0, preamble_end)] + [(section.offset, section.end) for section in retained]
+        snapshot = sections[-1].end if sections else self._size()
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, prefix=".memory-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out, self.path.open("rb") as source:
+                for start, end in ranges:
+                    _copy_range(source, out, start, end)
+                # Keep anything appended by a writer that bypassed the lock while we copied.
+                current = os.fstat(source.fileno()).st_size
+                if current > snapshot:
+                    _copy_range(source, out, snapshot, current)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        _fsync_dir(self.path.parent)
+        self._save_index(self._scan_from(None))
+
+    # -- index --------------------------------------------------------------------
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, self.index_path.with_suffix(".lock").open("a") as lock_handle:
+            fcntl.flock(lock_handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_handle, fcntl.LOCK_UN)
+
+    def _refresh(self) -> List[MemorySection]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return []
+        if stat.st_size == 0:
+            return []
+        size = stat.st_size
+        index = self._load_index()
+        if index is not None and index["size"] == size and index.get("mtime_ns") == stat.st_mtime_ns:
+            return _sections_from(index)
+        if index is not None and index["size"] < size and self._tail_hash(index["size"]) == index["tail"]:
+            index = self._scan_from(index)
+        else:
+            if index is not None:
+                LOGGER.info("Memory log changed outside the store; rebuilding index for %s", self.path)
+            index = self._scan_from(None)
+        self._save_index(index)
+        return _sections_from(index)
+
+    def _scan_from(self, index: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Index headings from the last line ``index`` may not have seen (or from the start)."""
+
+        start = index["resume"] if index is not None else 0
+        headings = [entry for entry in index["sections"] if entry[1] < start] if index is not None else []
+        offset = resume = start
+        with self.path.open("rb") as handle:
+            handle.seek(start)
+            for line in handle:
+                if line.startswith(b"##"):
+                    match = HEADING_PATTERN.match(line.rstrip(b"\r\n"))
+                    if match:
+                        headings.append([match.group(1).decode("ascii"), offset, 0])
+                elif headings and line.endswith(b"\n") and ENTRY_PATTERN.match(line):
+                    # Only complete lines count; a partial one is rescanned next time.
+                    headings[-1][2] += 1
+                offset += len(line)
+                # A trailing line without a newline may still grow; rescan it next time.
+                resume = offset if line.endswith(b"\n") else offset - len(line)
+        return {
+            "version": INDEX_VERSION,
+            "size": offset,
+            "mtime_ns": self.path.stat().st_mtime_ns,
+            "resume": resume,
+            "tail": self._tail_hash(offset),
+            "sections": headings,
+        }
+
+    def _load_index(self) -> Optional[Dict[str, Any]]:
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+            return None
+        return index
+
+    def _save_index(self, index: Dict[str, Any]) -> None:
+        try:
+            _atomic_write(self.index_path, json.dumps(index, separators=(",", ":")).encode("utf-8"))
+        except OSError as exc:  # pragma: no cover - the index is rebuilt on demand
+            LOGGER.warning("Could not write memory index %s: %s", self.index_path, exc)
+
+    def _tail_hash(self, size: int) -> str:
+        with self.path.open("rb") as handle:
+            handle.seek(max(size - TAIL_BYTES, 0))
+            return hashlib.sha256(handle.read(min(size, TAIL_BYTES))).hexdigest()
+
+    def _size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _ends_with_newline(self, size: int) -> bool:
+        with self.path.open("rb") as handle:
+            handle.seek(size - 1)
+            return handle.read(1) == b"\n"
+
+
+def today_utc() -> date:
+    """The date used for new headings and for the retention cutoff."""
+
+    return datetime.now(timezone.utc).date()
+
+
+def _sections_from(index: Dict[str, Any]) -> List[MemorySection]:
+    entries = index["sections"]
+    ends = [offset for _, offset, _ in entries[1:]] + [index["size"]]
+    return [MemorySection(heading, offset, end, count) for (heading, offset, count), end in zip(entries, ends)]
+
+
+def _split_section(text: str) -> Tuple[str, List[str]]:
+    heading_line, _, body = text.partition("\n")
+    match = HEADING_PATTERN.match(heading_line.encode("utf-8"))
+    heading = match.group(1).decode("ascii") if match else heading_line.lstrip("# ").strip()
+    return heading, body.rstrip("\n").split("\n") if body.strip("\n") else []
+
+
+def _copy_range(source: Any, out: Any, start: int, end: int) -> None:
+    source.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = source.read(min(remaining, COPY_CHUNK_BYTES))
+        if not chunk:
+            break
+        out.write(chunk)
+        remaining -= len(chunk)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _fsync_dir(directory: Path) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:  # pragma: no cover - platform dependent
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def default_index_path(home: Path) -> Path:
+    return Path(os.getenv("PAI_MEMORY_INDEX", home / "tmp" / "memory-index.json"))
+
+
+def from_config(home: Path, config: Dict[str, Any]) -> MemoryStore:
+    """Store for ``PAI_HOME/memory.md`` using the ``memory`` section of ``config.json``."""
+
+    memory_cfg = config.get("memory", {})
+    return MemoryStore(
+        home / "memory.md",
+        default_index_path(home),
+        home / "archive" / "memory",
+        max_entries=int(memory_cfg.get("max_entries", DEFAULT_MAX_ENTRIES)),
+        retention_days=int(memory_cfg.get("retention_days", DEFAULT_RETENTION_DAYS)),
+    )
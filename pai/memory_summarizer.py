@@ -0,0 +1,264 @@
+"""Codex-written summaries of old memory sections, cached by section content."""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+import memory_store
+import metrics
+from response_cache import CACHE_OFF
+
+if TYPE_CHECKING:  # pragma: no cover
+    from server import PAIClient
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_AUTO_SUMMARIZE_AFTER = 100
+DEFAULT_CONCURRENCY = 2
+DEFAULT_TIMEOUT_SECONDS = 120.0
+SUMMARIZER_CODEX = "codex"
+SUMMARIZER_HEURISTIC = "heuristic"
+SUMMARY_MAX_CHARS = 160
+PROMPT_TEMPLATE = (
+    "Summarize this dated entry from my PAI memory log in one sentence of at most {limit} characters. "
+    "Keep names, decisions and open items. Reply with the sentence only.\n\n{text}"
+)
+
+Fallback = Callable[[List[str]], str]
+
+
+def content_key(lines: List[str]) -> str:
+    """Hash of a section body; unchanged sections map to the same cached summary."""
+
+    return hashlib.sha256("\n".join(lines).strip().encode("utf-8")).hexdigest()
+
+
+def _clip(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= SUMMARY_MAX_CHARS else text[: SUMMARY_MAX_CHARS - 3] + "..."
+
+
+class SummaryCache:
+    """``{content_key: summary}`` in one JSON file, merged and replaced atomically under an ``flock``."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._entries: Optional[Dict[str, str]] = None
+
+    def get(self, key: str) -> Optional[str]:
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries.get(key)
+
+    def update(self, entries: Dict[str, str]) -> None:
+        if not entries:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.with_suffix(".lock").open("a") as lock_handle:
+            fcntl.flock(lock_handle, fcntl.LOCK_EX)
+            merged = self._read()
+            merged.update(entries)
+            memory_store._atomic_write(self.path, json.dumps(merged, indent=0, sort_keys=True).encode("utf-8"))
+        self._entries = merged
+
+    def _read(self) -> Dict[str, str]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as exc:
+            LOGGER.warning("Discarding unreadable summary cache %s: %s", self.path, exc)
+            return {}
+        return data if isinstance(data, dict) else {}
+
+
+class MemorySummarizer:
+    """``lines -> summary`` callable for ``MemoryStore.compact``.
+
+    ``prefetch`` asks Codex for the summaries that are not cached yet, at
+    most ``concurrency`` at a time, and stores them by ``content_key``.
+    Calling the summarizer afterwards only reads the cache, so ``compact``
+    never waits on Codex while it holds the store lock. A section with no
+    cached summary (Codex disabled, failed or timed out) gets ``fallback``.
+    """
+
+    def __init__(
+        self,
+        cache: SummaryCache,
+        fallback: Fallback,
+        *,
+        client_factory: Optional[Callable[[], "PAIClient"]] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: Optional[float] = DEFAULT_TIMEOUT_SECONDS,
+    ) -> None:
+        self.cache = cache
+        self.fallback = fallback
+        self.client_factory = client_factory
+        self.concurrency = max(int(concurrency), 1)
+        self.timeout = timeout
+        self._client: Optional["PAIClient"] = None
+
+    def __call__(self, lines: List[str]) -> str:
+        return self.cache.get(content_key(lines)) or self.fallback(lines)
+
+    def prefetch(self, bodies: List[List[str]]) -> Dict[str, int]:
+        """Summarize uncached ``bodies`` through Codex; returns cached/summarized/failed counts."""
+
+        pending: Dict[str, List[str]] = {}
+        for lines in bodies:
+            key = content_key(lines)
+            if self.cache.get(key) is None and any(line.strip() for line in lines):
+                pending.setdefault(key, lines)
+        fresh: Dict[str, str] = {}
+        if pending and self.client_factory is not None:
+            if self._client is None:
+                self._client = self.client_factory()
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="pai-summarize") as pool:
+                results = list(pool.map(self._summarize, pending.values()))
+            fresh = {key: summary for key, summary in zip(pending, results) if summary}
+            self.cache.update(fresh)
+        return {
+            "cached": len(bodies) - len(pending),
+            "summarized": len(fresh),
+            "failed": len(pending) - len(fresh),
+        }
+
+    def _summarize(self, lines: List[str]) -> Optional[str]:
+        assert self._client is not None
+        prompt = PROMPT_TEMPLATE.format(limit=SUMMARY_MAX_CHARS, text="\n".join(lines).strip())
+        with metrics.labels(job="memory_summarize"):
+            data = self._client._run_codex(prompt, cache_mode=CACHE_OFF, timeout=self.timeout)
+        if data.get("error") or not str(data.get("last") or "").strip():
+            LOGGER.warning("Codex summary failed; using the heuristic: %s", data.get("error") or "empty reply")
+            return None
+        return _clip(str(data["last"]))
+
+
+def auto_summarize(
+    store: memory_store.MemoryStore,
+    summarizer: MemorySummarizer,
+    threshold: int,
+) -> memory_store.CompactionResult:
+    """Fold the oldest dated sections into ``summaries.md`` until at most ``threshold`` entries remain.
+
+    The newest section is always kept. Sections past ``retention_days`` go
+    too, as with ``optimize_memory``.
+    """
+
+    keep = sections_within(store.sections(), threshold)
+    expiring = store.expired(max_entries=keep)
+    if not expiring:
+        return memory_store.CompactionResult(retained=len(store.sections()))
+    counts = summarizer.prefetch([store.read_entry(section)[1] for section in expiring])
+    LOGGER.info(
+        "Summarizing %s memory sections (%s cached, %s from Codex, %s heuristic)",
+        len(expiring),
+        counts["cached"],
+        counts["summarized"],
+        counts["failed"],
+    )
+    return store.compact(max_entries=keep, summarizer=summarizer)
+
+
+def threshold_from_config(config: Dict[str, Any]) -> int:
+    return int(config.get("memory", {}).get("auto_summarize_after", DEFAULT_AUTO_SUMMARIZE_AFTER))
+
+
+def needs_summary(store: memory_store.MemoryStore, threshold: int) -> bool:
+    """Cheap check (one incremental index refresh) for more than ``threshold`` entries in dated sections."""
+
+    if threshold <= 0:
+        return False
+    return sum(section.entries for section in store.sections() if section.day is not None) > threshold
+
+
+def sections_within(sections: List[memory_store.MemorySection], threshold: int) -> int:
+    """How many of the newest dated sections hold at most ``threshold`` entries (at least one)."""
+
+    newest = sorted(
+        (section for section in sections if section.day is not None),
+        key=lambda section: (section.heading, section.offset),
+        reverse=True,
+    )
+    kept = total = 0
+    for section in newest:
+        total += section.entries
+        if kept and total > threshold:
+            break
+        kept += 1
+    return kept
+
+
+def from_config(
+    home: Path,
+    config: Dict[str, Any],
+    fallback: Fallback,
+    client_factory: Optional[Callable[[], "PAIClient"]] = None,
+) -> MemorySummarizer:
+    """Summarizer using the ``memory`` section; ``PAI_MEMORY_SUMMARIZER=heuristic`` skips Codex."""
+
+    memory_cfg = config.get("memory", {})
+    mode = os.getenv("PAI_MEMORY_SUMMARIZER") or memory_cfg.get("summarizer", SUMMARIZER_CODEX)
+    if mode not in (SUMMARIZER_CODEX, SUMMARIZER_HEURISTIC):
+        LOGGER.warning("Unknown memory summarizer %r; using %s", mode, SUMMARIZER_HEURISTIC)
+        mode = SUMMARIZER_HEURISTIC
+    if mode == SUMMARIZER_CODEX and client_factory is None:
+        from server import PAIClient
+
+        client_factory = PAIClient
+    timeout = memory_cfg.get("summarize_timeout_seconds", DEFAULT_TIMEOUT_SECONDS)
+    return MemorySummarizer(
+        SummaryCache(default_cache_path(home)),
+        fallback,
+        client_factory=client_factory if mode == SUMMARIZER_CODEX else None,
+        concurrency=int(memory_cfg.get("summarize_concurrency", DEFAULT_CONCURRENCY)),
+        timeout=float(timeout) if timeout else None,
+    )
+
+
+def default_cache_path(home: Path) -> Path:
+    return home / "cache" / "memory-summaries.json"
+
+
+def lock_path(home: Path) -> Path:
+    return memory_store.default_index_path(home).with_name("memory-summarize.lock")
+
+
+def try_lock(home: Path) -> Optional[Any]:
+    """Non-blocking run lock so only one summarization pass runs per ``PAI_HOME``; ``None`` if busy."""
+
+    path = lock_path(home)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle = path.open("a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    return handle
+
+
+def spawn_background(home: Path) -> int:
+    """Start ``optimize_memory.py --summarize`` detached from this process; returns its PID."""
+
+    import subprocess
+
+    script = Path(__file__).resolve().with_name("optimize_memory.py")
+    env = dict(os.environ, PAI_HOME=str(home))
+    process = subprocess.Popen(
+        [sys.executable, str(script), "--summarize"],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    return process.pid
@@ -0,0 +1,343 @@
+"""Process-local timings, counters and latency histograms with a shared on-disk rollup."""
+
+from __future__ import annotations
+
+import atexit
+import contextlib
+import contextvars
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds; roughly Prometheus' defaults stretched to cover multi-minute agent runs.
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+DEFAULT_FLUSH_SECONDS = 5.0
+METRIC_PREFIX = "pai_"
+
+_LABELS: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("pai_metric_labels", default={})
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+@contextlib.contextmanager
+def labels(**values: Optional[str]) -> Iterator[None]:
+    """Attach labels (``command``, ``tool``, ``job``…) to every metric recorded inside the block."""
+
+    merged = dict(_LABELS.get())
+    merged.update({key: str(value) for key, value in values.items() if value is not None})
+    token = _LABELS.set(merged)
+    try:
+        yield
+    finally:
+        _LABELS.reset(token)
+
+
+class Timer:
+    """``with registry.timer("codex_total_seconds"):`` observes the block's wall time."""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, extra: Dict[str, str]) -> None:
+        self.registry = registry
+        self.name = name
+        self.extra = extra
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.elapsed = time.perf_counter() - self.started
+        self.registry.observe(self.name, self.elapsed, **self.extra)
+
+
+class MetricsRegistry:
+    """Counters and fixed-bucket histograms keyed by name plus labels.
+
+    Each process accumulates deltas in memory and merges them into
+    ``path`` (under an ``flock``) at most every ``flush_seconds`` and at
+    exit, so short CLI runs, the daemon and the scheduler all feed one
+    rollup that ``server.py metrics`` reads back.
+    """
+
+    def __init__(self, path: Optional[Path], *, flush_seconds: float = DEFAULT_FLUSH_SECONDS) -> None:
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._counters: Dict[LabelKey, float] = {}
+        self._histograms: Dict[LabelKey, Dict[str, Any]] = {}
+        self._last_flush = time.monotonic()
+        if path is not None:
+            atexit.register(self.flush)
+
+    def inc(self, name: str, amount: float = 1.0, **extra: Optional[str]) -> None:
+        key = self._key(name, extra)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, **extra: Optional[str]) -> None:
+        key = self._key(name, extra)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _empty_histogram()
+            _record(histogram, value)
+        self._maybe_flush()
+
+    def timer(self, name: str, **extra: Optional[str]) -> Timer:
+        return Timer(self, name, {key: str(value) for key, value in extra.items() if value is not None})
+
+    def flush(self) -> None:
+        """Merge pending deltas into the on-disk rollup."""
+
+        if self.path is None:
+            return
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+            self._last_flush = time.monotonic()
+        if not counters and not histograms:
+            return
+        try:
+            with self._locked_rollup(write=True) as rollup:
+                _merge(rollup, counters, histograms)
+        except OSError as exc:
+            LOGGER.debug("Could not write metrics to %s: %s", self.path, exc)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Rollup on disk plus this process's unflushed deltas."""
+
+        rollup: Dict[str, Any] = {"counters": {}, "histograms": {}}
+        if self.path is not None:
+            with self._locked_rollup(write=False) as stored:
+                rollup = stored
+        with self._lock:
+            _merge(rollup, dict(self._counters), {key: dict(value) for key, value in self._histograms.items()})
+        return rollup
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+        if self.path is not None:
+            with self._locked_rollup(write=True) as rollup:
+                rollup["counters"].clear()
+                rollup["histograms"].clear()
+
+    def _maybe_flush(self) -> None:
+        if self.path is not None and time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    @staticmethod
+    def _key(name: str, extra: Dict[str, Optional[str]]) -> LabelKey:
+        merged = dict(_LABELS.get())
+        merged.update({key: str(value) for key, value in extra.items() if value is not None})
+        return name, tuple(sorted(merged.items()))
+
+    @contextlib.contextmanager
+    def _locked_rollup(self, *, write: bool) -> Iterator[Dict[str, Any]]:
+        assert self.path is not None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_path = self.path.with_suffix(".lock")
+        with lock_path.open("a+") as lock_handle:
+            fcntl.flock(lock_handle, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                try:
+                    rollup = json.loads(self.path.read_text(encoding="utf-8"))
+                except (FileNotFoundError, json.JSONDecodeError):
+                    rollup = {}
+                rollup.setdefault("counters", {})
+                rollup.setdefault("histograms", {})
+                yield rollup
+                if write:
+                    tmp_path = self.path.with_suffix(".tmp")
+                    tmp_path.write_text(json.dumps(rollup, separators=(",", ":")), encoding="utf-8")
+                    os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_handle, fcntl.LOCK_UN)
+
+
+def _empty_histogram() -> Dict[str, Any]:
+    return {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0, "max": 0.0}
+
+
+def _record(histogram: Dict[str, Any], value: float) -> None:
+    index = len(LATENCY_BUCKETS)
+    for position, bound in enumerate(LATENCY_BUCKETS):
+        if value <= bound:
+            index = position
+            break
+    histogram["buckets"][index] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+    histogram["max"] = max(histogram["max"], value)
+
+
+def _encode_key(key: LabelKey) -> str:
+    name, pairs = key
+    return json.dumps([name, dict(pairs)], sort_keys=True)
+
+
+def _decode_key(encoded: str) -> Tuple[str, Dict[str, str]]:
+    name, pairs = json.loads(encoded)
+    return name, pairs
+
+
+def _merge(
+    rollup: Dict[str, Any],
+    counters: Dict[LabelKey, float],
+    histograms: Dict[LabelKey, Dict[str, Any]],
+) -> None:
+    for key, value in counters.items():
+        encoded = _encode_key(key)
+        rollup["counters"][encoded] = rollup["counters"].get(encoded, 0.0) + value
+    for key, histogram in histograms.items():
+        encoded = _encode_key(key)
+        stored = rollup["histograms"].setdefault(encoded, _empty_histogram())
+        stored["buckets"] = [a + b for a, b in zip(stored["buckets"], histogram["buckets"])]
+        stored["sum"] += histogram["sum"]
+        stored["count"] += histogram["count"]
+        stored["max"] = max(stored["max"], histogram["max"])
+
+
+def quantile(histogram: Dict[str, Any], q: float) -> Optional[float]:
+    """Estimate a quantile by linear interpolation inside the matching bucket."""
+
+    count = histogram["count"]
+    if not count:
+        return None
+    target = q * count
+    seen = 0
+    lower = 0.0
+    for index, bucket in enumerate(histogram["buckets"]):
+        upper = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else histogram["max"]
+        if bucket and seen + bucket >= target:
+            fraction = (target - seen) / bucket
+            return min(lower + (upper - lower) * fraction, histogram["max"])
+        seen += bucket
+        lower = upper
+    return histogram["max"]
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """Exact nearest-rank percentile of raw samples (for benchmarks, not the rollup)."""
+
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(math.ceil(q * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def latency_report(samples: List[float], wall_seconds: float) -> Dict[str, Optional[float]]:
+    """Count, throughput and p50/p95/p99/mean/max for a benchmark run."""
+
+    count = len(samples)
+    return {
+        "calls": count,
+        "wall_seconds": round(wall_seconds, 4),
+        "throughput_per_second": round(count / wall_seconds, 3) if wall_seconds > 0 else None,
+        "p50": _round(percentile(samples, 0.50)),
+        "p95": _round(percentile(samples, 0.95)),
+        "p99": _round(percentile(samples, 0.99)),
+        "mean": _round(sum(samples) / count) if count else None,
+        "max": _round(max(samples)) if count else None,
+    }
+
+
+def summarize(rollup: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Readable view: counters with labels, histograms with count/mean/p50/p95/p99/max."""
+
+    counters = []
+    for encoded, value in sorted(rollup.get("counters", {}).items()):
+        name, pairs = _decode_key(encoded)
+        counters.append({"name": name, "labels": pairs, "value": value})
+    histograms = []
+    for encoded, histogram in sorted(rollup.get("histograms", {}).items()):
+        name, pairs = _decode_key(encoded)
+        count = histogram["count"]
+        histograms.append(
+            {
+                "name": name,
+                "labels": pairs,
+                "count": count,
+                "mean": round(histogram["sum"] / count, 6) if count else None,
+                "p50": _round(quantile(histogram, 0.50)),
+                "p95": _round(quantile(histogram, 0.95)),
+                "p99": _round(quantile(histogram, 0.99)),
+                "max": round(histogram["max"], 6),
+            }
+        )
+    return {"counters": counters, "histograms": histograms}
+
+
+def render_prometheus(rollup: Dict[str, Any]) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+
+    lines: List[str] = []
+    typed = set()
+    for encoded, value in sorted(rollup.get("counters", {}).items()):
+        name, pairs = _decode_key(encoded)
+        metric = METRIC_PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_format_labels(pairs)} {value:g}")
+    for encoded, histogram in sorted(rollup.get("histograms", {}).items()):
+        name, pairs = _decode_key(encoded)
+        metric = METRIC_PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+        cumulative = 0
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            cumulative += histogram["buckets"][index]
+            lines.append(f"{metric}_bucket{_format_labels(pairs, le=f'{bound:g}')} {cumulative}")
+        lines.append(f"{metric}_bucket{_format_labels(pairs, le='+Inf')} {histogram['count']}")
+        lines.append(f"{metric}_sum{_format_labels(pairs)} {histogram['sum']:.6f}")
+        lines.append(f"{metric}_count{_format_labels(pairs)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(pairs: Dict[str, str], **extra: str) -> str:
+    merged = dict(pairs, **extra)
+    if not merged:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(merged.items())) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 6) if value is not None else None
+
+
+def from_config(home: Path, config: Dict[str, Any]) -> MetricsRegistry:
+    """Registry backed by ``metrics.path`` (default ``PAI_HOME/tmp/metrics.json``).
+
+    ``metrics.enabled: false`` or ``PAI_METRICS=0`` keeps metrics in memory only.
+    """
+
+    metrics_cfg = config.get("metrics", {})
+    env_flag = os.getenv("PAI_METRICS")
+    enabled = env_flag not in {"0", "false", "no"} if env_flag is not None else bool(metrics_cfg.get("enabled", True))
+    flush_seconds = float(metrics_cfg.get("flush_seconds", DEFAULT_FLUSH_SECONDS))
+    if not enabled:
+        return MetricsRegistry(None, flush_seconds=flush_seconds)
+    path = Path(metrics_cfg.get("path") or home / "tmp" / "metrics.json")
+    if not path.is_absolute():
+        path = home / path
+    return MetricsRegistry(path, flush_seconds=flush_seconds)
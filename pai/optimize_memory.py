@@ -3,30 +3,36 @@
 from __future__ import annotations
 
 import argparse
+import json
 import logging
 import os
 import re
-from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-from server import PAIClient  # noqa: F401 - ensures config/environment ready
+if TYPE_CHECKING:  # pragma: no cover
+    from server import PAIClient
 
 LOGGER = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
 
 PAI_HOME = Path(os.getenv("PAI_HOME", Path(__file__).resolve().parent))
 MEMORY_PATH = PAI_HOME / "memory.md"
 ARCHIVE_DIR = PAI_HOME / "archive" / "memory"
 LOG_DIR = PAI_HOME / "logs"
-LOG_DIR.mkdir(parents=True, exist_ok=True)
-FILE_HANDLER = logging.FileHandler(LOG_DIR / "optimize_memory.log")
-FILE_HANDLER.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
-LOGGER.addHandler(FILE_HANDLER)
 
+DEFAULT_WINDOW_DAYS = 7
 SECTION_PATTERN = re.compile(r"^##\s+(\d{4}-\d{2}-\d{2})\s*$")
 
 
+def _install_file_handler() -> None:
+    """Log optimizer runs to pai/logs/ (kept out of import so parse_sections stays cheap)."""
+
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    handler = logging.FileHandler(LOG_DIR / "optimize_memory.log")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    LOGGER.addHandler(handler)
+
+
 def parse_sections(text: str) -> List[Tuple[str, List[str]]]:
     sections: List[Tuple[str, List[str]]] = []
     current_heading: str | None = None
@@ -55,58 +61,105 @@ def summarize(content: List[str]) -> str:
     return text
 
 
-def optimize_memory(window_days: int) -> None:
-    LOGGER.info("Starting memory optimization for entries older than %s days", window_days)
+def _load_config() -> Dict[str, Any]:
+    config_path = PAI_HOME / "config.json"
+    try:
+        with config_path.open("r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as exc:
+        LOGGER.warning("Ignoring unreadable %s: %s", config_path, exc)
+        return {}
+
+
+def optimize_memory(window_days: Optional[int] = DEFAULT_WINDOW_DAYS) -> Dict[str, Any]:
+    """Archive sections older than ``window_days`` or past ``memory.max_entries``.
+
+    ``None`` uses ``memory.retention_days`` instead of a fixed window.
+    """
+
+    import memory_store
+
+    store = memory_store.from_config(PAI_HOME, _load_config())
+    days = store.retention_days if window_days is None else window_days
+    LOGGER.info("Starting memory optimization for entries older than %s days", days)
     if not MEMORY_PATH.exists():
         LOGGER.info("Memory file does not exist at %s", MEMORY_PATH)
-        return
-    content = MEMORY_PATH.read_text(encoding="utf-8")
-    sections = parse_sections(content)
-    if not sections:
-        LOGGER.info("No dated sections found; nothing to optimize")
-        return
-
-    cutoff = datetime.utcnow().date() - timedelta(days=window_days)
-    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
-
-    retained_lines: List[str] = []
-    summaries: List[str] = []
-    for heading, lines in sections:
-        try:
-            entry_date = datetime.strptime(heading, "%Y-%m-%d").date()
-        except ValueError:
-            LOGGER.warning("Skipping section with unrecognized date heading: %s", heading)
-            retained_lines.extend([f"## {heading}"] + lines)
-            continue
-        if entry_date <= cutoff:
-            archive_path = ARCHIVE_DIR / f"memory-{heading}.md"
-            archive_path.write_text("\n".join([f"## {heading}"] + lines), encoding="utf-8")
-            summary = summarize(lines)
-            summaries.append(f"- {heading}: {summary}")
-            LOGGER.info("Archived memory section for %s", heading)
-        else:
-            retained_lines.append(f"## {heading}")
-            retained_lines.extend(lines)
-
-    new_content: List[str] = ["# PAI Memory", ""]
-    if summaries:
-        timestamp = datetime.utcnow().isoformat()
-        new_content.extend(["## Summaries", f"_Last updated: {timestamp}_", ""])
-        new_content.extend(summaries)
-        new_content.append("")
-    if retained_lines:
-        new_content.append("## Recent Entries")
-        new_content.extend(retained_lines)
-    MEMORY_PATH.write_text("\n".join(new_content).strip() + "\n", encoding="utf-8")
+        return memory_store.CompactionResult().to_payload()
+    import memory_summarizer
+
+    # Reuse summaries a background pass already got from Codex; never wait on Codex here.
+    cache = memory_summarizer.SummaryCache(memory_summarizer.default_cache_path(PAI_HOME))
+    result = store.compact(retention_days=days, summarizer=memory_summarizer.MemorySummarizer(cache, summarize))
+    if not result.rewritten:
+        LOGGER.info("No memory sections past the cutoff; %s sections retained", result.retained)
     LOGGER.info("Memory optimization complete")
+    return result.to_payload()
+
+
+def append_entry(text: str) -> None:
+    """Append ``text`` under today's heading and start a background summary pass if the log is long."""
+
+    import memory_store
+    import memory_summarizer
+
+    config = _load_config()
+    store = memory_store.from_config(PAI_HOME, config)
+    section = store.append(text if text.lstrip().startswith(("-", "*")) else f"- {text}")
+    LOGGER.info("Appended memory entry under %s", section.heading)
+    if memory_summarizer.needs_summary(store, memory_summarizer.threshold_from_config(config)):
+        pid = memory_summarizer.spawn_background(PAI_HOME)
+        LOGGER.info("Memory log passed memory.auto_summarize_after; summarizing in background (pid %s)", pid)
+
+
+def summarize_memory(client: Optional["PAIClient"] = None) -> Dict[str, Any]:
+    """Summarize the oldest sections beyond ``memory.auto_summarize_after`` through Codex and archive them."""
+
+    import memory_store
+    import memory_summarizer
+
+    lock = memory_summarizer.try_lock(PAI_HOME)
+    if lock is None:
+        LOGGER.info("Another memory summarization pass is running; skipping")
+        return memory_store.CompactionResult().to_payload()
+    try:
+        config = _load_config()
+        store = memory_store.from_config(PAI_HOME, config)
+        factory = (lambda: client) if client is not None else None
+        summarizer = memory_summarizer.from_config(PAI_HOME, config, summarize, client_factory=factory)
+        result = memory_summarizer.auto_summarize(store, summarizer, memory_summarizer.threshold_from_config(config))
+    finally:
+        lock.close()
+    LOGGER.info("Memory summarization archived %s sections", len(result.archived))
+    return result.to_payload()
 
 
 def main(argv: list[str] | None = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
     parser = argparse.ArgumentParser(description="Optimize long-term memory")
-    parser.add_argument("--window", type=int, default=7, help="Archive entries older than this many days")
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=DEFAULT_WINDOW_DAYS,
+        help=f"Archive entries older than this many days (default {DEFAULT_WINDOW_DAYS})",
+    )
     parser.add_argument("--once", action="store_true", help="Run once and exit (default behavior)")
+    parser.add_argument("--append", metavar="TEXT", help="Append TEXT under today's heading instead of optimizing")
+    parser.add_argument(
+        "--summarize",
+        action="store_true",
+        help="Summarize sections beyond memory.auto_summarize_after through Codex instead of optimizing",
+    )
     args = parser.parse_args(argv)
 
+    _install_file_handler()
+    if args.append:
+        append_entry(args.append)
+        return 0
+    if args.summarize:
+        summarize_memory()
+        return 0
     optimize_memory(args.window)
     return 0
 
@@ -7,4 +7,45 @@ export CODEX_BIN="${CODEX_BIN:-codex}"
 export PYTHONPATH="${SCRIPT_DIR}:${PYTHONPATH:-}"
 
 PYTHON_BIN=${PYTHON_BIN:-python3}
-exec "${PYTHON_BIN}" "${SCRIPT_DIR}/server.py" "$@"
+PAI_SOCKET=${PAI_SOCKET:-${PAI_HOME}/tmp/pai.sock}
+
+# Forward to a running `pai.sh serve` daemon when one is listening; fall back to
+# a one-shot process if the socket is missing, stale, or PAI_NO_DAEMON is set.
+forwardable=false
+case "${1:-}" in
+  chat|run-tool|load-context) forwardable=true ;;
+esac
+# Help is printed by the local parser, exactly as without a daemon.
+for arg in "$@"; do
+  case "${arg}" in
+    -h|--help) forwardable=false ;;
+  esac
+done
+if [[ "${forwardable}" == "true" && -z "${PAI_NO_DAEMON:-}" && -S "${PAI_SOCKET}" ]] \
+  && command -v curl >/dev/null 2>&1; then
+  # The client's cwd lets the daemon resolve relative paths the way a local run would.
+  forward_args=(--data-urlencode "cwd=${PWD}")
+  for arg in "$@"; do
+    forward_args+=(--data-urlencode "argv=${arg}")
+  done
+  status=0
+  # The body streams to stdout through fd 3; only the HTTP status is captured.
+  exec 3>&1
+  http_code=$(curl --silent --unix-socket "${PAI_SOCKET}" --output /dev/fd/3 \
+    --write-out '%{http_code}' "${forward_args[@]}" http://localhost/cli) || status=$?
+  exec 3>&-
+  # curl exit 7 means nothing accepted the connection (stale socket).
+  if [[ ${status} -ne 7 ]]; then
+    if [[ ${status} -ne 0 ]]; then
+      exit "${status}"
+    fi
+    case "${http_code}" in
+      2??) exit 0 ;;
+      400) exit 2 ;;  # bad arguments, like argparse in the one-shot CLI
+      *) exit 1 ;;
+    esac
+  fi
+fi
+
+# cli.py imports server so its bytecode is cached instead of recompiled per call.
+exec "${PYTHON_BIN}" "${SCRIPT_DIR}/cli.py" "$@"
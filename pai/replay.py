@@ -0,0 +1,113 @@
+"""Offline benchmark that replays recorded Codex traces through ``PAIClient._run_codex``."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+import trace_store
+
+LOGGER = logging.getLogger(__name__)
+
+REPLAY_BIN = Path(__file__).resolve().parent / "bin" / "codex-replay"
+
+
+def load_traces(paths: List[Path], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    records: List[Dict[str, Any]] = []
+    for record in trace_store.iter_records(paths):
+        records.append(record)
+        if limit and len(records) >= limit:
+            break
+    return records
+
+
+def _recorded_error(record: Dict[str, Any]) -> bool:
+    return bool(record.get("error")) or record.get("status") == "timeout"
+
+
+def run_replay(
+    paths: List[Path],
+    *,
+    iterations: int = 1,
+    concurrency: int = 1,
+    speed: float = 0.0,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Replay traces ``iterations`` times at ``concurrency`` and report latency and throughput.
+
+    Each call spawns ``bin/codex-replay`` through the normal ``_run_codex``
+    path (spawn, line reading, parsing, metrics), so the numbers measure the
+    PAI layer itself. With ``speed`` 0 the stand-in emits events instantly;
+    1 reproduces the recorded pacing. Cache, pool and tracing are disabled
+    for the run so replays neither short-circuit nor record themselves.
+    """
+
+    records = load_traces(paths, limit)
+    if not records:
+        raise ValueError(f"no Codex traces found in {', '.join(str(path) for path in paths)}")
+
+    with tempfile.TemporaryDirectory(prefix="pai-replay-") as workdir:
+        replay_file = Path(workdir) / "traces.jsonl"
+        with replay_file.open("w", encoding="utf-8") as handle:
+            for record in records:
+                handle.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+        overrides = {
+            "CODEX_BIN": str(REPLAY_BIN),
+            "PAI_REPLAY_FILE": str(replay_file),
+            "PAI_REPLAY_SPEED": str(speed),
+            "PAI_TRACE": "0",
+            "PAI_CACHE": "0",
+            "PAI_CODEX_POOL": "0",
+            "PAI_METRICS": "0",
+        }
+        saved = {key: os.environ.get(key) for key in overrides}
+        os.environ.update(overrides)
+        try:
+            from response_cache import CACHE_OFF
+            from server import PAIClient
+
+            client = PAIClient()
+            jobs = [index for _ in range(max(iterations, 1)) for index in range(len(records))]
+
+            def _call(index: int) -> Tuple[float, bool]:
+                started = time.perf_counter()
+                with metrics.labels(command="replay"):
+                    data = client._run_codex(f"replay:{index}", cache_mode=CACHE_OFF)
+                # A replay should fail exactly when the recorded run failed (timed-out runs count as failed).
+                return time.perf_counter() - started, bool(data.get("error")) != _recorded_error(records[index])
+
+            wall_started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="pai-replay") as pool:
+                results = list(pool.map(_call, jobs))
+            wall = time.perf_counter() - wall_started
+            latencies = [latency for latency, _ in results]
+            mismatches = sum(1 for _, mismatch in results if mismatch)
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+    recorded = [record["timings"]["total"] for record in records if record.get("timings", {}).get("total")]
+    report = metrics.latency_report(latencies, wall)
+    report.update(
+        {
+            "traces": len(records),
+            "iterations": iterations,
+            "concurrency": concurrency,
+            "speed": speed,
+            "events": sum(len(record["events"]) for record in records) * max(iterations, 1),
+            "error_mismatches": mismatches,
+            "recorded_p50": metrics.percentile(recorded, 0.50),
+        }
+    )
+    return report
@@ -0,0 +1,240 @@
+"""Content-addressed on-disk cache for Codex responses."""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_USE = "use"
+CACHE_OFF = "off"
+CACHE_REFRESH = "refresh"
+CACHE_MODES = (CACHE_USE, CACHE_OFF, CACHE_REFRESH)
+
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+# Eviction frees space down to this share of ``max_bytes`` so a full cache is not rescanned on every write.
+EVICT_TO_FRACTION = 0.9
+CACHED_FIELDS = ("last", "choices", "events")
+# ``put`` writes ``created_at`` first, so eviction can read it without parsing the whole entry.
+_CREATED_AT = re.compile(rb'^\{"created_at": ([0-9.eE+-]+)')
+_HEADER_BYTES = 64
+
+
+class ResponseCache:
+    """Stores Codex payloads as ``<sha256>.json`` files under ``root``.
+
+    Entries expire ``ttl_seconds`` after they were stored. A hit refreshes
+    the file mtime. ``put`` keeps a running estimate of the directory size
+    and only scans it for eviction once the estimate passes ``max_bytes``;
+    eviction then drops expired entries and the least recently used ones
+    until the directory is back under ``EVICT_TO_FRACTION`` of the limit.
+    Hit/miss counters live in ``stats.json`` and are updated under an
+    ``flock`` so concurrent CLI runs and the daemon agree.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Bytes of entries on disk as of the last scan plus what this process wrote since.
+        self._estimated_bytes: Optional[int] = None
+
+    @staticmethod
+    def make_key(args: List[str], prompt: str) -> str:
+        """Hash the Codex flags (model/profile/sandbox) and the full prompt payload."""
+
+        material = json.dumps({"args": args, "prompt": prompt}, sort_keys=True)
+        import hashlib
+
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._entry_path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self._record("misses")
+            return None
+        except (OSError, json.JSONDecodeError) as exc:
+            LOGGER.warning("Discarding unreadable cache entry %s: %s", path.name, exc)
+            path.unlink(missing_ok=True)
+            self._record("misses")
+            return None
+        if self._expired(float(entry.get("created_at", 0))):
+            path.unlink(missing_ok=True)
+            self._record("expired")
+            return None
+        os.utime(path)
+        self._record("hits")
+        return entry.get("data")
+
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "created_at": time.time(),
+            "data": {field: data[field] for field in CACHED_FIELDS if field in data},
+        }
+        import tempfile
+
+        payload = json.dumps(entry).encode("utf-8")
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix=".entry-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(payload)
+            os.replace(tmp_name, self._entry_path(key))
+        except OSError as exc:
+            LOGGER.warning("Failed to write cache entry: %s", exc)
+            Path(tmp_name).unlink(missing_ok=True)
+            return
+        self._record("stores")
+        with self._lock:
+            if self._estimated_bytes is None:
+                self._estimated_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._estimated_bytes += len(payload)
+            over = self._estimated_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones until below ``EVICT_TO_FRACTION`` of the limit.
+
+        Expiry uses the stored ``created_at``, like ``get``; the mtime only
+        orders entries for LRU eviction.
+        """
+
+        entries = []
+        removed = 0
+        for mtime, size, path in self._entries():
+            # Hits only move the mtime forward, so an entry untouched for a full TTL is past it.
+            if self._expired(mtime) or self._expired(self._created_at(path)):
+                path.unlink(missing_ok=True)
+                removed += 1
+                continue
+            entries.append((mtime, size, path))
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO_FRACTION
+        for _, size, path in sorted(entries, key=lambda item: item[0]):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        with self._lock:
+            self._estimated_bytes = total
+        if removed:
+            self._record("evictions", removed)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._locked_stats() as counters:
+            snapshot = dict(counters)
+        entries = [path for path in self.root.glob("*.json") if path.name != "stats.json"]
+        lookups = snapshot.get("hits", 0) + snapshot.get("misses", 0) + snapshot.get("expired", 0)
+        snapshot.update(
+            {
+                "entries": len(entries),
+                "bytes": sum(path.stat().st_size for path in entries if path.exists()),
+                "hit_rate": round(snapshot.get("hits", 0) / lookups, 4) if lookups else None,
+                "ttl_seconds": self.ttl_seconds,
+                "max_bytes": self.max_bytes,
+                "path": str(self.root),
+            }
+        )
+        return snapshot
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        """``(mtime, size, path)`` of every entry file."""
+
+        entries = []
+        for path in self.root.glob("*.json"):
+            if path.name == "stats.json":
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.ttl_seconds
+
+    @staticmethod
+    def _created_at(path: Path) -> float:
+        """The entry's ``created_at``; ``0`` (expired) when it cannot be read."""
+
+        try:
+            with path.open("rb") as handle:
+                header = handle.read(_HEADER_BYTES)
+        except OSError:
+            return 0.0
+        match = _CREATED_AT.match(header)
+        if match is None:
+            try:
+                return float(json.loads(path.read_text(encoding="utf-8")).get("created_at", 0))
+            except (OSError, ValueError, AttributeError):
+                return 0.0
+        return float(match.group(1))
+
+    def _record(self, counter: str, amount: int = 1) -> None:
+        try:
+            with self._locked_stats(write=True) as counters:
+                counters[counter] = counters.get(counter, 0) + amount
+        except OSError as exc:  # pragma: no cover - stats are best effort
+            LOGGER.debug("Could not update cache stats: %s", exc)
+
+    @contextmanager
+    def _locked_stats(self, write: bool = False) -> Iterator[Dict[str, int]]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        stats_path = self.root / "stats.json"
+        with self._lock, (self.root / ".stats.lock").open("a") as lock_handle:
+            fcntl.flock(lock_handle, fcntl.LOCK_EX)
+            try:
+                try:
+                    counters = json.loads(stats_path.read_text(encoding="utf-8"))
+                except (FileNotFoundError, json.JSONDecodeError):
+                    counters = {}
+                yield counters
+                if write:
+                    stats_path.write_text(json.dumps(counters), encoding="utf-8")
+            finally:
+                fcntl.flock(lock_handle, fcntl.LOCK_UN)
+
+
+def from_config(home: Path, config: Dict[str, Any]) -> Optional[ResponseCache]:
+    """Build the cache when ``cache.enabled`` (or ``PAI_CACHE=1``) turns it on."""
+
+    cache_cfg = config.get("cache", {})
+    env_flag = os.getenv("PAI_CACHE")
+    enabled = env_flag not in {"0", "false", "no"} if env_flag is not None else bool(cache_cfg.get("enabled"))
+    if not enabled:
+        return None
+    root = Path(cache_cfg.get("path") or home / "cache" / "responses")
+    if not root.is_absolute():
+        root = home / root
+    return ResponseCache(
+        root,
+        ttl_seconds=float(cache_cfg.get("ttl_seconds", DEFAULT_TTL_SECONDS)),
+        max_bytes=int(cache_cfg.get("max_bytes", DEFAULT_MAX_BYTES)),
+    )
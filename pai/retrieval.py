@@ -0,0 +1,418 @@
+"""Local hybrid retrieval (hashed n-gram vectors + BM25) over memory, archives, summaries and project notes."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import zlib
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from search_index import BM25_B, BM25_K1, tokenize
+
+LOGGER = logging.getLogger(__name__)
+
+# NumPy is optional; without it scoring runs over sparse vectors in pure Python.
+numpy: Any = None
+
+DIMENSIONS = 1024
+NGRAM_CHARS = 3
+DEFAULT_TOP_K = 5
+DEFAULT_MIN_SCORE = 0.1
+DEFAULT_VECTOR_WEIGHT = 0.5
+MAX_CHUNK_CHARS = 4000
+KIND_MEMORY = "memory"
+KIND_ARCHIVE = "archive"
+KIND_PROJECT = "project"
+KIND_SUMMARY = "summary"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    recency TEXT,
+    digest TEXT NOT NULL,
+    text TEXT NOT NULL,
+    terms TEXT NOT NULL,
+    buckets BLOB NOT NULL,
+    weights BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+@dataclass
+class Chunk:
+    """One retrievable block: a dated memory section, a summary line or a project-notes heading block."""
+
+    kind: str
+    name: str
+    text: str
+    recency: Optional[str] = None
+
+
+@dataclass
+class RetrievalHit:
+    kind: str
+    name: str
+    path: str
+    text: str
+    recency: Optional[str]
+    score: float
+    vector_score: float
+    keyword_score: float
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "path": self.path,
+            "recency": self.recency,
+            "score": self.score,
+            "vector_score": self.vector_score,
+            "keyword_score": self.keyword_score,
+        }
+
+
+def embed(text: str) -> Dict[int, float]:
+    """Signed feature-hashed character n-grams and words, L2-normalized, as ``{bucket: weight}``.
+
+    ``zlib.crc32`` rather than ``hash()`` keeps buckets stable across
+    processes, so stored vectors stay valid.
+    """
+
+    tokens = tokenize(text)
+    padded = " " + " ".join(tokens) + " "
+    features = [padded[index:index + NGRAM_CHARS] for index in range(len(padded) - NGRAM_CHARS + 1)]
+    features.extend("w:" + token for token in tokens)
+    vector: Dict[int, float] = {}
+    for feature in features:
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        bucket = hashed % DIMENSIONS
+        vector[bucket] = vector.get(bucket, 0.0) + (1.0 if hashed & 0x80000000 else -1.0)
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if not norm:
+        return {}
+    return {bucket: weight / norm for bucket, weight in vector.items() if weight}
+
+
+class RetrievalIndex:
+    """Chunks of ``memory.md``, the memory archive and ``projects/*.md`` with hybrid scoring.
+
+    The archive contributes each ``memory-*.md`` day and each line of
+    ``summaries.md``.
+
+    ``refresh`` stats every source and re-chunks only files whose mtime or
+    size changed; a chunk whose text is unchanged keeps its stored vector.
+    ``search`` blends the cosine of hashed n-gram vectors (catches partial
+    words and spelling variants) with BM25 over chunk terms (rewards exact
+    rare words). The chunk table is loaded into memory once per index
+    change, so repeated queries in the daemon only pay for scoring.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        home: Path,
+        *,
+        vector_weight: float = DEFAULT_VECTOR_WEIGHT,
+    ) -> None:
+        self.db_path = db_path
+        self.home = home
+        self.vector_weight = min(max(vector_weight, 0.0), 1.0)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._loaded: Optional[str] = None
+        self._rows: List[Tuple[str, str, str, Optional[str], str]] = []
+        self._terms: List[Counter] = []
+        self._lengths: List[int] = []
+        self._vectors: List[Dict[int, float]] = []
+        self._matrix: Any = None
+        self._df: Counter = Counter()
+        self._avg_length = 0.0
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # -- indexing -----------------------------------------------------------------
+
+    def sources(self) -> Iterator[Tuple[str, Path]]:
+        from context_assembler import SUMMARIES_PATH
+
+        yield KIND_MEMORY, self.home / "memory.md"
+        yield from ((KIND_ARCHIVE, path) for path in sorted((self.home / "archive" / "memory").glob("memory-*.md")))
+        yield KIND_SUMMARY, self.home / SUMMARIES_PATH
+        yield from ((KIND_PROJECT, path) for path in sorted((self.home / "projects").glob("*.md")))
+
+    def refresh(self) -> Dict[str, int]:
+        """Re-chunk changed sources and drop removed ones; returns counts of files and embedded chunks."""
+
+        current: Dict[str, Tuple[str, Path, os.stat_result]] = {}
+        for kind, path in self.sources():
+            try:
+                current[str(path)] = (kind, path, path.stat())
+            except FileNotFoundError:
+                continue
+        with self._lock:
+            changed, removed = self._diff(current)
+            if not changed and not removed:
+                return {"files": 0, "removed": 0, "embedded": 0}
+            embedded = 0
+            with self.conn:
+                # Take the write lock, then re-diff: another process may have indexed these already.
+                self.conn.execute("BEGIN IMMEDIATE")
+                changed, removed = self._diff(current)
+                for key in changed:
+                    kind, path, stat = current[key]
+                    embedded += self._index_source(kind, path, stat)
+                for key in removed:
+                    self.conn.execute("DELETE FROM chunks WHERE path = ?", (key,))
+                    self.conn.execute("DELETE FROM sources WHERE path = ?", (key,))
+                if changed or removed:
+                    self._bump_generation()
+        if embedded or removed:
+            LOGGER.debug(
+                "Retrieval index refreshed: %s files, %s chunks embedded, %s removed",
+                len(changed),
+                embedded,
+                len(removed),
+            )
+        return {"files": len(changed), "removed": len(removed), "embedded": embedded}
+
+    def _diff(self, current: Dict[str, Tuple[str, Path, os.stat_result]]) -> Tuple[List[str], Set[str]]:
+        known = {path: (mtime_ns, size) for path, mtime_ns, size in self.conn.execute("SELECT * FROM sources")}
+        changed = [key for key, (_, _, stat) in current.items() if known.get(key) != (stat.st_mtime_ns, stat.st_size)]
+        return changed, known.keys() - current.keys()
+
+    def _index_source(self, kind: str, path: Path, stat: os.stat_result) -> int:
+        try:
+            text = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError) as exc:
+            LOGGER.warning("Skipping %s for retrieval: %s", path, exc)
+            text = ""
+        key = str(path)
+        existing = {
+            (name, digest): row_id
+            for row_id, name, digest in self.conn.execute("SELECT id, name, digest FROM chunks WHERE path = ?", (key,))
+        }
+        embedded = 0
+        for chunk in chunk_source(kind, path, text):
+            digest = hashlib.sha1(chunk.text.encode("utf-8")).hexdigest()
+            row_id = existing.pop((chunk.name, digest), None)
+            if row_id is not None:
+                continue
+            vector = embed(chunk.text)
+            self.conn.execute(
+                "INSERT INTO chunks (path, kind, name, recency, digest, text, terms, buckets, weights) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    chunk.kind,
+                    chunk.name,
+                    chunk.recency,
+                    digest,
+                    chunk.text,
+                    json.dumps(Counter(tokenize(chunk.text)), separators=(",", ":")),
+                    array("i", vector.keys()).tobytes(),
+                    array("f", vector.values()).tobytes(),
+                ),
+            )
+            embedded += 1
+        stale = list(existing.values())
+        self.conn.executemany("DELETE FROM chunks WHERE id = ?", [(row_id,) for row_id in stale])
+        self.conn.execute(
+            "INSERT INTO sources (path, mtime_ns, size) VALUES (?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns, size = excluded.size",
+            (key, stat.st_mtime_ns, stat.st_size),
+        )
+        return embedded
+
+    # -- querying -----------------------------------------------------------------
+
+    def search(
+        self,
+        query: str,
+        top_k: int = DEFAULT_TOP_K,
+        *,
+        min_score: float = 0.0,
+        exclude_paths: Iterable[str] = (),
+    ) -> List[RetrievalHit]:
+        """Best ``top_k`` chunks for ``query`` by blended score, skipping chunks from ``exclude_paths``."""
+
+        self.refresh()
+        with self._lock:
+            self._load()
+            if not self._rows or top_k <= 0:
+                return []
+            vector_scores = self._vector_scores(embed(query))
+            keyword_scores = self._keyword_scores(tokenize(query))
+        top_keyword = max(keyword_scores.values(), default=0.0)
+        excluded = set(exclude_paths)
+        scored = []
+        for index, (path, kind, name, recency, text) in enumerate(self._rows):
+            if path in excluded:
+                continue
+            keyword = keyword_scores.get(index, 0.0) / top_keyword if top_keyword else 0.0
+            vector = max(vector_scores[index], 0.0)
+            score = self.vector_weight * vector + (1 - self.vector_weight) * keyword
+            if score > 0 and score >= min_score:
+                scored.append(
+                    RetrievalHit(kind, name, path, text, recency, round(score, 4), round(vector, 4), round(keyword, 4))
+                )
+        scored.sort(key=lambda hit: (-hit.score, hit.name))
+        return scored[:top_k]
+
+    def _load(self) -> None:
+        generation = self._meta("generation") or "0"
+        if generation == self._loaded:
+            return
+        rows: List[Tuple[str, str, str, Optional[str], str]] = []
+        terms: List[Counter] = []
+        vectors: List[Dict[int, float]] = []
+        for path, kind, name, recency, text, term_json, buckets, weights in self.conn.execute(
+            "SELECT path, kind, name, recency, text, terms, buckets, weights FROM chunks ORDER BY id"
+        ):
+            rows.append((path, kind, name, recency, text))
+            terms.append(Counter(json.loads(term_json)))
+            indices, values = array("i"), array("f")
+            indices.frombytes(buckets)
+            values.frombytes(weights)
+            vectors.append(dict(zip(indices, values)))
+        self._rows, self._terms, self._vectors = rows, terms, vectors
+        self._lengths = [sum(counts.values()) for counts in terms]
+        self._df = Counter(token for counts in terms for token in counts)
+        self._avg_length = sum(self._lengths) / len(terms) if terms else 0.0
+        self._matrix = None
+        if _import_numpy() and vectors:
+            matrix = numpy.zeros((len(vectors), DIMENSIONS), dtype=numpy.float32)
+            for row, vector in enumerate(vectors):
+                matrix[row, list(vector.keys())] = list(vector.values())
+            self._matrix = matrix
+        self._loaded = generation
+
+    def _vector_scores(self, query: Dict[int, float]) -> List[float]:
+        if not query:
+            return [0.0] * len(self._rows)
+        if self._matrix is not None:
+            dense = numpy.zeros(DIMENSIONS, dtype=numpy.float32)
+            dense[list(query.keys())] = list(query.values())
+            return (self._matrix @ dense).tolist()
+        return [sum(weight * vector.get(bucket, 0.0) for bucket, weight in query.items()) for vector in self._vectors]
+
+    def _keyword_scores(self, tokens: List[str]) -> Dict[int, float]:
+        total = len(self._terms)
+        scores: Dict[int, float] = {}
+        for token in set(tokens):
+            df = self._df.get(token, 0)
+            if not df:
+                continue
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for index, counts in enumerate(self._terms):
+                tf = counts.get(token)
+                if not tf:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[index] / (self._avg_length or 1))
+                scores[index] = scores.get(index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    # -- meta ---------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        sources, = self.conn.execute("SELECT COUNT(*) FROM sources").fetchone()
+        chunks, = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+        return {"sources": sources, "chunks": chunks, "numpy": _import_numpy()}
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _bump_generation(self) -> None:
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('generation', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+
+def chunk_source(kind: str, path: Path, text: str) -> List[Chunk]:
+    """Memory and archives split at ``## YYYY-MM-DD``, summaries per line, project notes at ``##`` headings."""
+
+    from context_assembler import split_markdown, summary_lines
+    from optimize_memory import parse_sections
+
+    chunks: List[Chunk] = []
+    if kind == KIND_SUMMARY:
+        seen_days: Counter = Counter()
+        for line in summary_lines(text):
+            day = line[2:].partition(":")[0].strip()
+            seen_days[day] += 1
+            suffix = f"#{seen_days[day]}" if seen_days[day] > 1 else ""
+            chunks.append(Chunk(kind, f"{kind}:{day}{suffix}", line[:MAX_CHUNK_CHARS], day))
+        return chunks
+    if kind == KIND_PROJECT:
+        slug = path.stem
+        for title, block in split_markdown(text):
+            chunks.append(Chunk(kind, f"project:{slug}:{title}", block[:MAX_CHUNK_CHARS]))
+        return chunks
+    seen: Counter = Counter()
+    for heading, lines in parse_sections(text):
+        body = "\n".join([f"## {heading}"] + lines).strip()
+        if not body.partition("\n")[2].strip():
+            continue
+        seen[heading] += 1
+        # A day can appear twice (appended after a later date, or merged archives).
+        suffix = f"#{seen[heading]}" if seen[heading] > 1 else ""
+        chunks.append(Chunk(kind, f"{kind}:{heading}{suffix}", body[:MAX_CHUNK_CHARS], heading))
+    return chunks
+
+
+def _import_numpy() -> bool:
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ModuleNotFoundError:  # pragma: no cover - optional dependency
+            return False
+        numpy = module
+    return True
+
+
+def default_index_path(home: Path) -> Path:
+    return Path(os.getenv("PAI_RETRIEVAL_INDEX", home / "tmp" / "retrieval-index.sqlite"))
+
+
+def from_config(home: Path, config: Dict[str, Any]) -> Optional[RetrievalIndex]:
+    """Index for ``context.retrieval``; ``None`` when disabled (or ``PAI_RETRIEVAL=0``)."""
+
+    retrieval_cfg = config.get("context", {}).get("retrieval", {})
+    override = os.getenv("PAI_RETRIEVAL")
+    enabled = override != "0" if override is not None else bool(retrieval_cfg.get("enabled", False))
+    if not enabled:
+        return None
+    return RetrievalIndex(
+        default_index_path(home),
+        home,
+        vector_weight=float(retrieval_cfg.get("vector_weight", DEFAULT_VECTOR_WEIGHT)),
+    )
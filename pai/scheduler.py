@@ -3,21 +3,29 @@
 from __future__ import annotations
 
 import argparse
+import functools
+import json
 import logging
 import os
-import time
+import signal
+from datetime import datetime
 from pathlib import Path
-from typing import Callable, Optional
-
-try:
-    import schedule
-except ImportError as exc:  # pragma: no cover - runtime guard
-    raise SystemExit("Install the 'schedule' package to use scheduler.py") from exc
+from typing import Any, Dict, List, Optional
 
+import metrics
+from scheduler_engine import (
+    Cron,
+    Interval,
+    Job,
+    JobStore,
+    Schedule,
+    SchedulerEngine,
+    default_db_path,
+    parse_interval,
+)
 from server import PAIClient
 
 LOGGER = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
 
 
 def _install_file_handler() -> None:
@@ -27,75 +35,160 @@ def _install_file_handler() -> None:
     handler = logging.FileHandler(log_dir / "scheduler.log")
     handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
     LOGGER.addHandler(handler)
+    logging.getLogger("scheduler_engine").addHandler(handler)
 
 
+DEFAULT_JOBS: List[Dict[str, Any]] = [
+    {
+        "name": "morning_briefing",
+        "cron": "0 8 * * *",
+        "prompt": "Provide my morning briefing with calendar, weather, and focus items.",
+    },
+    {
+        "name": "project_summary",
+        "cron": "0 16 * * 5",
+        "prompt": "Summarize progress on all active projects.",
+    },
+]
 
-def safe_job(
-    name: str,
-    func: Callable[[], None],
-    *,
-    on_complete: Optional[Callable[[str], None]] = None,
-) -> Callable[[], None]:
-    """Wrap a job with logging, error handling, and completion hook."""
 
-    def wrapper() -> None:
-        LOGGER.info("Running job: %s", name)
-        try:
-            func()
-        except Exception as exc:  # pragma: no cover - runtime guard
-            LOGGER.exception("Job %s failed: %s", name, exc)
-        else:
-            LOGGER.info("Job %s completed", name)
-            if on_complete:
-                on_complete(name)
+MEMORY_SUMMARY_JOB = "memory_summarize"
+DEFAULT_SUMMARY_CHECK_SECONDS = 900
+
+
+class _TemplateFields(dict):
+    def __missing__(self, key: str) -> str:
+        # Unknown placeholders stay literal instead of failing the job.
+        return "{" + key + "}"
+
+
+def render_prompt(definition: Dict[str, Any], now: Optional[datetime] = None) -> str:
+    """Fill ``{job}``, ``{project}``, ``{date}``, ``{time}``, ``{weekday}`` and ``{now}`` in a prompt."""
+
+    moment = now or datetime.now()
+    fields = _TemplateFields(
+        job=definition["name"],
+        project=definition.get("project") or "",
+        date=moment.date().isoformat(),
+        time=moment.strftime("%H:%M"),
+        weekday=moment.strftime("%A"),
+        now=moment.isoformat(timespec="seconds"),
+    )
+    return str(definition["prompt"]).format_map(fields)
+
+
+def run_prompt_job(client: PAIClient, definition: Dict[str, Any]) -> None:
+    timeout = definition.get("timeout_seconds")
+    with metrics.labels(job=definition["name"]):
+        data = client.chat(
+            render_prompt(definition),
+            definition.get("project"),
+            timeout=float(timeout) if timeout else None,
+        )
+    if data.get("error"):
+        raise RuntimeError(data["error"])
 
-    return wrapper
 
+def run_memory_summary_job(client: PAIClient) -> None:
+    import optimize_memory
 
-def morning_briefing(client: PAIClient) -> None:
-    client.chat("Provide my morning briefing with calendar, weather, and focus items.")
+    optimize_memory.summarize_memory(client)
 
 
-def project_summary(client: PAIClient) -> None:
-    client.chat("Summarize progress on all active projects.")
+def memory_summary_job(client: PAIClient, config: Dict[str, Any]) -> Optional[Job]:
+    """Built-in job that keeps ``memory.md`` under ``memory.auto_summarize_after`` dated sections."""
+
+    memory_cfg = config.get("memory", {})
+    if int(memory_cfg.get("auto_summarize_after", 0)) <= 0:
+        return None
+    every = float(memory_cfg.get("summarize_check_seconds", DEFAULT_SUMMARY_CHECK_SECONDS))
+    return Job(
+        MEMORY_SUMMARY_JOB,
+        functools.partial(run_memory_summary_job, client),
+        Interval(every),
+        catch_up=False,
+        fingerprint=json.dumps([MEMORY_SUMMARY_JOB, memory_cfg], sort_keys=True),
+    )
 
 
-def _register_jobs(
+def build_jobs(
     client: PAIClient,
+    definitions: List[Dict[str, Any]],
     *,
-    interval_minutes: Optional[int] = None,
-    interval_seconds: Optional[int] = None,
-    on_complete: Optional[Callable[[str], None]] = None,
-) -> None:
-    """Register scheduler jobs using either production or test cadence."""
-
-    if interval_seconds:
-        schedule.every(interval_seconds).seconds.do(
-            safe_job("morning_briefing", lambda: morning_briefing(client), on_complete=on_complete)
-        )
-        schedule.every(interval_seconds).seconds.do(
-            safe_job("project_summary", lambda: project_summary(client), on_complete=on_complete)
-        )
-        return
+    override: Optional[Interval] = None,
+) -> List[Job]:
+    """Turn ``scheduler.jobs`` entries into engine jobs, skipping (and logging) invalid ones."""
 
-    if interval_minutes:
-        schedule.every(interval_minutes).minutes.do(
-            safe_job("morning_briefing", lambda: morning_briefing(client), on_complete=on_complete)
-        )
-        schedule.every(interval_minutes).minutes.do(
-            safe_job("project_summary", lambda: project_summary(client), on_complete=on_complete)
+    jobs: List[Job] = []
+    for definition in definitions:
+        name = definition.get("name")
+        if not name or not definition.get("prompt"):
+            LOGGER.error("Skipping scheduler job without name or prompt: %s", definition)
+            continue
+        if not definition.get("enabled", True):
+            continue
+        try:
+            if override is not None:
+                cadence: Schedule = override
+            elif definition.get("cron"):
+                cadence = Cron(definition["cron"])
+            elif definition.get("every"):
+                cadence = parse_interval(definition["every"])
+            else:
+                raise ValueError("needs 'cron' or 'every'")
+        except ValueError as exc:
+            LOGGER.error("Skipping scheduler job %s: %s", name, exc)
+            continue
+        jobs.append(
+            Job(
+                name,
+                functools.partial(run_prompt_job, client, definition),
+                cadence,
+                max_concurrency=int(definition.get("max_concurrency", 1)),
+                catch_up=bool(definition.get("catch_up", True)),
+                priority=int(definition.get("priority", 0)),
+                # Smoke-test intervals stay exact so --cycles finishes predictably.
+                jitter=0.0 if override is not None else float(definition.get("jitter_seconds", 0)),
+                fingerprint=json.dumps([definition, cadence.describe()], sort_keys=True),
+            )
         )
-        return
+    return jobs
 
-    schedule.every().day.at("08:00").do(
-        safe_job("morning_briefing", lambda: morning_briefing(client), on_complete=on_complete)
-    )
-    schedule.every().friday.at("16:00").do(
-        safe_job("project_summary", lambda: project_summary(client), on_complete=on_complete)
-    )
+
+class JobConfigWatcher:
+    """Rebuilds the job list from ``config.json`` whenever its mtime changes."""
+
+    def __init__(self, client: PAIClient, *, override: Optional[Interval] = None) -> None:
+        self.client = client
+        self.override = override
+        self._stamp: Optional[int] = None
+
+    def __call__(self) -> Optional[List[Job]]:
+        try:
+            stamp = self.client.config_path.stat().st_mtime_ns
+        except OSError as exc:
+            LOGGER.error("Cannot stat %s: %s", self.client.config_path, exc)
+            return None
+        if stamp == self._stamp:
+            return None
+        try:
+            with self.client.config_path.open("r", encoding="utf-8") as handle:
+                config = json.load(handle)
+        except (OSError, json.JSONDecodeError) as exc:
+            LOGGER.error("Keeping current jobs; cannot read %s: %s", self.client.config_path, exc)
+            return None
+        if self._stamp is not None:
+            LOGGER.info("Reloading scheduler jobs from %s", self.client.config_path)
+        self._stamp = stamp
+        definitions = config.get("scheduler", {}).get("jobs", DEFAULT_JOBS)
+        jobs = build_jobs(self.client, definitions, override=self.override)
+        # Smoke-test runs (--interval-*) count completed jobs, so leave the built-in out.
+        builtin = memory_summary_job(self.client, config) if self.override is None else None
+        return jobs + [builtin] if builtin is not None else jobs
 
 
 def main(argv: Optional[list[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
     parser = argparse.ArgumentParser(description="PAI scheduler controller")
     parser.add_argument(
         "--interval-minutes",
@@ -112,6 +205,13 @@ def main(argv: Optional[list[str]] = None) -> int:
         type=int,
         help="Number of completed jobs before exiting (useful for smoke tests).",
     )
+    parser.add_argument("--workers", type=int, help="Jobs allowed to run at once (default scheduler.workers).")
+    parser.add_argument(
+        "--history",
+        type=int,
+        metavar="N",
+        help="Print the last N recorded runs as JSON and exit.",
+    )
     args = parser.parse_args(argv)
 
     home = os.getenv("PAI_HOME")
@@ -121,26 +221,46 @@ def main(argv: Optional[list[str]] = None) -> int:
     if args.interval_minutes and args.interval_seconds:
         parser.error("Specify only one of --interval-minutes or --interval-seconds")
 
+    store = JobStore(default_db_path(Path(os.environ["PAI_HOME"])))
+    if args.history:
+        print(json.dumps(store.history(limit=args.history), indent=2))
+        store.close()
+        return 0
+
     client = PAIClient()
+    scheduler_cfg = client.config.get("scheduler", {})
     completed_jobs: list[str] = []
 
     def _mark_complete(name: str) -> None:
         completed_jobs.append(name)
+        if len(completed_jobs) == args.cycles:
+            LOGGER.info("Reached %s completed jobs; shutting down", args.cycles)
+            engine.stop()
 
-    on_complete = _mark_complete if args.cycles else None
-    _register_jobs(
-        client,
-        interval_minutes=args.interval_minutes,
-        interval_seconds=args.interval_seconds,
-        on_complete=on_complete,
+    override = None
+    if args.interval_seconds:
+        override = Interval(args.interval_seconds)
+    elif args.interval_minutes:
+        override = Interval(args.interval_minutes * 60)
+
+    watcher = JobConfigWatcher(client, override=override)
+    engine = SchedulerEngine(
+        store,
+        workers=args.workers or int(scheduler_cfg.get("workers", 2)),
+        on_complete=_mark_complete if args.cycles else None,
+        reload=watcher,
+        reload_interval=float(scheduler_cfg.get("reload_seconds", 5)),
+        metrics=client.metrics,
     )
+    engine.sync(watcher() or [])
+    signal.signal(signal.SIGTERM, lambda *_: engine.stop())
     LOGGER.info("Scheduler started")
-    while True:
-        schedule.run_pending()
-        if args.cycles and len(completed_jobs) >= args.cycles:
-            LOGGER.info("Reached %s completed jobs; shutting down", args.cycles)
-            break
-        time.sleep(1)
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        LOGGER.info("Scheduler interrupted; in-flight runs will be requeued on restart")
+    finally:
+        store.close()
 
     return 0
 
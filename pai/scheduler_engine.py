@@ -0,0 +1,468 @@
+"""Deadline-heap scheduler with a SQLite-backed job queue and a bounded worker pool."""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, FrozenSet, List, Optional, Protocol, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from metrics import MetricsRegistry
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+# Upper bound on one sleep so clock jumps and external stop requests are noticed.
+MAX_SLEEP_SECONDS = 60.0
+DEFAULT_RELOAD_SECONDS = 5.0
+INTERVAL_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+INTERVAL_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+# Cron searches at most this many days ahead (covers Feb 29 in a leap year).
+CRON_HORIZON_DAYS = 366 * 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    name TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    next_due REAL NOT NULL,
+    last_finished REAL
+);
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY,
+    job TEXT NOT NULL,
+    due REAL NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    enqueued REAL NOT NULL,
+    started REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS queue_one_pending ON queue (job) WHERE state = 'pending';
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    job TEXT NOT NULL,
+    due REAL NOT NULL,
+    started REAL,
+    finished REAL NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_job ON runs (job, finished);
+"""
+
+
+class Schedule(Protocol):
+    def next_after(self, moment: float) -> float:
+        """Epoch seconds of the first due time strictly after ``moment``."""
+
+    def describe(self) -> str:
+        """Stable text form, stored so a cadence change resets the saved deadline."""
+
+
+@dataclass(frozen=True)
+class Interval:
+    seconds: float
+
+    def next_after(self, moment: float) -> float:
+        return moment + self.seconds
+
+    def describe(self) -> str:
+        return f"every {self.seconds:g}s"
+
+
+@dataclass(frozen=True)
+class Cron:
+    """Five-field cron expression (minute hour day-of-month month day-of-week) in local time.
+
+    Fields accept ``*``, numbers, ``a-b`` ranges, ``/step`` and comma lists;
+    day-of-week uses 0 or 7 for Sunday. As in cron, when both day fields are
+    restricted a day matching either one is due.
+    """
+
+    expression: str
+    minutes: FrozenSet[int] = field(init=False, repr=False, compare=False)
+    hours: FrozenSet[int] = field(init=False, repr=False, compare=False)
+    days: FrozenSet[int] = field(init=False, repr=False, compare=False)
+    months: FrozenSet[int] = field(init=False, repr=False, compare=False)
+    weekdays: FrozenSet[int] = field(init=False, repr=False, compare=False)
+    any_day: bool = field(init=False, repr=False, compare=False)
+    any_weekday: bool = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        parts = self.expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {self.expression!r}")
+        minute, hour, day, month, weekday = parts
+        object.__setattr__(self, "minutes", _cron_field(minute, 0, 59))
+        object.__setattr__(self, "hours", _cron_field(hour, 0, 23))
+        object.__setattr__(self, "days", _cron_field(day, 1, 31))
+        object.__setattr__(self, "months", _cron_field(month, 1, 12))
+        object.__setattr__(self, "weekdays", frozenset(value % 7 for value in _cron_field(weekday, 0, 7)))
+        object.__setattr__(self, "any_day", day == "*")
+        object.__setattr__(self, "any_weekday", weekday == "*")
+
+    def next_after(self, moment: float) -> float:
+        start = datetime.fromtimestamp(moment).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for _ in range(CRON_HORIZON_DAYS):
+            if self._day_matches(day):
+                for hour in sorted(self.hours):
+                    for minute in sorted(self.minutes):
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= start:
+                            return candidate.timestamp()
+            day += timedelta(days=1)
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+    def describe(self) -> str:
+        return f"cron {' '.join(self.expression.split())}"
+
+    def _day_matches(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        day_ok = day.day in self.days
+        weekday_ok = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+
+def _cron_field(text: str, low: int, high: int) -> FrozenSet[int]:
+    values = set()
+    for part in text.split(","):
+        base, _, step_text = part.partition("/")
+        step = int(step_text) if step_text else 1
+        if base == "*":
+            start, stop = low, high
+        elif "-" in base:
+            first, last = base.split("-", 1)
+            start, stop = int(first), int(last)
+        else:
+            start = int(base)
+            stop = high if step_text else start
+        if start < low or stop > high or start > stop or step < 1:
+            raise ValueError(f"Cron field {text!r} is outside {low}-{high}")
+        values.update(range(start, stop + 1, step))
+    return frozenset(values)
+
+
+def parse_interval(text: str) -> Interval:
+    """Parse ``"90"``, ``"90s"``, ``"15m"``, ``"2h"`` or ``"1d"``."""
+
+    match = INTERVAL_PATTERN.match(str(text).lower())
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError(f"Invalid interval: {text!r}")
+    return Interval(float(match.group(1)) * INTERVAL_UNITS[match.group(2)])
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], None]
+    schedule: Schedule
+    max_concurrency: int = 1
+    catch_up: bool = True
+    priority: int = 0
+    jitter: float = 0.0
+    # Identifies the definition a job was built from; equal fingerprints mean a reload is a no-op.
+    fingerprint: str = ""
+
+    def next_due(self, after: float) -> float:
+        due = self.schedule.next_after(after)
+        return due + random.uniform(0, self.jitter) if self.jitter > 0 else due
+
+
+@dataclass(order=True)
+class _Deadline:
+    due: float
+    name: str = field(compare=False)
+    job: Job = field(compare=False)
+
+
+class JobStore:
+    """Durable queue and run history; every method is safe to call from worker threads."""
+
+    def __init__(self, db_path: Path) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def saved_deadline(self, name: str, spec: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT spec, next_due FROM jobs WHERE name = ?", (name,)).fetchone()
+        if row is None or row[0] != spec:
+            return None
+        return float(row[1])
+
+    def save_deadline(self, name: str, spec: str, next_due: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (name, spec, next_due) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET spec = excluded.spec, next_due = excluded.next_due",
+                (name, spec, next_due),
+            )
+
+    def enqueue(self, name: str, due: float) -> bool:
+        """Queue one run; returns ``False`` when a run of ``name`` is already pending."""
+
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO queue (job, due, enqueued) VALUES (?, ?, ?)",
+                (name, due, time.time()),
+            )
+        return cursor.rowcount == 1
+
+    def pending(self) -> List[Tuple[int, str, float]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, job, due FROM queue WHERE state = 'pending' ORDER BY due, id"
+            ).fetchall()
+
+    def mark_running(self, entry_id: int) -> float:
+        started = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE queue SET state = 'running', started = ? WHERE id = ?", (started, entry_id)
+            )
+        return started
+
+    def finish(self, entry_id: int, name: str, due: float, started: float, status: str, error: str = "") -> None:
+        finished = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM queue WHERE id = ?", (entry_id,))
+            self._conn.execute(
+                "INSERT INTO runs (job, due, started, finished, status, error) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, due, started, finished, status, error or None),
+            )
+            self._conn.execute("UPDATE jobs SET last_finished = ? WHERE name = ?", (finished, name))
+            self._conn.execute("COMMIT")
+
+    def recover(self) -> int:
+        """Requeue runs a crashed process left in ``running``; returns how many."""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, job, due, started FROM queue WHERE state = 'running'"
+            ).fetchall()
+            self._conn.execute("BEGIN")
+            for entry_id, name, due, started in rows:
+                self._conn.execute(
+                    "INSERT INTO runs (job, due, started, finished, status, error) "
+                    "VALUES (?, ?, ?, ?, 'interrupted', 'scheduler stopped mid-run')",
+                    (name, due, started, time.time()),
+                )
+                pending = self._conn.execute(
+                    "SELECT 1 FROM queue WHERE job = ? AND state = 'pending'", (name,)
+                ).fetchone()
+                if pending:
+                    self._conn.execute("DELETE FROM queue WHERE id = ?", (entry_id,))
+                else:
+                    self._conn.execute(
+                        "UPDATE queue SET state = 'pending', started = NULL WHERE id = ?", (entry_id,)
+                    )
+            self._conn.execute("COMMIT")
+        return len(rows)
+
+    def history(self, name: Optional[str] = None, limit: int = 20) -> List[Dict[str, object]]:
+        query = "SELECT job, due, started, finished, status, error FROM runs"
+        params: Tuple[object, ...] = ()
+        if name:
+            query += " WHERE job = ?"
+            params = (name,)
+        query += " ORDER BY finished DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, params + (limit,)).fetchall()
+        keys = ("job", "due", "started", "finished", "status", "error")
+        return [dict(zip(keys, row)) for row in rows]
+
+
+class SchedulerEngine:
+    """Runs ``Job``s when due without ever blocking one job on another.
+
+    Deadlines live in a heap; the loop sleeps until the earliest one (or
+    until a worker finishes), moves due jobs into the SQLite queue and hands
+    queued runs to at most ``workers`` threads. Only one pending run per job
+    is kept, so a job that falls behind is coalesced rather than piling up,
+    and ``max_concurrency`` caps overlapping runs of the same job. Deadlines
+    are persisted, so runs missed while the process was down are queued
+    once on the next start.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        *,
+        workers: int = DEFAULT_WORKERS,
+        on_complete: Optional[Callable[[str], None]] = None,
+        reload: Optional[Callable[[], Optional[List[Job]]]] = None,
+        reload_interval: float = DEFAULT_RELOAD_SECONDS,
+        metrics: Optional["MetricsRegistry"] = None,
+    ) -> None:
+        self.store = store
+        self.metrics = metrics
+        self.workers = max(workers, 1)
+        self.on_complete = on_complete
+        self.reload = reload
+        self.reload_interval = reload_interval
+        self._next_reload = 0.0
+        self._jobs: Dict[str, Job] = {}
+        self._heap: List[_Deadline] = []
+        self._running: Dict[str, int] = {}
+        self._busy = 0
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def add(self, job: Job) -> None:
+        now = time.time()
+        spec = job.schedule.describe()
+        saved = self.store.saved_deadline(job.name, spec)
+        if saved is not None and saved <= now:
+            if job.catch_up and self.store.enqueue(job.name, saved):
+                LOGGER.info("Queued missed run of %s due %s", job.name, _stamp(saved))
+            due = job.next_due(now)
+        else:
+            due = saved if saved is not None else job.next_due(now)
+        self.store.save_deadline(job.name, spec, due)
+        with self._wake:
+            self._jobs[job.name] = job
+            heapq.heappush(self._heap, _Deadline(due, job.name, job))
+            self._wake.notify_all()
+
+    def sync(self, jobs: List[Job]) -> None:
+        """Make the registered jobs match ``jobs``: add new, replace changed, drop missing."""
+
+        with self._wake:
+            wanted = {job.name: job for job in jobs}
+            for name in list(self._jobs):
+                if name not in wanted:
+                    LOGGER.info("Removing job %s", name)
+                    del self._jobs[name]
+            for job in wanted.values():
+                current = self._jobs.get(job.name)
+                if current is not None and job.fingerprint and current.fingerprint == job.fingerprint:
+                    continue
+                LOGGER.info("%s job %s (%s)", "Updating" if current else "Adding", job.name, job.schedule.describe())
+                self.add(job)
+
+    def stop(self) -> None:
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+
+    def run(self) -> None:
+        recovered = self.store.recover()
+        if recovered:
+            LOGGER.info("Requeued %s interrupted run(s)", recovered)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pai-job")
+        try:
+            with self._wake:
+                while not self._stopping:
+                    self._maybe_reload()
+                    self._enqueue_due(time.time())
+                    self._dispatch()
+                    self._wake.wait(timeout=self._sleep_for())
+        finally:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _enqueue_due(self, now: float) -> None:
+        while self._heap and self._heap[0].due <= now:
+            deadline = heapq.heappop(self._heap)
+            job = self._jobs.get(deadline.name)
+            if job is not deadline.job:
+                # Removed or replaced by a reload; the replacement has its own deadline.
+                continue
+            if not self.store.enqueue(job.name, deadline.due):
+                LOGGER.info("Skipping duplicate run of %s; one is already queued", job.name)
+            due = job.next_due(max(now, deadline.due))
+            self.store.save_deadline(job.name, job.schedule.describe(), due)
+            heapq.heappush(self._heap, _Deadline(due, job.name, job))
+
+    def _maybe_reload(self) -> None:
+        if self.reload is None or time.monotonic() < self._next_reload:
+            return
+        self._next_reload = time.monotonic() + self.reload_interval
+        try:
+            jobs = self.reload()
+        except Exception as exc:  # pragma: no cover - runtime guard
+            LOGGER.error("Keeping current jobs; reload failed: %s", exc)
+            return
+        if jobs is not None:
+            self.sync(jobs)
+
+    def _dispatch(self) -> None:
+        assert self._executor is not None
+        runnable = [
+            (self._jobs[name], entry_id, due)
+            for entry_id, name, due in self.store.pending()
+            if name in self._jobs
+        ]
+        # Highest priority first; the store already returns equal priorities oldest first.
+        runnable.sort(key=lambda item: -item[0].priority)
+        for job, entry_id, due in runnable:
+            if self._busy >= self.workers:
+                return
+            name = job.name
+            if self._running.get(name, 0) >= job.max_concurrency:
+                continue
+            started = self.store.mark_running(entry_id)
+            self._running[name] = self._running.get(name, 0) + 1
+            self._busy += 1
+            self._executor.submit(self._execute, job, entry_id, due, started)
+
+    def _execute(self, job: Job, entry_id: int, due: float, started: float) -> None:
+        LOGGER.info("Running job: %s", job.name)
+        if self.metrics is not None:
+            self.metrics.observe("job_queue_wait_seconds", max(started - due, 0.0), job=job.name)
+        status, error = "ok", ""
+        try:
+            job.func()
+        except Exception as exc:  # pragma: no cover - runtime guard
+            LOGGER.exception("Job %s failed: %s", job.name, exc)
+            status, error = "error", str(exc)
+        else:
+            LOGGER.info("Job %s completed in %.2fs", job.name, time.time() - started)
+        if self.metrics is not None:
+            self.metrics.observe("job_seconds", time.time() - started, job=job.name, status=status)
+            self.metrics.inc("job_runs_total", job=job.name, status=status)
+        try:
+            self.store.finish(entry_id, job.name, due, started, status, error)
+        finally:
+            with self._wake:
+                self._running[job.name] -= 1
+                self._busy -= 1
+                self._wake.notify_all()
+        if status == "ok" and self.on_complete:
+            self.on_complete(job.name)
+
+    def _sleep_for(self) -> float:
+        limit = MAX_SLEEP_SECONDS
+        if self.reload is not None:
+            limit = min(limit, max(self._next_reload - time.monotonic(), 0.0))
+        if not self._heap:
+            return limit
+        return min(max(self._heap[0].due - time.time(), 0.0), limit)
+
+
+def default_db_path(home: Path) -> Path:
+    return Path(os.getenv("PAI_SCHEDULER_DB", home / "tmp" / "scheduler.sqlite"))
+
+
+def _stamp(moment: float) -> str:
+    return datetime.fromtimestamp(moment).isoformat(timespec="seconds")
@@ -0,0 +1,378 @@
+"""Incremental SQLite inverted index backing the local ``search`` tool."""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+import sqlite3
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+MAX_FILE_BYTES = 2 * 1024 * 1024
+MAX_LINE_CHARS = 400
+DEFAULT_REFRESH_INTERVAL = 30.0
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lines (
+    file_id INTEGER NOT NULL,
+    line_no INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (file_id, line_no)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    line_no INTEGER NOT NULL,
+    tf INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS postings_token ON postings (token);
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in TOKEN_PATTERN.findall(text)]
+
+
+@dataclass
+class IndexHit:
+    path: str
+    line: int
+    snippet: str
+    score: float
+
+
+@dataclass
+class ParsedQuery:
+    terms: List[str]
+    phrases: List[List[str]]
+
+    @property
+    def all_tokens(self) -> List[str]:
+        seen: Dict[str, None] = dict.fromkeys(self.terms)
+        for phrase in self.phrases:
+            seen.update(dict.fromkeys(phrase))
+        return list(seen)
+
+
+def parse_query(query: str) -> ParsedQuery:
+    """Split ``query`` into bare terms and ``"quoted phrases"``."""
+
+    phrases = [tokenize(match) for match in PHRASE_PATTERN.findall(query)]
+    remainder = PHRASE_PATTERN.sub(" ", query)
+    return ParsedQuery(terms=tokenize(remainder), phrases=[phrase for phrase in phrases if phrase])
+
+
+class SearchIndex:
+    """Token -> (file, line) postings over a workspace, refreshed by mtime/size.
+
+    ``refresh`` walks the tree with ``os.scandir`` and re-tokenizes only files
+    whose modification time or size changed, deleting rows for removed files.
+    ``search`` ranks files with BM25 over per-file term frequencies, requires
+    every ``"quoted phrase"`` to appear contiguously on a line, and returns the
+    best-matching line of each file as the snippet.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        root: Path,
+        *,
+        excluded_dirs: Iterable[str] = (),
+        suffixes: Iterable[str] = (),
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+    ) -> None:
+        self.db_path = db_path
+        self.root = root
+        self.excluded_dirs = {excluded.replace("/", os.sep) for excluded in excluded_dirs}
+        self.suffixes = {suffix.lower() for suffix in suffixes}
+        self.refresh_interval = refresh_interval
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # -- indexing -----------------------------------------------------------------
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """Bring the index up to date; skipped if refreshed within ``refresh_interval``."""
+
+        last = self._meta("refreshed_at")
+        if not force and last is not None and time.time() - float(last) < self.refresh_interval:
+            return {"indexed": 0, "removed": 0, "skipped": 1}
+
+        seen: Set[str] = set()
+        indexed = 0
+        with self.conn:
+            # Take the write lock before snapshotting so concurrent refreshers
+            # (threads or processes) serialize instead of inserting the same path.
+            self.conn.execute("BEGIN IMMEDIATE")
+            last = self._meta("refreshed_at")
+            if not force and last is not None and time.time() - float(last) < self.refresh_interval:
+                return {"indexed": 0, "removed": 0, "skipped": 1}
+            known = {
+                path: (file_id, mtime_ns, size)
+                for file_id, path, mtime_ns, size in self.conn.execute("SELECT id, path, mtime_ns, size FROM files")
+            }
+            for relative, stat in self._walk():
+                seen.add(relative)
+                current = known.get(relative)
+                if current and current[1] == stat.st_mtime_ns and current[2] == stat.st_size:
+                    continue
+                if self._index_file(relative, stat, current[0] if current else None):
+                    indexed += 1
+            removed = [known[path][0] for path in known.keys() - seen]
+            for file_id in removed:
+                self._delete_file(file_id)
+            self._set_meta("refreshed_at", str(time.time()))
+        if indexed or removed:
+            LOGGER.debug("Search index refreshed: %s indexed, %s removed", indexed, len(removed))
+        return {"indexed": indexed, "removed": len(removed), "skipped": 0}
+
+    def _walk(self) -> Iterator[Tuple[str, os.stat_result]]:
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                relative = os.path.relpath(entry.path, self.root)
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in self.excluded_dirs or relative in self.excluded_dirs:
+                        continue
+                    stack.append(Path(entry.path))
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                suffix = os.path.splitext(entry.name)[1].lower()
+                if suffix and self.suffixes and suffix not in self.suffixes:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if stat.st_size > MAX_FILE_BYTES:
+                    continue
+                yield relative, stat
+
+    def _index_file(self, relative: str, stat: os.stat_result, file_id: Optional[int]) -> bool:
+        try:
+            text = (self.root / relative).read_text(encoding="utf-8")
+        except (UnicodeDecodeError, OSError):
+            text = None
+        if file_id is not None:
+            self._delete_file(file_id)
+        if text is None:
+            # Remember undecodable files so they are not retried until they change.
+            self.conn.execute(
+                "INSERT INTO files (path, mtime_ns, size, length) VALUES (?, ?, ?, 0)",
+                (relative, stat.st_mtime_ns, stat.st_size),
+            )
+            return False
+
+        line_rows: List[Tuple[int, int, str]] = []
+        posting_rows: List[Tuple[str, int, int, int]] = []
+        length = 0
+        cursor = self.conn.execute(
+            "INSERT INTO files (path, mtime_ns, size, length) VALUES (?, ?, ?, 0)",
+            (relative, stat.st_mtime_ns, stat.st_size),
+        )
+        new_id = cursor.lastrowid
+        for line_no, line in enumerate(text.splitlines(), start=1):
+            tokens = tokenize(line)
+            if not tokens:
+                continue
+            length += len(tokens)
+            line_rows.append((new_id, line_no, line[:MAX_LINE_CHARS]))
+            for token, count in Counter(tokens).items():
+                posting_rows.append((token, new_id, line_no, count))
+        self.conn.executemany("INSERT INTO lines VALUES (?, ?, ?)", line_rows)
+        self.conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)", posting_rows)
+        self.conn.execute("UPDATE files SET length = ? WHERE id = ?", (length, new_id))
+        return True
+
+    def _delete_file(self, file_id: int) -> None:
+        self.conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM lines WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    # -- querying -----------------------------------------------------------------
+
+    def search(self, query: str, limit: int) -> List[IndexHit]:
+        parsed = parse_query(query)
+        tokens = parsed.all_tokens
+        if not tokens:
+            return []
+
+        total_files, avg_length = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(AVG(length), 0) FROM files WHERE length > 0"
+        ).fetchone()
+        if not total_files:
+            return []
+
+        # token -> file_id -> {line_no: tf}
+        postings: Dict[str, Dict[int, Dict[int, int]]] = {}
+        for token in tokens:
+            by_file: Dict[int, Dict[int, int]] = defaultdict(dict)
+            for file_id, line_no, tf in self.conn.execute(
+                "SELECT file_id, line_no, tf FROM postings WHERE token = ?", (token,)
+            ):
+                by_file[file_id][line_no] = tf
+            postings[token] = by_file
+
+        candidates: Set[int] = set()
+        for token in parsed.terms:
+            candidates.update(postings[token])
+        phrase_lines: Dict[int, Set[int]] = {}
+        if parsed.phrases:
+            phrase_candidates = self._phrase_candidates(parsed.phrases, postings)
+            candidates = set(phrase_candidates) if not parsed.terms else candidates & set(phrase_candidates)
+            phrase_lines = phrase_candidates
+        if not candidates:
+            return []
+
+        lengths = self._lengths(candidates)
+        scores: Dict[int, float] = {}
+        for token in tokens:
+            by_file = postings[token]
+            df = len(by_file)
+            if not df:
+                continue
+            idf = math.log(1 + (total_files - df + 0.5) / (df + 0.5))
+            for file_id in candidates & by_file.keys():
+                tf = sum(by_file[file_id].values())
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths.get(file_id, 0) / (avg_length or 1))
+                scores[file_id] = scores.get(file_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        hits: List[IndexHit] = []
+        for file_id, score in ranked:
+            line_no = self._best_line(file_id, tokens, postings, phrase_lines.get(file_id))
+            row = self.conn.execute(
+                "SELECT f.path, l.text FROM files f JOIN lines l ON l.file_id = f.id "
+                "WHERE f.id = ? AND l.line_no = ?",
+                (file_id, line_no),
+            ).fetchone()
+            if row is None:
+                continue
+            hits.append(IndexHit(path=row[0], line=line_no, snippet=row[1], score=round(score, 4)))
+        return hits
+
+    def _phrase_candidates(
+        self,
+        phrases: Sequence[List[str]],
+        postings: Dict[str, Dict[int, Dict[int, int]]],
+    ) -> Dict[int, Set[int]]:
+        """Files (and their lines) where every phrase occurs contiguously on one line."""
+
+        matched: Optional[Dict[int, Set[int]]] = None
+        for phrase in phrases:
+            files = set.intersection(*(set(postings[token]) for token in phrase))
+            phrase_hits: Dict[int, Set[int]] = {}
+            for file_id in files:
+                lines = set.intersection(*(set(postings[token][file_id]) for token in phrase))
+                for line_no in sorted(lines):
+                    text = self.conn.execute(
+                        "SELECT text FROM lines WHERE file_id = ? AND line_no = ?", (file_id, line_no)
+                    ).fetchone()[0]
+                    if _contains_sequence(tokenize(text), phrase):
+                        phrase_hits.setdefault(file_id, set()).add(line_no)
+            if matched is None:
+                matched = phrase_hits
+            else:
+                matched = {
+                    file_id: matched[file_id] | lines
+                    for file_id, lines in phrase_hits.items()
+                    if file_id in matched
+                }
+        return matched or {}
+
+    def _best_line(
+        self,
+        file_id: int,
+        tokens: List[str],
+        postings: Dict[str, Dict[int, Dict[int, int]]],
+        preferred: Optional[Set[int]],
+    ) -> int:
+        coverage: Counter = Counter()
+        for token in tokens:
+            for line_no in postings[token].get(file_id, {}):
+                coverage[line_no] += 1
+        if preferred:
+            for line_no in preferred:
+                coverage[line_no] += len(tokens)
+        # Most distinct query tokens first, earliest line on ties.
+        return min(coverage, key=lambda line_no: (-coverage[line_no], line_no))
+
+    def _lengths(self, file_ids: Set[int]) -> Dict[int, int]:
+        lengths: Dict[int, int] = {}
+        ordered = list(file_ids)
+        # Stay well under SQLite's bound-parameter limit.
+        for start in range(0, len(ordered), 500):
+            chunk = ordered[start:start + 500]
+            lengths.update(
+                self.conn.execute(f"SELECT id, length FROM files WHERE id IN ({_placeholders(chunk)})", chunk)
+            )
+        return lengths
+
+    # -- meta ---------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, int]:
+        files, tokens = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM files").fetchone()
+        postings = self.conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+        return {"files": files, "tokens": tokens, "postings": postings}
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+
+def _contains_sequence(tokens: List[str], phrase: List[str]) -> bool:
+    width = len(phrase)
+    return any(tokens[index:index + width] == phrase for index in range(len(tokens) - width + 1))
+
+
+def _placeholders(values: Iterable[object]) -> str:
+    return ",".join("?" for _ in values)
+
+
+def default_index_path() -> Path:
+    override = os.getenv("PAI_SEARCH_INDEX")
+    if override:
+        return Path(override)
+    home = Path(os.getenv("PAI_HOME", Path(__file__).resolve().parent))
+    return home / "tmp" / "search-index.sqlite"
@@ -3,23 +3,66 @@
 from __future__ import annotations
 
 import argparse
+import functools
 import json
 import logging
 import os
 import shlex
-import subprocess
 import sys
+import threading
+import time
+from collections import deque
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import IO, Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import codex_pool
+import metrics
+import response_cache
+import trace_store
+from context_assembler import ContextAssembler
+from tool_registry import ToolExecutionError, ToolRegistry
+from response_cache import CACHE_OFF, CACHE_REFRESH, CACHE_USE
 
 LOGGER = logging.getLogger(__name__)
-_LOG_LEVEL = logging.DEBUG if os.getenv("PAI_DEBUG") else logging.INFO
-logging.basicConfig(level=_LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s %(message)s")
 
 PAI_HOME = Path(os.getenv("PAI_HOME", Path(__file__).resolve().parent))
 DEFAULT_CONTEXT_PATH = PAI_HOME / "context.md"
 DEFAULT_CONFIG_PATH = PAI_HOME / "config.json"
+STDERR_TAIL_LINES = 200
+STDOUT_TAIL_LINES = 200
+
+OUTPUT_MINIMAL = "minimal"
+OUTPUT_STANDARD = "standard"
+OUTPUT_FULL = "full"
+OUTPUT_PROFILES = (OUTPUT_MINIMAL, OUTPUT_STANDARD, OUTPUT_FULL)
+MINIMAL_FIELDS = ("last", "error")
+RAW_FIELDS = ("raw", "stdout")
+
+
+def encode_json(payload: Any, *, pretty: bool = False) -> str:
+    """Compact single-line JSON (one JSONL record), or indented with ``pretty``."""
+
+    if pretty:
+        return json.dumps(payload, indent=2)
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def shape_response(data: Dict[str, Any], profile: str) -> Dict[str, Any]:
+    """Trim a client result to an output profile.
+
+    ``minimal`` keeps the answer (a local tool's ``result`` in place of its
+    JSON-encoded ``last``) and any error; ``standard`` drops the raw event
+    list and stdout; ``full`` returns everything the client kept, which
+    includes those only when the call was made with ``keep_raw``.
+    """
+
+    if profile == OUTPUT_FULL:
+        return data
+    if profile == OUTPUT_MINIMAL:
+        fields = ("result", "error") if "result" in data else MINIMAL_FIELDS
+        return {key: data[key] for key in fields if key in data}
+    return {key: value for key, value in data.items() if key not in RAW_FIELDS}
 
 
 @dataclass
@@ -29,14 +72,92 @@ class PAIResponse:
     ok: bool
     data: Dict[str, Any]
 
-    def to_json(self) -> str:
-        return json.dumps({"ok": self.ok, "data": self.data}, indent=2)
+    def to_json(self, *, pretty: bool = False) -> str:
+        return encode_json({"ok": self.ok, "data": self.data}, pretty=pretty)
 
 
 class ConfigurationError(RuntimeError):
     """Raised when configuration is missing or invalid."""
 
 
+class CodexEventParser:
+    """Incremental decoder for ``codex exec --json`` output, one line at a time."""
+
+    def __init__(self, *, keep_events: bool = False) -> None:
+        self.keep_events = keep_events
+        self.events: List[Dict[str, Any]] = []
+        self.event_count = 0
+        self.last_text: Optional[str] = None
+        self.error_message: Optional[str] = None
+        # Fallback answer when Codex never sends an agent message (e.g. plain-text output).
+        self.tail: Deque[str] = deque(maxlen=STDOUT_TAIL_LINES)
+        self._deltas: List[str] = []
+
+    def feed(self, line: str) -> Optional[Dict[str, Any]]:
+        """Decode one stdout line and return a stream update if it carries text."""
+
+        candidate = line.strip()
+        if not candidate:
+            return None
+        self.tail.append(candidate)
+        try:
+            event = json.loads(candidate)
+        except json.JSONDecodeError:
+            LOGGER.debug("Skipping non-JSON line from Codex: %s", candidate)
+            return None
+        if not isinstance(event, dict):
+            return None
+        self.event_count += 1
+        if self.keep_events:
+            self.events.append(event)
+        message = event.get("msg", {})
+        if not isinstance(message, dict):
+            return None
+        msg_type = message.get("type")
+        if msg_type == "agent_message":
+            payload = message.get("message")
+            text: Optional[str] = None
+            if isinstance(payload, dict):
+                role = payload.get("role")
+                content = payload.get("content")
+                if role == "assistant" and isinstance(content, str):
+                    text = content
+            elif isinstance(payload, str):
+                text = payload
+            if text is not None:
+                self.last_text = text
+                self._deltas = []
+                return {"type": "message", "text": text}
+        elif msg_type == "agent_message_delta":
+            delta = message.get("delta")
+            if isinstance(delta, str):
+                self._deltas.append(delta)
+                return {"type": "delta", "text": delta}
+        elif msg_type in {"error", "stream_error"}:
+            text = message.get("message")
+            if isinstance(text, str):
+                self.error_message = text
+                return {"type": "error", "text": text}
+        return None
+
+    @property
+    def partial_text(self) -> str:
+        """Concatenated deltas since the last complete agent message."""
+
+        return "".join(self._deltas)
+
+    @property
+    def tail_text(self) -> str:
+        return "\n".join(self.tail)
+
+
+def _drain_lines(stream: Optional[IO[str]], sink: Deque[str]) -> None:
+    if stream is None:
+        return
+    for line in stream:
+        sink.append(line)
+
+
 class PAIClient:
     """Bridge between local state and the Codex CLI."""
 
@@ -55,6 +176,20 @@ class PAIClient:
         self.model = os.getenv("PAI_MODEL", self.codex_cfg.get("model", "gpt-5-codex"))
         self.profile = os.getenv("PAI_PROFILE", self.codex_cfg.get("profile"))
         self.base_args = self._build_base_args()
+        self.cache = response_cache.from_config(PAI_HOME, self.config)
+        self.context = ContextAssembler(PAI_HOME, context_path, self.config)
+        self.tools = ToolRegistry(self.config, PAI_HOME)
+        self.metrics = metrics.from_config(PAI_HOME, self.config)
+        self.traces = trace_store.from_config(PAI_HOME, self.config)
+        self.pool = codex_pool.from_config(self.base_args, self._codex_env(), self.config)
+        self.output_profile = self._output_profile()
+
+    def _output_profile(self) -> str:
+        profile = os.getenv("PAI_OUTPUT") or self.config.get("output", {}).get("profile") or OUTPUT_STANDARD
+        if profile not in OUTPUT_PROFILES:
+            LOGGER.warning("Unknown output profile %r; using %s", profile, OUTPUT_STANDARD)
+            return OUTPUT_STANDARD
+        return profile
 
     def _load_config(self) -> Dict[str, Any]:
         if not self.config_path.exists():
@@ -87,27 +222,96 @@ class PAIClient:
             args.extend(["--model", self.model])
         return args + ["exec", "--json"]
 
-    def load_context(self) -> str:
-        if not self.context_path.exists():
-            LOGGER.error("Context file missing at %s", self.context_path)
-            raise FileNotFoundError(f"Context file not found: {self.context_path}")
-        return self.context_path.read_text(encoding="utf-8")
+    def load_context(self, path: Optional[Path] = None) -> str:
+        return self.context.load_context(path or self.context_path)
+
+    def chat(
+        self,
+        prompt: str,
+        project: Optional[str] = None,
+        *,
+        cache_mode: str = CACHE_USE,
+        timeout: Optional[float] = None,
+        keep_raw: bool = False,
+    ) -> Dict[str, Any]:
+        """Run a chat turn; ``keep_raw`` also returns every parsed event and the stdout text."""
 
-    def chat(self, prompt: str, project: Optional[str] = None) -> Dict[str, Any]:
-        system_prompt = self._system_prompt(project)
-        payload = f"{system_prompt}\n\nUser: {prompt}"
+        payload = self._chat_payload(prompt, project)
         LOGGER.debug("Executing chat prompt via Codex CLI")
-        result = self._run_codex(payload)
+        result = self._run_codex(payload, cache_mode=cache_mode, timeout=timeout, keep_raw=keep_raw)
         return result
 
-    def run_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    def chat_stream(self, prompt: str, project: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield chat events as Codex emits them; see ``stream_codex``."""
+
+        payload = self._chat_payload(prompt, project)
+        LOGGER.debug("Streaming chat prompt via Codex CLI")
+        return self.stream_codex(payload)
+
+    def run_tool(
+        self,
+        tool_name: str,
+        parameters: Dict[str, Any],
+        *,
+        cache_mode: str = CACHE_USE,
+        via_codex: bool = False,
+        timeout: Optional[float] = None,
+        keep_raw: bool = False,
+    ) -> Dict[str, Any]:
+        """Run a tool locally when ``bin/tool`` has a handler, otherwise through Codex."""
+
         LOGGER.debug("Executing tool: %s", tool_name)
-        prompt = f"Run tool {tool_name} with parameters: {json.dumps(parameters)}"
-        return self._run_codex(prompt)
+        if not self.tools.is_enabled(tool_name):
+            return self._stub_response(f"Tool {tool_name} is not enabled in config.json")
+        with metrics.labels(tool=tool_name):
+            if not via_codex and self.tools.has_local(tool_name):
+                provider = "local"
+                with self.metrics.timer("tool_seconds", provider=provider):
+                    data = self._run_local_tool(tool_name, parameters, timeout=timeout)
+            else:
+                provider = "codex"
+                prompt = f"Run tool {tool_name} with parameters: {json.dumps(parameters)}"
+                with self.metrics.timer("tool_seconds", provider=provider):
+                    data = self._run_codex(prompt, cache_mode=cache_mode, timeout=timeout, keep_raw=keep_raw)
+            status = "error" if data.get("error") else "ok"
+            self.metrics.inc("tool_calls_total", provider=provider, status=status)
+        return data
 
-    def _run_codex(self, prompt: str) -> Dict[str, Any]:
-        command = self.base_args + [prompt]
-        LOGGER.debug("Running Codex command: %s", shlex.join(command))
+    def _run_local_tool(
+        self,
+        tool_name: str,
+        parameters: Dict[str, Any],
+        *,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        try:
+            result = self.tools.run_local(tool_name, parameters, timeout=timeout)
+        except ToolExecutionError as exc:
+            LOGGER.error("Local tool %s failed: %s", tool_name, exc)
+            return self._stub_response(str(exc))
+        except Exception as exc:  # handler bugs, sqlite or I/O errors from the search index
+            LOGGER.exception("Local tool %s raised: %s", tool_name, exc)
+            return self._stub_response(f"Tool {tool_name} failed: {exc}")
+        text = json.dumps(result)
+        return {
+            "last": text,
+            "result": result,
+            "provider": "local",
+            "choices": [
+                {
+                    "message": {
+                        "role": "assistant",
+                        "content": text,
+                    }
+                }
+            ],
+        }
+
+    def _chat_payload(self, prompt: str, project: Optional[str]) -> str:
+        system_prompt = self._system_prompt(project, prompt)
+        return f"{system_prompt}\n\nUser: {prompt}"
+
+    def _codex_env(self) -> Dict[str, str]:
         env = os.environ.copy()
         bin_path = PAI_HOME / "bin"
         if bin_path.exists():
@@ -117,68 +321,259 @@ class PAIClient:
             tmp_path = PAI_HOME / "tmp"
             tmp_path.mkdir(parents=True, exist_ok=True)
             env["TMPDIR"] = str(tmp_path)
+        return env
+
+    def _cache_key(self, prompt: str) -> str:
+        # Skip the binary path so switching CODEX_BIN does not invalidate entries.
+        return response_cache.ResponseCache.make_key(self.base_args[1:], prompt)
+
+    def _cache_lookup(self, prompt: str, cache_mode: str) -> Optional[Dict[str, Any]]:
+        if self.cache is None or cache_mode != CACHE_USE:
+            return None
+        cached = self.cache.get(self._cache_key(prompt))
+        if cached is None:
+            return None
+        self.metrics.inc("cache_requests_total", result="hit")
+        LOGGER.debug("Serving Codex response from cache")
+        return dict(cached, cache="hit")
 
+    def _cache_store(self, prompt: str, cache_mode: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        if self.cache is None or cache_mode == CACHE_OFF:
+            return data
+        if data.get("error") is None:
+            self.cache.put(self._cache_key(prompt), data)
+        data["cache"] = "refresh" if cache_mode == CACHE_REFRESH else "miss"
+        self.metrics.inc("cache_requests_total", result=data["cache"])
+        return data
+
+    def _run_codex(
+        self,
+        prompt: str,
+        *,
+        cache_mode: str = CACHE_USE,
+        timeout: Optional[float] = None,
+        keep_raw: bool = False,
+    ) -> Dict[str, Any]:
+        # Cache entries hold no raw events, so ``keep_raw`` calls always run (and refresh).
+        cached = None if keep_raw else self._cache_lookup(prompt, cache_mode)
+        if cached is not None:
+            return cached
+        pooled = self._run_pooled(prompt, timeout, keep_raw=keep_raw)
+        if pooled is not None:
+            return self._cache_store(prompt, cache_mode, pooled)
+        import subprocess
+
+        command = self.base_args + [prompt]
+        LOGGER.debug("Running Codex command: %s", shlex.join(command))
+        env = self._codex_env()
+
+        started = time.perf_counter()
         try:
-            result = subprocess.run(
+            proc = subprocess.Popen(
                 command,
-                check=False,
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 text=True,
                 env=env,
             )
         except FileNotFoundError as exc:
             LOGGER.error("Codex CLI not found: %s", exc)
+            self.metrics.inc("codex_runs_total", status="missing")
             return self._stub_response("Codex CLI not installed; install @openai/codex", stderr=str(exc))
+        spawn_seconds = time.perf_counter() - started
+        self.metrics.observe("codex_spawn_seconds", spawn_seconds, provider="exec")
 
-        if result.returncode != 0:
-            stderr = result.stderr.strip()
-            LOGGER.error("Codex CLI exited with %s: %s", result.returncode, stderr)
-            return self._stub_response(
-                f"Codex CLI failed with exit code {result.returncode}; check stderr",
-                stdout=result.stdout,
-                stderr=result.stderr,
+        # Read and decode stdout as it arrives (rather than communicate()) to time the
+        # first event; raw lines are only kept for ``keep_raw`` callers and traces.
+        stderr_lines: Deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+        drain = threading.Thread(target=_drain_lines, args=(proc.stderr, stderr_lines), daemon=True)
+        drain.start()
+        timed_out = threading.Event()
+        watchdog = None
+        if timeout is not None:
+            watchdog = threading.Timer(timeout, lambda: (timed_out.set(), proc.kill()))
+            watchdog.daemon = True
+            watchdog.start()
+        parser = CodexEventParser(keep_events=keep_raw)
+        stdout_lines: Optional[List[str]] = [] if keep_raw or self.traces is not None else None
+        # Arrival offsets are only kept when tracing, so replays can reproduce pacing.
+        arrivals: Optional[List[float]] = [] if self.traces is not None else None
+        first_event: Optional[float] = None
+        output_bytes = 0
+        parse_seconds = 0.0
+        try:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                offset = time.perf_counter() - started
+                if first_event is None:
+                    first_event = offset
+                    self.metrics.observe("codex_first_event_seconds", offset, provider="exec")
+                if arrivals is not None:
+                    arrivals.append(offset)
+                if stdout_lines is not None:
+                    stdout_lines.append(line)
+                output_bytes += len(line.encode("utf-8"))
+                parse_started = time.perf_counter()
+                parser.feed(line)
+                parse_seconds += time.perf_counter() - parse_started
+            returncode = proc.wait()
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            drain.join(timeout=1)
+
+        stderr = "".join(stderr_lines)
+        timings = {"spawn": spawn_seconds, "first_event": first_event}
+        record = functools.partial(
+            self._record_run,
+            started,
+            prompt,
+            output_bytes=output_bytes,
+            lines=[line.rstrip("\n") for line in stdout_lines] if self.traces is not None and stdout_lines else None,
+            arrivals=arrivals,
+        )
+        if timed_out.is_set():
+            LOGGER.error("Codex CLI timed out after %ss", timeout)
+            data = self._stub_response(f"Codex CLI timed out after {timeout}s")
+            record(data, timings, status="timeout", returncode=proc.returncode)
+            return data
+
+        build_started = time.perf_counter()
+        stdout = "".join(stdout_lines) if keep_raw and stdout_lines is not None else None
+        data = self._build_result(returncode, parser, stderr, stdout=stdout)
+        timings["parse"] = parse_seconds + time.perf_counter() - build_started
+        self.metrics.observe("codex_parse_seconds", timings["parse"])
+        record(data, timings, returncode=returncode)
+        return self._cache_store(prompt, cache_mode, data)
+
+    def _run_pooled(
+        self,
+        prompt: str,
+        timeout: Optional[float],
+        *,
+        keep_raw: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """Answer on a warm pooled session; ``None`` means fall back to one-shot exec."""
+
+        if self.pool is None:
+            return None
+        started = time.perf_counter()
+        try:
+            stdout = self.pool.run(prompt, timeout=timeout)
+        except codex_pool.CodexPoolError as exc:
+            LOGGER.warning("Codex session pool unavailable, falling back to exec: %s", exc)
+            self.metrics.inc("codex_pool_fallbacks_total")
+            return None
+        data, parse_seconds = self._timed_parse(0, stdout, "", keep_raw=keep_raw)
+        self._record_run(
+            started,
+            prompt,
+            data,
+            {"parse": parse_seconds},
+            output_bytes=len(stdout.encode("utf-8")),
+            lines=stdout.splitlines() if self.traces is not None else None,
+            provider="pool",
+        )
+        return data
+
+    def _timed_parse(
+        self,
+        returncode: int,
+        stdout: str,
+        stderr: str,
+        *,
+        keep_raw: bool = False,
+    ) -> Tuple[Dict[str, Any], float]:
+        with self.metrics.timer("codex_parse_seconds") as timer:
+            data = self._parse_result(returncode, stdout, stderr, keep_raw=keep_raw)
+        return data, timer.elapsed
+
+    def _record_run(
+        self,
+        started: float,
+        prompt: str,
+        data: Dict[str, Any],
+        timings: Dict[str, Optional[float]],
+        *,
+        output_bytes: int,
+        lines: Optional[List[str]] = None,
+        provider: str = "exec",
+        status: Optional[str] = None,
+        returncode: Optional[int] = 0,
+        arrivals: Optional[List[float]] = None,
+    ) -> None:
+        """Feed metrics and, when tracing is on, append a replayable trace record."""
+
+        total = time.perf_counter() - started
+        status = status or ("error" if data.get("error") else "ok")
+        self.metrics.observe("codex_total_seconds", total, provider=provider)
+        self.metrics.inc("codex_runs_total", status=status, provider=provider)
+        self.metrics.inc("codex_events_total", data.get("events", 0))
+        self.metrics.inc("codex_prompt_bytes_total", len(prompt.encode("utf-8")))
+        self.metrics.inc("codex_output_bytes_total", output_bytes)
+        if self.traces is None:
+            return
+        lines = lines or []
+        offsets = arrivals if arrivals is not None and len(arrivals) == len(lines) else [None] * len(lines)
+        self.traces.append(
+            trace_store.build_record(
+                args=self.base_args[1:],
+                prompt=prompt,
+                provider=provider,
+                returncode=returncode,
+                status=status,
+                timings=dict(timings, total=total),
+                events=[
+                    [round(offset, 6) if offset is not None else None, line] for offset, line in zip(offsets, lines)
+                ],
+                stderr=data.get("stderr") or "",
+                error=data.get("error"),
             )
+        )
+
+    def _parse_result(
+        self,
+        returncode: int,
+        stdout: str,
+        stderr: str,
+        *,
+        keep_raw: bool = False,
+    ) -> Dict[str, Any]:
+        parser = CodexEventParser(keep_events=keep_raw)
+        if returncode == 0:
+            for line in stdout.splitlines():
+                parser.feed(line)
+        return self._build_result(returncode, parser, stderr, stdout=stdout if keep_raw else None)
+
+    def _build_result(
+        self,
+        returncode: int,
+        parser: CodexEventParser,
+        stderr: str,
+        *,
+        stdout: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Result dict from a fed parser; ``raw``/``stdout`` only appear when they were kept."""
 
-        messages: List[Dict[str, Any]] = []
-        last_text: Optional[str] = None
-        error_message: Optional[str] = None
-        for line in result.stdout.splitlines():
-            candidate = line.strip()
-            if not candidate:
-                continue
-            try:
-                event = json.loads(candidate)
-            except json.JSONDecodeError:
-                LOGGER.debug("Skipping non-JSON line from Codex: %s", candidate)
-                continue
-            messages.append(event)
-            message = event.get("msg", {})
-            if not isinstance(message, dict):
-                continue
-            msg_type = message.get("type")
-            if msg_type == "agent_message":
-                payload = message.get("message")
-                if isinstance(payload, dict):
-                    role = payload.get("role")
-                    content = payload.get("content")
-                    if role == "assistant" and isinstance(content, str):
-                        last_text = content
-                elif isinstance(payload, str):
-                    last_text = payload
-            elif msg_type in {"error", "stream_error"}:
-                text = message.get("message")
-                if isinstance(text, str):
-                    error_message = text
+        if returncode != 0:
+            LOGGER.error("Codex CLI exited with %s: %s", returncode, stderr.strip())
+            return self._stub_response(
+                f"Codex CLI failed with exit code {returncode}; check stderr",
+                stdout=stdout,
+                stderr=stderr,
+            )
 
+        last_text = parser.last_text
         if not last_text:
             LOGGER.debug("No assistant message found; using raw stdout")
-            last_text = error_message or result.stdout.strip() or "Codex CLI returned no assistant message."
+            last_text = parser.error_message or parser.tail_text or "Codex CLI returned no assistant message."
 
         data: Dict[str, Any] = {
-            "raw": messages,
             "last": last_text,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
+            "events": parser.event_count,
             "choices": [
                 {
                     "message": {
@@ -188,10 +583,79 @@ class PAIClient:
                 }
             ],
         }
-        if error_message:
-            data["error"] = error_message
+        if stderr:
+            data["stderr"] = stderr
+        if parser.keep_events:
+            data["raw"] = parser.events
+        if stdout is not None:
+            data["stdout"] = stdout
+        if parser.error_message:
+            data["error"] = parser.error_message
         return data
 
+    def stream_codex(self, prompt: str) -> Iterator[Dict[str, Any]]:
+        """Run Codex and yield ``message``/``delta``/``error`` events as they arrive.
+
+        Stdout is decoded one line at a time and events are not retained, so
+        memory stays flat for long runs. The final event has type ``done`` and
+        carries ``last``, ``error`` and ``returncode``.
+        """
+
+        import subprocess
+
+        command = self.base_args + [prompt]
+        LOGGER.debug("Streaming Codex command: %s", shlex.join(command))
+        started = time.perf_counter()
+        try:
+            proc = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                bufsize=1,
+                env=self._codex_env(),
+            )
+        except FileNotFoundError as exc:
+            LOGGER.error("Codex CLI not found: %s", exc)
+            message = "Codex CLI not installed; install @openai/codex"
+            yield {"type": "error", "text": message}
+            yield {"type": "done", "last": message, "error": message, "returncode": None}
+            return
+
+        stderr_tail: Deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+        drain = threading.Thread(target=_drain_lines, args=(proc.stderr, stderr_tail), daemon=True)
+        drain.start()
+        self.metrics.observe("codex_spawn_seconds", time.perf_counter() - started, provider="stream")
+        parser = CodexEventParser()
+        first_event = True
+        try:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                if first_event:
+                    self.metrics.observe("codex_first_event_seconds", time.perf_counter() - started, provider="stream")
+                    first_event = False
+                update = parser.feed(line)
+                if update is not None:
+                    yield update
+            returncode = proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            drain.join(timeout=1)
+
+        error = parser.error_message
+        if returncode != 0:
+            stderr = "".join(stderr_tail).strip()
+            LOGGER.error("Codex CLI exited with %s: %s", returncode, stderr)
+            error = f"Codex CLI failed with exit code {returncode}; check stderr"
+            yield {"type": "error", "text": error, "stderr": stderr}
+        last = parser.last_text or parser.partial_text or error or "Codex CLI returned no assistant message."
+        self.metrics.observe("codex_total_seconds", time.perf_counter() - started, provider="stream")
+        self.metrics.inc("codex_runs_total", status="error" if error else "ok", provider="stream")
+        self.metrics.inc("codex_events_total", parser.event_count)
+        yield {"type": "done", "last": last, "error": error, "returncode": returncode}
+
     def _stub_response(
         self,
         message: str,
@@ -199,11 +663,8 @@ class PAIClient:
         stderr: Optional[str] = None,
     ) -> Dict[str, Any]:
         LOGGER.info("Returning stub response: %s", message)
-        return {
+        data: Dict[str, Any] = {
             "error": message,
-            "stdout": stdout or "",
-            "stderr": stderr or "",
-            "raw": [],
             "last": message,
             "choices": [
                 {
@@ -214,35 +675,191 @@ class PAIClient:
                 }
             ],
         }
+        if stderr:
+            data["stderr"] = stderr
+        if stdout is not None:
+            data["stdout"] = stdout
+        return data
+
+    def _system_prompt(self, project: Optional[str], query: Optional[str] = None) -> str:
+        return self.context.assemble(project, self.context_path, query)
+
+
+def _add_cache_flags(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--no-cache",
+        dest="cache_mode",
+        action="store_const",
+        const=CACHE_OFF,
+        help="Bypass the response cache for this call",
+    )
+    group.add_argument(
+        "--refresh",
+        dest="cache_mode",
+        action="store_const",
+        const=CACHE_REFRESH,
+        help="Ignore any cached response but store the fresh one",
+    )
+    parser.set_defaults(cache_mode=CACHE_USE)
+
+
+def _add_output_flag(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--output",
+        choices=OUTPUT_PROFILES,
+        default=None,
+        help="Response detail: answer only, answer plus metadata, or every event and raw stdout "
+        "(default output.profile, else standard)",
+    )
+
+
+def _add_pretty_flag(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--pretty", action="store_true", help="Indent the JSON response instead of one compact line")
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
 
-    def _system_prompt(self, project: Optional[str]) -> str:
-        context = self.load_context()
-        header = "Active project: none" if not project else f"Active project: {project}"
-        return f"{header}\n\n{context}"
 
+def _parse_args(
+    argv: Optional[list[str]] = None,
+    parser_class: type[argparse.ArgumentParser] = argparse.ArgumentParser,
+) -> argparse.Namespace:
+    """Parse ``pai.sh`` arguments; subcommand parsers are built from ``parser_class`` too."""
 
-def _parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="Personal AI Infrastructure CLI")
+    parser = parser_class(prog="pai.sh", description="Personal AI Infrastructure CLI")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     chat_parser = subparsers.add_parser("chat", help="Send a chat prompt")
     chat_parser.add_argument("message", help="Prompt to send to the assistant")
     chat_parser.add_argument("--project", help="Active project slug", default=None)
+    _add_cache_flags(chat_parser)
+    _add_output_flag(chat_parser)
+    _add_pretty_flag(chat_parser)
+    chat_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print JSON lines as Codex emits them instead of one final response",
+    )
 
     tool_parser = subparsers.add_parser("run-tool", help="Execute a tool")
     tool_parser.add_argument("name", help="Tool name to run")
     tool_parser.add_argument("--params", help="JSON string of parameters", default="{}")
+    tool_parser.add_argument(
+        "--via-codex",
+        action="store_true",
+        help="Send the call through a Codex agent run even when a local handler exists",
+    )
+    _add_cache_flags(tool_parser)
+    _add_output_flag(tool_parser)
+    _add_pretty_flag(tool_parser)
+
+    batch_parser = subparsers.add_parser("run-tools", help="Execute a JSONL stream of tool calls")
+    batch_parser.add_argument(
+        "--input",
+        help="JSONL file of {\"name\", \"params\"} records (default: stdin)",
+        default="-",
+    )
+    batch_parser.add_argument("--workers", type=_positive_int, help="Concurrent tool calls", default=None)
+    batch_parser.add_argument(
+        "--order",
+        choices=("input", "completion"),
+        default="input",
+        help="Emit results in input order or as each call finishes",
+    )
+    batch_parser.add_argument(
+        "--via-codex",
+        action="store_true",
+        help="Send every call through a Codex agent run",
+    )
+    _add_cache_flags(batch_parser)
+    _add_output_flag(batch_parser)
+
+    cache_stats_parser = subparsers.add_parser("cache-stats", help="Show response cache hit/miss statistics")
+    _add_pretty_flag(cache_stats_parser)
+
+    replay_parser = subparsers.add_parser("replay", help="Benchmark the PAI layer by replaying Codex traces")
+    replay_parser.add_argument(
+        "traces",
+        nargs="*",
+        help="Trace files or directories (default: the configured trace directory)",
+    )
+    replay_parser.add_argument("--iterations", type=int, default=1, help="Passes over the trace set")
+    replay_parser.add_argument("--concurrency", type=int, default=1, help="Replays in flight at once")
+    replay_parser.add_argument(
+        "--speed",
+        type=float,
+        default=0.0,
+        help="Event pacing: 0 emits instantly, 1 reproduces recorded timing",
+    )
+    replay_parser.add_argument("--limit", type=int, default=None, help="Use at most this many traces")
+    _add_pretty_flag(replay_parser)
+
+    metrics_parser = subparsers.add_parser("metrics", help="Show call timings, latency histograms and counters")
+    metrics_parser.add_argument(
+        "--format",
+        choices=("summary", "prometheus"),
+        default="summary",
+        help="JSON summary with percentiles, or Prometheus text exposition",
+    )
+    metrics_parser.add_argument("--reset", action="store_true", help="Clear the recorded metrics")
+    metrics_parser.add_argument(
+        "--listen",
+        metavar="[HOST:]PORT",
+        help="Serve the Prometheus text format at /metrics on this address (default host 127.0.0.1)",
+    )
+    _add_pretty_flag(metrics_parser)
 
     context_parser = subparsers.add_parser("load-context", help="Print the system context")
     context_parser.add_argument("--path", help="Override context path", default=None)
+    context_parser.add_argument("--project", help="Active project slug for the section list", default=None)
+    context_parser.add_argument(
+        "--budget",
+        type=int,
+        help="Token budget to report against (default context.token_budget)",
+        default=None,
+    )
+    context_parser.add_argument(
+        "--query",
+        help="Preview the sections a chat prompt would retrieve (needs context.retrieval)",
+        default=None,
+    )
+    _add_pretty_flag(context_parser)
+
+    serve_parser = subparsers.add_parser("serve", help="Run a resident daemon for chat/run-tool/load-context")
+    serve_parser.add_argument("--socket", help="Unix socket path (default $PAI_SOCKET or PAI_HOME/tmp/pai.sock)")
+    serve_parser.add_argument("--host", help="Bind a localhost TCP port instead of a Unix socket", default=None)
+    serve_parser.add_argument("--port", type=int, help="TCP port to listen on (enables HTTP over TCP)", default=None)
+    serve_parser.add_argument("--workers", type=int, help="Maximum concurrent requests", default=None)
 
     return parser.parse_args(argv)
 
 
+def _output_profile(client: PAIClient, args: argparse.Namespace) -> str:
+    return args.output or client.output_profile
+
+
 def _cli_chat(client: PAIClient, args: argparse.Namespace) -> PAIResponse:
-    data = client.chat(args.message, project=args.project)
+    profile = _output_profile(client, args)
+    data = client.chat(
+        args.message,
+        project=args.project,
+        cache_mode=args.cache_mode,
+        keep_raw=profile == OUTPUT_FULL,
+    )
     ok = data.get("error") is None
-    return PAIResponse(ok=ok, data=data)
+    return PAIResponse(ok=ok, data=shape_response(data, profile))
+
+
+def stream_chat_lines(client: PAIClient, args: argparse.Namespace) -> Iterator[str]:
+    """Render ``chat --stream`` events as compact JSON lines."""
+
+    for event in client.chat_stream(args.message, project=args.project):
+        yield encode_json(event)
 
 
 def _cli_run_tool(client: PAIClient, args: argparse.Namespace) -> PAIResponse:
@@ -250,31 +867,271 @@ def _cli_run_tool(client: PAIClient, args: argparse.Namespace) -> PAIResponse:
         parameters = json.loads(args.params)
     except json.JSONDecodeError as exc:
         raise ValueError(f"Invalid JSON for --params: {exc}") from exc
-    data = client.run_tool(args.name, parameters)
+    profile = _output_profile(client, args)
+    data = client.run_tool(
+        args.name,
+        parameters,
+        cache_mode=args.cache_mode,
+        via_codex=args.via_codex,
+        keep_raw=profile == OUTPUT_FULL,
+    )
     ok = data.get("error") is None
-    return PAIResponse(ok=ok, data=data)
+    return PAIResponse(ok=ok, data=shape_response(data, profile))
 
 
 def _cli_load_context(client: PAIClient, args: argparse.Namespace) -> PAIResponse:
     context_path = Path(args.path) if args.path else client.context_path
-    client.context_path = context_path
-    data = {"context": client.load_context()}
+    report = client.context.build(args.project, context_path, budget=args.budget, query=args.query)
+    data = {"context": client.load_context(context_path), **report.to_payload()}
     return PAIResponse(ok=True, data=data)
 
 
+def _cli_serve(client: PAIClient, args: argparse.Namespace) -> int:
+    import daemon
+
+    daemon_cfg = client.config.get("daemon", {})
+    workers = args.workers or daemon_cfg.get("workers", daemon.DEFAULT_WORKERS)
+    socket_path = Path(args.socket) if args.socket else daemon.default_socket_path(PAI_HOME)
+    return daemon.serve(
+        client,
+        socket_path=socket_path,
+        host=args.host,
+        port=args.port,
+        workers=int(workers),
+    )
+
+
+def _read_tool_calls(source: IO[str]) -> Iterator[Dict[str, Any]]:
+    """Parse ``{name, params}`` JSONL records; malformed lines become error records."""
+
+    for line_no, line in enumerate(source, start=1):
+        candidate = line.strip()
+        if not candidate:
+            continue
+        try:
+            record = json.loads(candidate)
+        except json.JSONDecodeError as exc:
+            yield {"line": line_no, "error": f"invalid JSON on line {line_no}: {exc}"}
+            continue
+        if not isinstance(record, dict) or not isinstance(record.get("name"), str):
+            yield {"line": line_no, "error": f"line {line_no} needs a string 'name'"}
+            continue
+        params = record.get("params") or {}
+        if not isinstance(params, dict):
+            yield {"line": line_no, "error": f"line {line_no} 'params' must be a JSON object"}
+            continue
+        yield {"line": line_no, "name": record["name"], "params": params}
+
+
+def run_tool_batch(
+    client: PAIClient,
+    calls: Iterable[Dict[str, Any]],
+    *,
+    workers: int,
+    ordered: bool = True,
+    cache_mode: str = CACHE_USE,
+    via_codex: bool = False,
+    output: str = OUTPUT_STANDARD,
+) -> Iterator[Dict[str, Any]]:
+    """Run tool calls on a bounded pool sharing one client; yield result records.
+
+    Every call is limited to ``tools.timeout_seconds``. With ``ordered`` the
+    records come back in input order (each as soon as its predecessors are
+    done); otherwise they are yielded as calls finish. Each record's ``data``
+    is trimmed to the ``output`` profile before it is buffered.
+    """
+
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    timeout = client.tools.timeout
+    client.tools.set_workers(workers)
+
+    def _execute(index: int, call: Dict[str, Any]) -> Dict[str, Any]:
+        record: Dict[str, Any] = {"index": index, "line": call["line"], "name": call.get("name")}
+        if "error" in call:
+            return dict(record, ok=False, data={"error": call["error"]})
+        with metrics.labels(command="run-tools"):
+            data = client.run_tool(
+                call["name"],
+                call["params"],
+                cache_mode=cache_mode,
+                via_codex=via_codex,
+                timeout=timeout,
+                keep_raw=output == OUTPUT_FULL,
+            )
+        return dict(record, ok=data.get("error") is None, data=shape_response(data, output))
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="pai-run-tools") as executor:
+        pending = set()
+        calls_by_future: Dict[Any, Tuple[int, Dict[str, Any]]] = {}
+        finished: Dict[int, Dict[str, Any]] = {}
+        next_index = 0
+        source = enumerate(calls)
+        exhausted = False
+        while pending or not exhausted:
+            # Keep a bounded window in flight so huge inputs stream instead of queueing.
+            while not exhausted and len(pending) < workers * 2:
+                try:
+                    index, call = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(_execute, index, call)
+                calls_by_future[future] = (index, call)
+                pending.add(future)
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, call = calls_by_future.pop(future)
+                try:
+                    record = future.result()
+                except Exception as exc:  # one failing call must not cost the rest of the batch
+                    LOGGER.exception("Tool call on line %s failed: %s", call["line"], exc)
+                    record = {
+                        "index": index,
+                        "line": call["line"],
+                        "name": call.get("name"),
+                        "ok": False,
+                        "data": {"error": str(exc)},
+                    }
+                if not ordered:
+                    yield record
+                    continue
+                finished[record["index"]] = record
+            while ordered and next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+
+
+def _cli_run_tools(client: PAIClient, args: argparse.Namespace) -> int:
+    workers = args.workers or int(client.config.get("tools", {}).get("workers", 4))
+    if workers < 1:
+        LOGGER.error("tools.workers must be at least 1, got %s", workers)
+        return 2
+    try:
+        source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    except OSError as exc:
+        LOGGER.error("can't open '%s': %s", args.input, exc.strerror or exc)
+        return 2
+    failures = 0
+    try:
+        for record in run_tool_batch(
+            client,
+            _read_tool_calls(source),
+            workers=workers,
+            ordered=args.order == "input",
+            cache_mode=args.cache_mode,
+            via_codex=args.via_codex,
+            output=_output_profile(client, args),
+        ):
+            failures += 0 if record["ok"] else 1
+            print(encode_json(record), flush=True)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return 1 if failures else 0
+
+
+def _cli_cache_stats(client: PAIClient, args: argparse.Namespace) -> PAIResponse:
+    if client.cache is None:
+        return PAIResponse(ok=True, data={"enabled": False})
+    return PAIResponse(ok=True, data=dict(client.cache.stats(), enabled=True))
+
+
+def _cli_metrics(client: PAIClient, args: argparse.Namespace) -> PAIResponse:
+    if args.reset:
+        client.metrics.reset()
+    return PAIResponse(ok=True, data=metrics.summarize(client.metrics.snapshot()))
+
+
+def _cli_replay(client: PAIClient, args: argparse.Namespace) -> PAIResponse:
+    import replay
+
+    if args.traces:
+        paths = [Path(path) for path in args.traces]
+    else:
+        paths = [client.traces.root if client.traces is not None else trace_store.default_trace_dir(PAI_HOME)]
+    report = replay.run_replay(
+        paths,
+        iterations=args.iterations,
+        concurrency=args.concurrency,
+        speed=args.speed,
+        limit=args.limit,
+    )
+    return PAIResponse(ok=report["error_mismatches"] == 0, data=report)
+
+
+def _serve_metrics(client: PAIClient, address: str) -> int:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    host, _, port = address.rpartition(":")
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802 - http.server API
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus(client.metrics.snapshot()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - http.server API
+            LOGGER.debug("metrics: " + format, *args)
+
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), MetricsHandler)
+    LOGGER.info("Serving metrics on http://%s:%s/metrics", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
 COMMAND_HANDLERS = {
     "chat": _cli_chat,
     "run-tool": _cli_run_tool,
     "load-context": _cli_load_context,
+    "cache-stats": _cli_cache_stats,
+    "metrics": _cli_metrics,
+    "replay": _cli_replay,
 }
 
 
+def _configure_logging() -> None:
+    # Done here rather than at import so library users (daemon, scheduler, scripts) keep their own setup.
+    level = logging.DEBUG if os.getenv("PAI_DEBUG") else logging.INFO
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+
 def main(argv: Optional[list[str]] = None) -> int:
+    _configure_logging()
     args = _parse_args(argv)
     client = PAIClient()
-    handler = COMMAND_HANDLERS[args.command]
-    response = handler(client, args)
-    print(response.to_json())
+    if args.command == "serve":
+        return _cli_serve(client, args)
+    if args.command == "metrics" and args.listen:
+        return _serve_metrics(client, args.listen)
+    if args.command == "metrics" and args.format == "prometheus":
+        sys.stdout.write(metrics.render_prometheus(client.metrics.snapshot()))
+        return 0
+    with metrics.labels(command=args.command):
+        if args.command == "run-tools":
+            return _cli_run_tools(client, args)
+        if args.command == "chat" and args.stream:
+            for line in stream_chat_lines(client, args):
+                print(line, flush=True)
+            return 0
+        handler = COMMAND_HANDLERS[args.command]
+        response = handler(client, args)
+    print(response.to_json(pretty=args.pretty))
     return 0
 
 
@@ -0,0 +1,188 @@
+"""Speech-to-text backends for ``voice.py``: Google (online), Sphinx (offline) and a stub for tests."""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+import wave
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple, Type, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from voice_capture import Utterance
+
+LOGGER = logging.getLogger(__name__)
+
+STT_GOOGLE = "google"
+STT_SPHINX = "sphinx"
+STT_STUB = "stub"
+DEFAULT_BACKEND = STT_GOOGLE
+DEFAULT_LANGUAGE = "en-US"
+
+# A WAV path, or ``speech_recognition.AudioData`` from a microphone or ``AudioFile``.
+AudioInput = Union[Path, Any]
+
+
+class TranscriptionError(RuntimeError):
+    """The backend could not run (network, missing model, unreadable file)."""
+
+
+class STTBackend:
+    """Turns audio into text; ``None`` means the audio held no recognizable speech."""
+
+    name = ""
+    # Python packages the backend imports; voice.py checks them before starting.
+    requires: Tuple[str, ...] = ()
+
+    def __init__(self, language: str = DEFAULT_LANGUAGE) -> None:
+        self.language = language
+
+    def transcribe(self, audio: AudioInput) -> Optional[str]:
+        raise NotImplementedError
+
+    def transcribe_stream(self, utterance: "Utterance") -> Optional[str]:
+        """Transcribe an utterance that may still be being captured.
+
+        Engines with an incremental decoder consume ``utterance.chunks()`` as
+        frames arrive; the default waits for the end of speech and sends the
+        whole buffer in one request.
+        """
+
+        utterance.wait()
+        return self.transcribe_pcm(bytes(utterance.data), utterance.sample_rate, utterance.sample_width)
+
+    def transcribe_pcm(self, data: bytes, sample_rate: int, sample_width: int) -> Optional[str]:
+        raise NotImplementedError
+
+
+class _RecognizerBackend(STTBackend):
+    """Shared ``speech_recognition.Recognizer`` plumbing; subclasses pick the engine."""
+
+    requires = ("speech_recognition",)
+
+    def __init__(self, language: str = DEFAULT_LANGUAGE) -> None:
+        super().__init__(language)
+        import speech_recognition as sr  # type: ignore
+
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+
+    def load(self, path: Path) -> Any:
+        if not path.exists():
+            raise TranscriptionError(f"audio file not found: {path}")
+        try:
+            with self.sr.AudioFile(str(path)) as source:
+                return self.recognizer.record(source)
+        except (ValueError, OSError, EOFError) as exc:
+            # AudioFile reports corrupt or unsupported files as ValueError.
+            raise TranscriptionError(f"unreadable audio file {path}: {error_text(exc)}") from exc
+
+    def transcribe(self, audio: AudioInput) -> Optional[str]:
+        if isinstance(audio, Path):
+            audio = self.load(audio)
+        try:
+            return self._recognize(audio)
+        except self.sr.UnknownValueError:
+            return None
+        except self.sr.RequestError as exc:
+            raise TranscriptionError(f"{self.name} recognition failed: {exc}") from exc
+
+    def transcribe_pcm(self, data: bytes, sample_rate: int, sample_width: int) -> Optional[str]:
+        return self.transcribe(self.sr.AudioData(data, sample_rate, sample_width))
+
+    def _recognize(self, audio: Any) -> str:
+        raise NotImplementedError
+
+
+class GoogleBackend(_RecognizerBackend):
+    """Google Web Speech API; needs network access."""
+
+    name = STT_GOOGLE
+
+    def _recognize(self, audio: Any) -> str:
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class SphinxBackend(_RecognizerBackend):
+    """CMU PocketSphinx; runs fully offline once ``pocketsphinx`` is installed."""
+
+    name = STT_SPHINX
+    requires = ("speech_recognition", "pocketsphinx")
+
+    def _recognize(self, audio: Any) -> str:
+        return self.recognizer.recognize_sphinx(audio, language=self.language)
+
+
+class StubBackend(STTBackend):
+    """Deterministic transcripts without audio packages, for tests and benchmarks.
+
+    A WAV file is opened with ``wave`` (so broken files still fail) and its
+    transcript is the sidecar ``<name>.txt`` when present, else
+    ``PAI_STT_STUB_TEXT``, else the file stem with ``_``/``-`` as spaces.
+    A streamed utterance read from a WAV file gets that file's transcript
+    the same way; one from the microphone gets ``PAI_STT_STUB_TEXT`` or
+    ``hello``. ``PAI_STT_STUB_RTF`` sleeps that fraction of the audio's
+    duration to imitate a real engine's cost; streamed utterances pay it
+    chunk by chunk while they are captured, as an incremental decoder would.
+    """
+
+    name = STT_STUB
+
+    def transcribe(self, audio: AudioInput) -> Optional[str]:
+        override = os.getenv("PAI_STT_STUB_TEXT")
+        if not isinstance(audio, Path):
+            return override or "hello"
+        try:
+            with wave.open(str(audio), "rb") as handle:
+                duration = handle.getnframes() / float(handle.getframerate() or 1)
+        except (OSError, EOFError, wave.Error) as exc:
+            raise TranscriptionError(f"unreadable WAV file {audio}: {error_text(exc)}") from exc
+        factor = float(os.getenv("PAI_STT_STUB_RTF", "0") or 0)
+        if factor > 0:
+            time.sleep(duration * factor)
+        return self._file_text(audio)
+
+    def transcribe_stream(self, utterance: "Utterance") -> Optional[str]:
+        factor = float(os.getenv("PAI_STT_STUB_RTF", "0") or 0)
+        bytes_per_second = float(utterance.sample_rate * utterance.sample_width)
+        for chunk in utterance.chunks():
+            if factor > 0:
+                time.sleep(len(chunk) / bytes_per_second * factor)
+        source = getattr(utterance, "source", None)
+        if source is not None:
+            return self._file_text(source)
+        return os.getenv("PAI_STT_STUB_TEXT") or "hello"
+
+    @staticmethod
+    def _file_text(path: Path) -> Optional[str]:
+        sidecar = path.with_suffix(".txt")
+        if sidecar.exists():
+            return sidecar.read_text(encoding="utf-8").strip() or None
+        return os.getenv("PAI_STT_STUB_TEXT") or path.stem.replace("_", " ").replace("-", " ")
+
+
+def error_text(exc: BaseException) -> str:
+    """``str(exc)``, or the exception type when that is empty (``wave`` raises a bare ``EOFError``)."""
+
+    return str(exc) or type(exc).__name__
+
+
+BACKENDS: Dict[str, Type[STTBackend]] = {
+    STT_GOOGLE: GoogleBackend,
+    STT_SPHINX: SphinxBackend,
+    STT_STUB: StubBackend,
+}
+
+
+def backend_name(config: Dict[str, Any], override: Optional[str] = None) -> str:
+    """``override`` (the CLI flag), then ``PAI_STT``, then ``voice.stt``, then Google."""
+
+    name = override or os.getenv("PAI_STT") or config.get("voice", {}).get("stt") or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"unknown speech-to-text backend {name!r}; choose from {', '.join(BACKENDS)}")
+    return name
+
+
+def create(name: str, language: str = DEFAULT_LANGUAGE) -> STTBackend:
+    return BACKENDS[name](language)
@@ -0,0 +1,158 @@
+"""Registry of tools that can run in-process instead of through a Codex agent run."""
+
+from __future__ import annotations
+
+import importlib.machinery
+import importlib.util
+import logging
+import sys
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    from concurrent.futures import ThreadPoolExecutor
+
+LOGGER = logging.getLogger(__name__)
+
+DISPATCHER_PATH = Path(__file__).resolve().parent / "bin" / "tool"
+DEFAULT_TIMEOUT_SECONDS = 30.0
+DEFAULT_WORKERS = 4
+
+ToolHandler = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+class ToolExecutionError(RuntimeError):
+    """Raised when a local tool is disabled, rejects its parameters, or times out."""
+
+
+class ToolRegistry:
+    """Maps tool names to local handlers and enforces ``config.json`` tool policy.
+
+    ``tools.enabled`` lists the tools that may run at all; with
+    ``tools.allow_custom`` a tool outside that list is also accepted when a
+    definition exists at ``tools/custom/<name>.md``. Local handlers run on a
+    thread pool of ``tools.workers`` threads so ``tools.timeout_seconds`` can
+    be enforced from the moment a handler starts. A handler that overruns is
+    abandoned, not killed, and keeps its worker until it returns, so new
+    calls wait for a free worker instead of queueing behind it. Handlers
+    should stay side-effect free.
+    """
+
+    def __init__(self, config: Dict[str, Any], home: Path, *, dispatcher_path: Path = DISPATCHER_PATH) -> None:
+        tools_cfg = config.get("tools", {})
+        enabled = tools_cfg.get("enabled")
+        self.enabled = set(enabled) if enabled is not None else None
+        self.allow_custom = bool(tools_cfg.get("allow_custom", False))
+        self.timeout = float(tools_cfg.get("timeout_seconds", DEFAULT_TIMEOUT_SECONDS))
+        self.workers = max(int(tools_cfg.get("workers", DEFAULT_WORKERS)), 1)
+        self.home = home
+        self.dispatcher_path = dispatcher_path
+        self._handlers: Dict[str, ToolHandler] = {}
+        self._dispatcher_loaded = False
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_size = 0
+        # Handlers still running, including abandoned ones; at most ``workers``.
+        self._busy = 0
+        self._slots = threading.Condition()
+
+    def set_workers(self, workers: int) -> None:
+        """Allow at least ``workers`` concurrent handlers (e.g. for ``run-tools --workers``)."""
+
+        with self._slots:
+            if workers > self.workers:
+                self.workers = workers
+                self._slots.notify_all()
+
+    def register(self, name: str, handler: ToolHandler) -> None:
+        with self._lock:
+            self._handlers[name] = handler
+
+    def is_enabled(self, name: str) -> bool:
+        if self.enabled is None or name in self.enabled:
+            return True
+        return self.allow_custom and (self.home / "tools" / "custom" / f"{name}.md").exists()
+
+    def has_local(self, name: str) -> bool:
+        self._load_dispatcher()
+        return name in self._handlers
+
+    def run_local(self, name: str, params: Dict[str, Any], *, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Run a local handler and return its payload, raising ``ToolExecutionError`` on failure."""
+
+        if not self.is_enabled(name):
+            raise ToolExecutionError(f"Tool {name} is not enabled in config.json")
+        self._load_dispatcher()
+        handler = self._handlers.get(name)
+        if handler is None:
+            raise ToolExecutionError(f"Tool {name} has no local handler")
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+
+        limit = timeout if timeout is not None else self.timeout
+        if not self._acquire(limit):
+            raise ToolExecutionError(f"Tool {name} could not start: all {self.workers} tool workers are busy")
+        try:
+            future = self._pool().submit(handler, params)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=limit)
+        except FutureTimeoutError as exc:
+            raise ToolExecutionError(f"Tool {name} timed out after {limit}s") from exc
+        except ValueError as exc:
+            # The dispatcher's ToolError subclasses ValueError.
+            raise ToolExecutionError(str(exc)) from exc
+
+    def _acquire(self, timeout: Optional[float]) -> bool:
+        with self._slots:
+            if not self._slots.wait_for(lambda: self._busy < self.workers, timeout):
+                return False
+            self._busy += 1
+            return True
+
+    def _release(self, _future: Any = None) -> None:
+        with self._slots:
+            self._busy -= 1
+            self._slots.notify()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with self._lock:
+            if self._executor_size < self.workers:
+                # Threads of the old pool finish the handlers they are running, then exit.
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pai-tool")
+                self._executor_size = self.workers
+            assert self._executor is not None
+            return self._executor
+
+    def _load_dispatcher(self) -> None:
+        """Import ``bin/tool`` once and register its ``LOCAL_HANDLERS``."""
+
+        with self._lock:
+            if self._dispatcher_loaded:
+                return
+            self._dispatcher_loaded = True
+            if not self.dispatcher_path.exists():
+                LOGGER.debug("No local tool dispatcher at %s", self.dispatcher_path)
+                return
+            loader = importlib.machinery.SourceFileLoader("pai_tool_dispatcher", str(self.dispatcher_path))
+            spec = importlib.util.spec_from_loader(loader.name, loader)
+            if spec is None:
+                return
+            module = importlib.util.module_from_spec(spec)
+            # Dataclasses in the dispatcher resolve their module through sys.modules.
+            sys.modules[loader.name] = module
+            try:
+                loader.exec_module(module)
+            except Exception as exc:  # pragma: no cover - runtime guard
+                sys.modules.pop(loader.name, None)
+                LOGGER.exception("Failed to load local tool dispatcher: %s", exc)
+                return
+            for name, handler in getattr(module, "LOCAL_HANDLERS", {}).items():
+                self._handlers.setdefault(name, handler)
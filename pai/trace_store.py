@@ -0,0 +1,147 @@
+"""Opt-in, size-rotated JSONL log of Codex invocations for debugging and replay."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+TRACE_FILENAME = "codex-traces.jsonl"
+STDERR_TAIL_CHARS = 4000
+
+
+class TraceStore:
+    """Appends one JSON line per Codex run and rotates ``codex-traces.jsonl`` past ``max_bytes``.
+
+    Rotation mirrors ``logging.handlers.RotatingFileHandler``: the live file
+    becomes ``.1``, older files shift up, and anything beyond ``backups`` is
+    deleted. Records carry hashes, not prompts, so traces can be shared
+    without leaking context files.
+    """
+
+    def __init__(self, root: Path, *, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS) -> None:
+        self.root = root
+        self.path = root / TRACE_FILENAME
+        self.max_bytes = max_bytes
+        self.backups = max(backups, 0)
+        self._lock = threading.Lock()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        encoded = line.encode("utf-8")
+        with self._lock:
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                size = self.path.stat().st_size if self.path.exists() else 0
+                if size and size + len(encoded) > self.max_bytes:
+                    self._rotate()
+                with self.path.open("ab") as handle:
+                    handle.write(encoded)
+            except OSError as exc:
+                LOGGER.warning("Could not write Codex trace to %s: %s", self.path, exc)
+
+    def files(self) -> List[Path]:
+        """Trace files oldest first."""
+
+        rotated = [self.path.with_name(f"{TRACE_FILENAME}.{index}") for index in range(self.backups, 0, -1)]
+        return [path for path in rotated + [self.path] if path.exists()]
+
+    def _rotate(self) -> None:
+        if self.backups == 0:
+            self.path.unlink(missing_ok=True)
+            return
+        oldest = self.path.with_name(f"{TRACE_FILENAME}.{self.backups}")
+        oldest.unlink(missing_ok=True)
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{TRACE_FILENAME}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{TRACE_FILENAME}.{index + 1}"))
+        os.replace(self.path, self.path.with_name(f"{TRACE_FILENAME}.1"))
+
+
+def build_record(
+    *,
+    args: List[str],
+    prompt: str,
+    provider: str,
+    returncode: Optional[int],
+    timings: Dict[str, Optional[float]],
+    events: List[List[Any]],
+    stderr: str,
+    error: Optional[str],
+    status: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Trace record; ``events`` holds ``[offset_seconds, stdout_line]`` pairs.
+
+    ``status`` is the ``codex_runs_total`` label (``ok``, ``error`` or
+    ``timeout``); a timed-out run carries the killed process's return code.
+    """
+
+    return {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "args_hash": _sha256(json.dumps(args)),
+        "prompt_hash": _sha256(prompt),
+        "prompt_bytes": len(prompt.encode("utf-8")),
+        "provider": provider,
+        "returncode": returncode,
+        "status": status,
+        "timings": {key: round(value, 6) if value is not None else None for key, value in timings.items()},
+        "events": events,
+        "stderr": stderr[-STDERR_TAIL_CHARS:],
+        "error": error,
+    }
+
+
+def iter_records(paths: List[Path]) -> Iterator[Dict[str, Any]]:
+    """Yield trace records from ``paths`` (files or directories), skipping unreadable lines."""
+
+    for path in paths:
+        files = TraceStore(path).files() if path.is_dir() else [path]
+        for trace_file in files:
+            with trace_file.open("r", encoding="utf-8") as handle:
+                for line_no, line in enumerate(handle, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        LOGGER.warning("Skipping malformed trace %s:%s", trace_file, line_no)
+                        continue
+                    if isinstance(record, dict) and isinstance(record.get("events"), list):
+                        yield record
+
+
+def _sha256(text: str) -> str:
+    import hashlib
+
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def default_trace_dir(home: Path) -> Path:
+    return Path(os.getenv("PAI_TRACE_DIR", home / "tmp" / "traces"))
+
+
+def from_config(home: Path, config: Dict[str, Any]) -> Optional[TraceStore]:
+    """Build the store when ``trace.enabled`` (or ``PAI_TRACE=1``) turns it on."""
+
+    trace_cfg = config.get("trace", {})
+    env_flag = os.getenv("PAI_TRACE")
+    enabled = env_flag not in {"0", "false", "no"} if env_flag is not None else bool(trace_cfg.get("enabled"))
+    if not enabled:
+        return None
+    root = Path(trace_cfg["path"]) if trace_cfg.get("path") else default_trace_dir(home)
+    if not root.is_absolute():
+        root = home / root
+    return TraceStore(
+        root,
+        max_bytes=int(trace_cfg.get("max_bytes", DEFAULT_MAX_BYTES)),
+        backups=int(trace_cfg.get("backups", DEFAULT_BACKUPS)),
+    )
@@ -0,0 +1,273 @@
+"""On-disk cache of synthesized speech, so repeated replies play without running the TTS engine."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import unicodedata
+import wave
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:  # pragma: no cover
+    from metrics import MetricsRegistry
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+PLAYBACK_CHUNK_FRAMES = 1024
+# Command-line players tried, in order, when pyaudio is not installed.
+PLAYERS = ("aplay", "paplay", "afplay")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Unicode NFC with whitespace collapsed; case is kept because it can change pronunciation."""
+
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class SpeechCache:
+    """Synthesized utterances as ``<sha256>.wav`` files under ``root``.
+
+    A hit refreshes the file mtime, and eviction removes the least recently
+    played files once the directory grows past ``max_bytes``, like the
+    Codex ``ResponseCache``.
+    """
+
+    def __init__(self, root: Path, *, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(text: str, settings: Dict[str, Any]) -> str:
+        """Hash the normalized text with the engine settings that change how it sounds."""
+
+        material = json.dumps({"text": normalize(text), "settings": settings}, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Path]:
+        path = self.entry_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, wav: Path) -> Optional[Path]:
+        """Move a freshly synthesized ``wav`` into the cache; ``None`` if it is not a readable WAV."""
+
+        try:
+            with wave.open(str(wav), "rb") as handle:
+                if not handle.getnframes():
+                    raise wave.Error("no audio frames")
+        except (OSError, EOFError, wave.Error) as exc:
+            LOGGER.warning("Not caching synthesized speech (%s); the TTS driver may not write WAV", exc)
+            wav.unlink(missing_ok=True)
+            return None
+        path = self.entry_path(key)
+        os.replace(wav, path)
+        self.evict(keep=path)
+        return path
+
+    def scratch_path(self, key: str) -> Path:
+        """Where the engine should write a new entry; ``put`` moves it into place atomically."""
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        return self.root / f".{key}.{os.getpid()}.tmp.wav"
+
+    def entry_path(self, key: str) -> Path:
+        return self.root / f"{key}.wav"
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """Drop least recently played entries (never ``keep``) until the cache is under ``max_bytes``."""
+
+        entries = []
+        for path in self.root.glob("*.wav"):
+            if path.name.startswith(".") or path == keep:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if keep is not None and keep.exists():
+            total += keep.stat().st_size
+        removed = 0
+        for _, size, path in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        entries = [path for path in self.root.glob("*.wav") if not path.name.startswith(".")]
+        return {
+            "entries": len(entries),
+            "bytes": sum(path.stat().st_size for path in entries if path.exists()),
+            "max_bytes": self.max_bytes,
+            "path": str(self.root),
+        }
+
+
+def can_play() -> bool:
+    """Whether ``play_wav`` has pyaudio or a command-line player to work with."""
+
+    try:
+        import pyaudio  # type: ignore  # noqa: F401
+    except ImportError:
+        return any(shutil.which(player) for player in PLAYERS)
+    return True
+
+
+def play_wav(path: Path) -> bool:
+    """Play a WAV file through pyaudio, or a command-line player; ``False`` if neither worked."""
+
+    try:
+        import pyaudio  # type: ignore
+    except ImportError:
+        pyaudio = None
+    if pyaudio is not None:
+        try:
+            with wave.open(str(path), "rb") as handle:
+                audio = pyaudio.PyAudio()
+                try:
+                    stream = audio.open(
+                        format=audio.get_format_from_width(handle.getsampwidth()),
+                        channels=handle.getnchannels(),
+                        rate=handle.getframerate(),
+                        output=True,
+                    )
+                    data = handle.readframes(PLAYBACK_CHUNK_FRAMES)
+                    while data:
+                        stream.write(data)
+                        data = handle.readframes(PLAYBACK_CHUNK_FRAMES)
+                    stream.stop_stream()
+                    stream.close()
+                finally:
+                    audio.terminate()
+            return True
+        except (OSError, EOFError, wave.Error) as exc:
+            LOGGER.warning("Cached speech playback failed: %s", exc)
+            return False
+    for player in PLAYERS:
+        binary = shutil.which(player)
+        if binary is None:
+            continue
+        import subprocess
+
+        result = subprocess.run([binary, str(path)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return result.returncode == 0
+    return False
+
+
+class CachedSpeaker:
+    """``speak(text)`` for voice.py that reuses cached audio for text it has said before.
+
+    A miss synthesizes the sentence to a WAV file with ``engine.save_to_file``
+    and plays it; a hit plays the cached file straight away. When nothing
+    can play WAV files, or the driver turns out not to write them, the
+    engine speaks directly and the cache is bypassed.
+    """
+
+    def __init__(
+        self,
+        engine: Any,
+        cache: SpeechCache,
+        *,
+        registry: Optional["MetricsRegistry"] = None,
+    ) -> None:
+        self.engine = engine
+        self.cache = cache
+        self.registry = registry
+        self.settings = engine_settings(engine)
+        self.active = can_play()
+        if not self.active:
+            LOGGER.warning("No WAV player (pyaudio, %s); speech will not be cached", ", ".join(PLAYERS))
+
+    def __call__(self, text: str) -> None:
+        if not normalize(text):
+            return
+        if not self.active:
+            self._say(text)
+            return
+        key = self.cache.make_key(text, self.settings)
+        path = self.cache.get(key)
+        self._count("tts_cache_hits" if path is not None else "tts_cache_misses")
+        if path is None:
+            path = self._synthesize(text, key)
+        if path is not None and play_wav(path):
+            return
+        self._say(text)
+
+    def _say(self, text: str) -> None:
+        self.engine.say(text)
+        self.engine.runAndWait()
+
+    def _synthesize(self, text: str, key: str) -> Optional[Path]:
+        scratch = self.cache.scratch_path(key)
+        try:
+            if self.registry is not None:
+                with self.registry.timer("tts_synthesis_seconds"):
+                    self._save(text, scratch)
+            else:
+                self._save(text, scratch)
+        except Exception as exc:  # pragma: no cover - driver-specific failures
+            LOGGER.warning("Speech synthesis to file failed: %s", exc)
+            scratch.unlink(missing_ok=True)
+            return None
+        path = self.cache.put(key, scratch)
+        if path is None:
+            # Drivers that write another format (AIFF on macOS) would pay for synthesis twice per miss.
+            self.active = False
+        return path
+
+    def _save(self, text: str, path: Path) -> None:
+        self.engine.save_to_file(text, str(path))
+        self.engine.runAndWait()
+
+    def _count(self, name: str) -> None:
+        if self.registry is not None:
+            self.registry.inc(name)
+
+
+def engine_settings(engine: Any) -> Dict[str, Any]:
+    """The pyttsx3 properties that change the audio: voice (driver-specific id), rate and volume."""
+
+    settings: Dict[str, Any] = {}
+    for name in ("voice", "rate", "volume"):
+        try:
+            settings[name] = engine.getProperty(name)
+        except Exception:  # pragma: no cover - drivers without the property
+            settings[name] = None
+    return settings
+
+
+def apply_settings(engine: Any, config: Dict[str, Any]) -> None:
+    """Set ``voice.tts.voice``/``rate``/``volume`` on the engine when configured."""
+
+    tts_cfg = config.get("voice", {}).get("tts", {})
+    for name in ("voice", "rate", "volume"):
+        if tts_cfg.get(name) is not None:
+            engine.setProperty(name, tts_cfg[name])
+
+
+def from_config(home: Path, config: Dict[str, Any]) -> Optional[SpeechCache]:
+    """Build the cache when ``voice.tts.cache`` is enabled; ``PAI_TTS_CACHE=0`` turns it off."""
+
+    cache_cfg = config.get("voice", {}).get("tts", {}).get("cache", {})
+    env_flag = os.getenv("PAI_TTS_CACHE")
+    enabled = env_flag not in {"0", "false", "no"} if env_flag is not None else bool(cache_cfg.get("enabled", True))
+    if not enabled:
+        return None
+    root = Path(cache_cfg.get("path") or home / "cache" / "tts")
+    if not root.is_absolute():
+        root = home / root
+    return SpeechCache(root, max_bytes=int(cache_cfg.get("max_bytes", DEFAULT_MAX_BYTES)))
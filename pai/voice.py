@@ -3,15 +3,19 @@
 from __future__ import annotations
 
 import argparse
+import functools
 import logging
 import os
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Callable, Iterator, List, Optional
 
-from server import PAIClient
+import stt
+from server import PAI_HOME, PAIClient
+
+if TYPE_CHECKING:  # pragma: no cover
+    from voice_capture import StreamingCapture, VADSettings
 
 LOGGER = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
 
 
 def _install_file_handler() -> None:
@@ -38,11 +42,25 @@ def check_dependencies() -> dict[str, bool]:
         "speech_recognition": _check_dependency("speech_recognition"),
         "pyttsx3": _check_dependency("pyttsx3"),
         "pyaudio": _check_dependency("pyaudio"),
+        "pocketsphinx": _check_dependency("pocketsphinx"),
     }
 
 
-def ensure_dependencies() -> None:
-    missing = [name for name, ok in check_dependencies().items() if not ok]
+def required_dependencies(backend: str, *, microphone: bool, mute: bool, stream: bool = False) -> List[str]:
+    """Packages this run needs: the STT backend's, plus the microphone and TTS ones when used."""
+
+    required = list(stt.BACKENDS[backend].requires)
+    if microphone:
+        # Streaming capture reads frames from pyaudio directly; the recognizer is not involved.
+        required += ["pyaudio"] if stream else ["speech_recognition", "pyaudio"]
+    if not mute:
+        required.append("pyttsx3")
+    return list(dict.fromkeys(required))
+
+
+def ensure_dependencies(required: Optional[List[str]] = None) -> None:
+    names = required if required is not None else ["speech_recognition", "pyttsx3", "pyaudio"]
+    missing = [name for name in names if not _check_dependency(name)]
     if missing:
         instructions = "\n".join(
             f"- pip install {name}" for name in missing
@@ -59,39 +77,58 @@ def interact(
     *,
     audio_file: Optional[Path] = None,
     mute: bool = False,
+    backend: Optional[stt.STTBackend] = None,
+    vad: Optional["VADSettings"] = None,
+    realtime: bool = False,
 ) -> None:
-    import speech_recognition as sr  # type: ignore
-    import pyttsx3  # type: ignore
+    backend = backend or stt.create(stt.DEFAULT_BACKEND)
+    speak = None if mute else _speaker(client)
 
-    recognizer = sr.Recognizer()
-    engine = None if mute else pyttsx3.init()
-
-    audio_data: Optional[sr.AudioData]
-    if audio_file:
+    audio_data: Any
+    utterances: Optional[Iterator[Any]] = None
+    if vad is not None:
+        capture = _streaming_capture([audio_file] if audio_file else None, vad, realtime=realtime, max_utterances=1)
+        if capture is None:
+            return
+        LOGGER.info("Listening for voice input")
+        # Keep the iterator referenced: closing it stops the capture thread.
+        utterances = iter(capture)
+        audio_data = next(utterances, None)
+        if audio_data is None:
+            LOGGER.error("No speech detected")
+            return
+    elif audio_file:
         path = Path(audio_file)
         if not path.exists():
             LOGGER.error("Audio file not found: %s", path)
             return
-        with sr.AudioFile(str(path)) as source:
-            LOGGER.info("Loading audio file: %s", path)
-            audio_data = recognizer.record(source)
+        LOGGER.info("Loading audio file: %s", path)
+        audio_data = path
     else:
+        import speech_recognition as sr  # type: ignore
+
         try:
             with sr.Microphone() as source:
                 LOGGER.info("Listening for voice input")
-                audio_data = recognizer.listen(source)
+                audio_data = sr.Recognizer().listen(source)
         except OSError as exc:
             LOGGER.error("Audio input unavailable: %s", exc)
             return
 
     try:
-        text = recognizer.recognize_google(audio_data)
-    except sr.UnknownValueError:
-        LOGGER.error("Could not understand audio input")
-        return
-    except sr.RequestError as exc:
+        if vad is not None:
+            text = backend.transcribe_stream(audio_data)
+        else:
+            text = backend.transcribe(audio_data)
+    except stt.TranscriptionError as exc:
         LOGGER.error("Speech recognition request failed: %s", exc)
         return
+    finally:
+        if utterances is not None:
+            utterances.close()
+    if not text:
+        LOGGER.error("Could not understand audio input")
+        return
 
     LOGGER.info("Transcribed input: %s", text)
     response = client.chat(text)
@@ -99,30 +136,230 @@ def interact(
         LOGGER.warning("No response choices returned")
         return
     message = response["choices"][0]["message"]["content"]
-    if engine is None:
+    if speak is None:
         LOGGER.info("Mute enabled; skipping audio playback")
         return
     try:
-        engine.say(message)
-        engine.runAndWait()
+        speak(message)
     except Exception as exc:  # pragma: no cover - runtime guard
         LOGGER.exception("Text-to-speech playback failed: %s", exc)
 
 
+def _say(engine: Any, sentence: str) -> None:
+    engine.say(sentence)
+    engine.runAndWait()
+
+
+def _speaker(client: PAIClient) -> Callable[[str], None]:
+    """pyttsx3 speech, replayed from the ``tts_cache`` WAV cache unless ``voice.tts.cache`` is off."""
+
+    import pyttsx3  # type: ignore
+
+    import tts_cache
+
+    engine = pyttsx3.init()
+    tts_cache.apply_settings(engine, client.config)
+    cache = tts_cache.from_config(PAI_HOME, client.config)
+    if cache is None:
+        return functools.partial(_say, engine)
+    return tts_cache.CachedSpeaker(engine, cache, registry=client.metrics)
+
+
+def _file_utterances(paths: List[Path]) -> Iterator[Path]:
+    for path in paths:
+        if not path.exists():
+            LOGGER.error("Audio file not found: %s", path)
+            continue
+        LOGGER.info("Loading audio file: %s", path)
+        yield path
+
+
+def _streaming_capture(
+    audio_files: Optional[List[Path]],
+    vad: "VADSettings",
+    *,
+    realtime: bool = False,
+    listening: Optional[Callable[[], bool]] = None,
+    max_utterances: Optional[int] = None,
+) -> Optional["StreamingCapture"]:
+    """VAD capture over ``audio_files`` (standing in for the microphone) or the microphone itself."""
+
+    from voice_capture import StreamingCapture, open_frames
+
+    try:
+        frames = open_frames(audio_files, vad, realtime=realtime)
+    except (OSError, ValueError) as exc:
+        LOGGER.error("Audio input unavailable: %s", exc)
+        return None
+    return StreamingCapture(frames, vad, listening=listening, max_utterances=max_utterances)
+
+
+def _microphone_utterances(session: Any, max_turns: Optional[int]) -> Iterator[Any]:
+    """Listen for utterances until stopped, pausing while the assistant speaks."""
+
+    import speech_recognition as sr  # type: ignore
+
+    recognizer = sr.Recognizer()
+    turns = 0
+    try:
+        with sr.Microphone() as source:
+            recognizer.adjust_for_ambient_noise(source, duration=0.5)
+            LOGGER.info("Listening for voice input (Ctrl-C to stop)")
+            while not session.stopped.is_set() and (max_turns is None or turns < max_turns):
+                session.quiet.wait()
+                try:
+                    audio = recognizer.listen(source, timeout=1)
+                except sr.WaitTimeoutError:
+                    continue
+                turns += 1
+                yield audio
+    except OSError as exc:
+        LOGGER.error("Audio input unavailable: %s", exc)
+
+
+def run_session(
+    client: PAIClient,
+    *,
+    audio_files: Optional[List[Path]] = None,
+    mute: bool = False,
+    project: Optional[str] = None,
+    max_turns: Optional[int] = None,
+    backend: Optional[stt.STTBackend] = None,
+    vad: Optional["VADSettings"] = None,
+    realtime: bool = False,
+) -> List[dict]:
+    """Continuous voice session; see ``voice_session.VoiceSession``. Returns per-turn timings."""
+
+    from voice_session import VoiceSession
+
+    backend = backend or stt.create(stt.DEFAULT_BACKEND)
+    speak = None if mute else _speaker(client)
+    transcribe = backend.transcribe_stream if vad is not None else backend.transcribe
+    session = VoiceSession(client, transcribe, speak, project=project)
+    source: Any
+    if vad is not None:
+        # A file does not hear the assistant, so only the microphone pauses while it speaks.
+        source = _streaming_capture(
+            audio_files,
+            vad,
+            realtime=realtime,
+            listening=None if audio_files else session.quiet.is_set,
+            max_utterances=max_turns,
+        )
+        if source is None:
+            return []
+    elif audio_files:
+        source = _file_utterances(audio_files)
+    else:
+        source = _microphone_utterances(session, max_turns)
+    turns = session.run(source)
+    for turn in turns:
+        LOGGER.info("Voice turn timings: %s", turn.to_payload())
+    return [turn.to_payload() for turn in turns]
+
+
+def run_audio_dir(
+    client: Optional[PAIClient],
+    directory: Path,
+    *,
+    backend: str,
+    language: str,
+    workers: int,
+    codex_concurrency: int,
+    project: Optional[str] = None,
+) -> int:
+    """Transcribe every WAV in ``directory`` (and send each to Codex); print JSON lines and a summary."""
+
+    import time
+
+    import voice_batch
+    from server import encode_json
+
+    paths = voice_batch.audio_files(directory)
+    if not paths:
+        LOGGER.error("No .wav files in %s", directory)
+        return 1
+    LOGGER.info("Transcribing %s files with %s on %s workers", len(paths), backend, workers)
+    started = time.perf_counter()
+    records = []
+    for record in voice_batch.run_batch(
+        client,
+        paths,
+        backend=backend,
+        language=language,
+        workers=workers,
+        codex_concurrency=codex_concurrency,
+        project=project,
+    ):
+        records.append(record)
+        print(encode_json(record), flush=True)
+    summary = voice_batch.summarize(records, time.perf_counter() - started)
+    LOGGER.info("Batch summary: %s", summary)
+    print(encode_json({"summary": summary}), flush=True)
+    return 1 if summary["failed"] else 0
+
+
 def main(argv: Optional[list[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
     parser = argparse.ArgumentParser(description="PAI Voice Interface")
     parser.add_argument("--check-deps", action="store_true", help="Verify required packages")
     parser.add_argument(
         "--audio-file",
         type=Path,
-        help="Use a prerecorded audio file instead of the system microphone.",
+        action="append",
+        help="Use a prerecorded audio file instead of the system microphone (repeat with --session).",
+    )
+    parser.add_argument(
+        "--session",
+        action="store_true",
+        help="Keep listening and answer each utterance, speaking replies sentence by sentence as they stream.",
+    )
+    parser.add_argument(
+        "--audio-dir",
+        type=Path,
+        help="Transcribe every .wav file in this directory in parallel and send each transcript to Codex.",
+    )
+    parser.add_argument(
+        "--stt",
+        choices=sorted(stt.BACKENDS),
+        help="Speech-to-text backend (default $PAI_STT, voice.stt, or google).",
+    )
+    parser.add_argument("--language", help="Recognition language (default voice.language or en-US).")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="--audio-dir: transcription processes (default voice.batch_workers).",
+    )
+    parser.add_argument(
+        "--transcribe-only",
+        action="store_true",
+        help="--audio-dir: print transcripts without calling Codex.",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Frame-based capture: detect speech by energy and stream each utterance to the STT backend "
+        "while it is spoken (--audio-file stands in for the microphone).",
+    )
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="--stream with --audio-file: feed the file at recording speed, like a live microphone.",
+    )
+    parser.add_argument("--project", help="Active project slug for session and batch prompts.")
+    parser.add_argument("--max-turns", type=int, help="End a microphone session after this many utterances.")
     parser.add_argument(
         "--mute",
         action="store_true",
         help="Skip audio playback (useful for automated tests).",
     )
     args = parser.parse_args(argv)
+    if args.audio_file and len(args.audio_file) > 1 and not args.session:
+        parser.error("multiple --audio-file values need --session")
+    if args.audio_dir and (args.audio_file or args.session):
+        parser.error("--audio-dir cannot be combined with --audio-file or --session")
+    if args.audio_dir and args.stream:
+        parser.error("--stream does not apply to --audio-dir")
 
     if args.check_deps:
         results = check_dependencies()
@@ -131,12 +368,63 @@ def main(argv: Optional[list[str]] = None) -> int:
             print(f"{name}: {status}")
         return 0
 
-    ensure_dependencies()
     if not os.getenv("PAI_HOME"):
         os.environ["PAI_HOME"] = str(os.path.dirname(__file__))
-    _install_file_handler()
     client = PAIClient()
-    interact(client, audio_file=args.audio_file, mute=args.mute)
+    voice_cfg = client.config.get("voice", {})
+    try:
+        backend_name = stt.backend_name(client.config, args.stt)
+    except ValueError as exc:
+        parser.error(str(exc))
+    language = args.language or voice_cfg.get("language", stt.DEFAULT_LANGUAGE)
+    microphone = not (args.audio_file or args.audio_dir)
+    ensure_dependencies(
+        required_dependencies(
+            backend_name,
+            microphone=microphone,
+            mute=args.mute or bool(args.audio_dir),
+            stream=args.stream,
+        )
+    )
+    _install_file_handler()
+
+    if args.audio_dir:
+        workers = args.workers or int(voice_cfg.get("batch_workers", os.cpu_count() or 1))
+        return run_audio_dir(
+            None if args.transcribe_only else client,
+            args.audio_dir,
+            backend=backend_name,
+            language=language,
+            workers=workers,
+            codex_concurrency=int(client.codex_cfg.get("max_concurrency", 4)),
+            project=args.project,
+        )
+    backend = stt.create(backend_name, language)
+    vad = None
+    if args.stream:
+        from voice_capture import VADSettings
+
+        vad = VADSettings.from_config(client.config)
+    if args.session:
+        run_session(
+            client,
+            audio_files=args.audio_file,
+            mute=args.mute,
+            project=args.project,
+            max_turns=args.max_turns,
+            backend=backend,
+            vad=vad,
+            realtime=args.realtime,
+        )
+        return 0
+    interact(
+        client,
+        audio_file=args.audio_file[0] if args.audio_file else None,
+        mute=args.mute,
+        backend=backend,
+        vad=vad,
+        realtime=args.realtime,
+    )
     return 0
 
 
@@ -0,0 +1,121 @@
+"""Batch transcription of recorded voice memos, overlapping speech-to-text with Codex replies."""
+
+from __future__ import annotations
+
+import logging
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
+
+import stt
+
+if TYPE_CHECKING:  # pragma: no cover
+    from server import PAIClient
+
+LOGGER = logging.getLogger(__name__)
+
+AUDIO_SUFFIXES = (".wav",)
+
+# One backend per worker process, built by ``_init_worker``.
+_BACKEND: Optional[stt.STTBackend] = None
+
+
+def audio_files(directory: Path) -> List[Path]:
+    return sorted(path for path in directory.iterdir() if path.suffix.lower() in AUDIO_SUFFIXES and path.is_file())
+
+
+def _init_worker(name: str, language: str) -> None:
+    global _BACKEND
+    _BACKEND = stt.create(name, language)
+
+
+def _transcribe_file(path: str) -> Dict[str, Any]:
+    assert _BACKEND is not None
+    started = time.perf_counter()
+    record: Dict[str, Any] = {"file": path, "transcript": None, "error": None}
+    try:
+        record["transcript"] = _BACKEND.transcribe(Path(path))
+    except stt.TranscriptionError as exc:
+        record["error"] = str(exc)
+    except Exception as exc:  # one bad file must not abort the whole directory
+        LOGGER.warning("Transcribing %s failed: %s", path, exc)
+        record["error"] = f"transcription failed: {stt.error_text(exc)}"
+    if record["transcript"] is None and record["error"] is None:
+        record["error"] = "no speech recognized"
+    record["stt_seconds"] = round(time.perf_counter() - started, 4)
+    return record
+
+
+def run_batch(
+    client: Optional["PAIClient"],
+    paths: Iterable[Path],
+    *,
+    backend: str,
+    language: str = stt.DEFAULT_LANGUAGE,
+    workers: int,
+    codex_concurrency: int,
+    project: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield one record per file as soon as it is done.
+
+    Files are transcribed on a process pool of ``workers`` (recognition is
+    CPU-bound, so threads would serialize on the GIL). Each transcript goes
+    to Codex the moment it is ready, with at most ``codex_concurrency``
+    chats in flight, so replies overlap the remaining transcription. With
+    ``client`` set to ``None`` only the transcripts are produced.
+    """
+
+    import multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+    def _reply(record: Dict[str, Any]) -> Dict[str, Any]:
+        assert client is not None
+        started = time.perf_counter()
+        data = client.chat(record["transcript"], project)
+        return dict(
+            record,
+            reply=data.get("last"),
+            error=data.get("error"),
+            codex_seconds=round(time.perf_counter() - started, 4),
+        )
+
+    # "spawn" keeps forked children from inheriting the client's threads and locks.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=max(workers, 1),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(backend, language),
+    ) as stt_pool, ThreadPoolExecutor(
+        max_workers=max(codex_concurrency, 1), thread_name_prefix="pai-voice-batch"
+    ) as codex_pool:
+        pending: "set[Future[Dict[str, Any]]]" = {stt_pool.submit(_transcribe_file, str(path)) for path in paths}
+        replies: "set[Future[Dict[str, Any]]]" = set()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                if future in replies or client is None or record["error"]:
+                    replies.discard(future)
+                    yield record
+                    continue
+                follow_up = codex_pool.submit(_reply, record)
+                replies.add(follow_up)
+                pending.add(follow_up)
+
+
+def summarize(records: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    from metrics import percentile
+
+    def _p50(key: str) -> Optional[float]:
+        value = percentile([record[key] for record in records if record.get(key) is not None], 0.5)
+        return round(value, 4) if value is not None else None
+
+    return {
+        "files": len(records),
+        "failed": sum(1 for record in records if record.get("error")),
+        "wall_seconds": round(wall, 4),
+        "stt_p50": _p50("stt_seconds"),
+        "codex_p50": _p50("codex_seconds"),
+        "files_per_second": round(len(records) / wall, 2) if wall > 0 else None,
+    }
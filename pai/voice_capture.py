@@ -0,0 +1,355 @@
+"""Frame-based streaming capture: an energy voice-activity detector cuts utterances out of a live stream."""
+
+from __future__ import annotations
+
+import logging
+import math
+import operator
+import queue
+import sys
+import threading
+import time
+import wave
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+SAMPLE_WIDTH = 2  # 16-bit signed PCM, mono
+DEFAULT_SAMPLE_RATE = 16000
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+@dataclass
+class VADSettings:
+    """Detector tuning; every field maps to a key of the ``voice.vad`` config section."""
+
+    frame_ms: int = 30
+    # A frame is voiced when its RMS exceeds both ``min_rms`` and ``ratio`` x the running noise floor.
+    min_rms: float = 500.0
+    ratio: float = 3.0
+    noise_adapt: float = 0.05
+    start_ms: int = 90
+    end_silence_ms: int = 600
+    pre_roll_ms: int = 300
+    max_utterance_seconds: float = 30.0
+    sample_rate: int = DEFAULT_SAMPLE_RATE
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "VADSettings":
+        section = config.get("voice", {}).get("vad", {})
+        defaults = cls()
+        values = {name: type(getattr(defaults, name))(section[name]) for name in vars(defaults) if name in section}
+        return cls(**values)
+
+    def frames(self, milliseconds: float) -> int:
+        return max(int(math.ceil(milliseconds / self.frame_ms)), 1)
+
+
+def frame_rms(frame: memoryview) -> float:
+    """Root-mean-square level of one 16-bit little-endian PCM frame."""
+
+    if _LITTLE_ENDIAN:
+        samples: Any = frame.cast("h")
+    else:  # pragma: no cover - big-endian hosts
+        samples = array("h", frame)
+        samples.byteswap()
+    if not len(samples):
+        return 0.0
+    return math.sqrt(sum(map(operator.mul, samples, samples)) / len(samples))
+
+
+class EnergyVAD:
+    """Per-frame speech/non-speech decision against an adaptive noise floor."""
+
+    def __init__(self, settings: VADSettings) -> None:
+        self.settings = settings
+        self.noise_floor = settings.min_rms / max(settings.ratio, 1.0)
+
+    def is_speech(self, frame: memoryview) -> bool:
+        level = frame_rms(frame)
+        threshold = max(self.settings.min_rms, self.settings.ratio * self.noise_floor)
+        if level > threshold:
+            return True
+        # Only non-speech frames move the floor, so a long utterance cannot raise its own threshold.
+        alpha = self.settings.noise_adapt
+        self.noise_floor = (1 - alpha) * self.noise_floor + alpha * level
+        return False
+
+
+class Utterance:
+    """Audio of one detected utterance in a buffer preallocated for the longest allowed one.
+
+    Capture appends frames while a consumer reads them through ``chunks``,
+    so transcription can start before the speaker has finished. ``source``
+    is the WAV file the utterance started in, when capture reads files.
+    """
+
+    def __init__(self, sample_rate: int, capacity: int, source: Optional[Path] = None) -> None:
+        self.sample_rate = sample_rate
+        self.source = source
+        self.sample_width = SAMPLE_WIDTH
+        self.started_at = time.perf_counter()
+        self.ended_at: Optional[float] = None
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._length = 0
+        self._closed = False
+        self._changed = threading.Condition()
+
+    @property
+    def full(self) -> bool:
+        return self._length >= len(self._buffer)
+
+    @property
+    def data(self) -> memoryview:
+        """The audio captured so far (all of it once ``wait`` returns)."""
+
+        return self._view[: self._length]
+
+    @property
+    def duration(self) -> float:
+        return self._length / float(self.sample_rate * self.sample_width)
+
+    def append(self, frame: memoryview) -> int:
+        """Copy as much of ``frame`` as fits; returns the number of bytes taken."""
+
+        count = min(len(frame), len(self._buffer) - self._length)
+        with self._changed:
+            self._view[self._length : self._length + count] = frame[:count]
+            self._length += count
+            self._changed.notify_all()
+        return count
+
+    def close(self) -> None:
+        with self._changed:
+            if not self._closed:
+                self._closed = True
+                self.ended_at = time.perf_counter()
+            self._changed.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until capture has closed the utterance; ``False`` on timeout."""
+
+        with self._changed:
+            return self._changed.wait_for(lambda: self._closed, timeout)
+
+    def chunks(self) -> Iterator[memoryview]:
+        """Yield newly captured audio as it arrives, until the utterance is closed."""
+
+        offset = 0
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._length > offset or self._closed)
+                end, closed = self._length, self._closed
+            if end > offset:
+                yield self._view[offset:end]
+                offset = end
+            elif closed:
+                return
+
+
+class WavFrames:
+    """Fixed-size frames read from 16-bit mono WAV files, standing in for a microphone.
+
+    With ``realtime`` the frames are paced at the recording's own speed, so
+    a file behaves like someone speaking into the microphone.
+    """
+
+    def __init__(self, paths: List[Path], frame_ms: int, *, realtime: bool = False) -> None:
+        if not paths:
+            raise ValueError("no audio files to stream")
+        rates = set()
+        for path in paths:
+            try:
+                with wave.open(str(path), "rb") as handle:
+                    if handle.getsampwidth() != SAMPLE_WIDTH or handle.getnchannels() != 1:
+                        raise ValueError(f"{path}: streaming capture needs 16-bit mono WAV")
+                    rates.add(handle.getframerate())
+            except (EOFError, wave.Error) as exc:
+                raise ValueError(f"{path}: not a readable WAV file ({str(exc) or 'truncated'})") from exc
+        if len(rates) > 1:
+            raise ValueError("streamed WAV files must share one sample rate")
+        self.paths = paths
+        self.current: Optional[Path] = None
+        self.sample_rate = rates.pop()
+        self.frame_samples = self.sample_rate * frame_ms // 1000
+        self.realtime = realtime
+
+    def __iter__(self) -> Iterator[memoryview]:
+        frame_bytes = self.frame_samples * SAMPLE_WIDTH
+        view = memoryview(bytearray(frame_bytes))
+        silence = bytes(frame_bytes)
+        started = time.perf_counter()
+        period = self.frame_samples / float(self.sample_rate)
+        index = 0
+        for path in self.paths:
+            LOGGER.info("Streaming audio file: %s", path)
+            self.current = path
+            with wave.open(str(path), "rb") as handle:
+                while True:
+                    data = handle.readframes(self.frame_samples)
+                    if not data:
+                        break
+                    view[: len(data)] = data
+                    view[len(data) :] = silence[len(data) :]
+                    index += 1
+                    if self.realtime:
+                        delay = started + index * period - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    yield view
+
+
+class MicrophoneFrames:
+    """Fixed-size frames from the default input device through ``pyaudio``."""
+
+    def __init__(self, frame_ms: int, sample_rate: int = DEFAULT_SAMPLE_RATE) -> None:
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+
+    def __iter__(self) -> Iterator[memoryview]:
+        import pyaudio  # type: ignore
+
+        audio = pyaudio.PyAudio()
+        stream = audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.sample_rate,
+            input=True,
+            frames_per_buffer=self.frame_samples,
+        )
+        view = memoryview(bytearray(self.frame_samples * SAMPLE_WIDTH))
+        try:
+            while True:
+                view[:] = stream.read(self.frame_samples, exception_on_overflow=False)
+                yield view
+        finally:
+            stream.stop_stream()
+            stream.close()
+            audio.terminate()
+
+
+class StreamingCapture:
+    """Iterates over utterances as soon as each one starts.
+
+    A capture thread reads ``frames`` (``WavFrames`` or ``MicrophoneFrames``),
+    runs the detector and copies voiced frames, plus ``pre_roll_ms`` of audio
+    before the onset, into the current ``Utterance``. An utterance opens after
+    ``start_ms`` of consecutive voiced frames and closes after
+    ``end_silence_ms`` of silence; one that reaches ``max_utterance_seconds``
+    is closed and the speech continues in a new one. Frames arriving while
+    ``listening()`` is false (the assistant is talking) are dropped.
+    """
+
+    def __init__(
+        self,
+        frames: Any,
+        settings: VADSettings,
+        *,
+        listening: Optional[Callable[[], bool]] = None,
+        max_utterances: Optional[int] = None,
+    ) -> None:
+        self.frames = frames
+        self.settings = settings
+        self.listening = listening
+        self.max_utterances = max_utterances
+        self.stopped = threading.Event()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def __iter__(self) -> Iterator[Utterance]:
+        found: "queue.Queue[Optional[Utterance]]" = queue.Queue()
+        thread = threading.Thread(target=self._run, args=(found,), name="pai-voice-vad", daemon=True)
+        thread.start()
+        try:
+            while True:
+                utterance = found.get()
+                if utterance is None:
+                    return
+                yield utterance
+        finally:
+            self.stop()
+
+    def _run(self, found: "queue.Queue[Optional[Utterance]]") -> None:
+        settings = self.settings
+        rate = self.frames.sample_rate
+        frame_bytes = self.frames.frame_samples * SAMPLE_WIDTH
+        capacity = int(settings.max_utterance_seconds * rate) * SAMPLE_WIDTH
+        start_frames = settings.frames(settings.start_ms)
+        end_frames = settings.frames(settings.end_silence_ms)
+        # Ring of the most recent frames before the onset (at least the ones that triggered it),
+        # replayed at the start of each utterance.
+        ring_frames = max(settings.frames(settings.pre_roll_ms), start_frames)
+        ring = memoryview(bytearray(ring_frames * frame_bytes))
+        ring_next = ring_count = 0
+
+        vad = EnergyVAD(settings)
+        current: Optional[Utterance] = None
+        voiced = silent = count = 0
+        source = iter(self.frames)
+        try:
+            for frame in source:
+                if self.stopped.is_set():
+                    break
+                if self.listening is not None and not self.listening():
+                    if current is not None:
+                        current.close()
+                        current = None
+                    voiced = silent = ring_count = 0
+                    continue
+                speech = vad.is_speech(frame)
+                if current is None:
+                    offset = ring_next * frame_bytes
+                    ring[offset : offset + frame_bytes] = frame
+                    ring_next = (ring_next + 1) % ring_frames
+                    ring_count = min(ring_count + 1, ring_frames)
+                    voiced = voiced + 1 if speech else 0
+                    if voiced < start_frames:
+                        continue
+                    current = Utterance(rate, capacity, getattr(self.frames, "current", None))
+                    for position in range(ring_count):
+                        slot = (ring_next - ring_count + position) % ring_frames
+                        current.append(ring[slot * frame_bytes : (slot + 1) * frame_bytes])
+                    ring_count = 0
+                    voiced = silent = 0
+                    count += 1
+                    LOGGER.info("Speech started (utterance %s)", count)
+                    found.put(current)
+                    continue
+                taken = current.append(frame)
+                silent = 0 if speech else silent + 1
+                if silent >= end_frames or current.full:
+                    current.close()
+                    LOGGER.info("Speech ended after %.2fs", current.duration)
+                    if current.full and speech:
+                        # Long dictation: carry on in a fresh utterance without waiting for a new onset.
+                        current = Utterance(rate, capacity, getattr(self.frames, "current", None))
+                        current.append(frame[taken:])
+                        count += 1
+                        found.put(current)
+                        continue
+                    current = None
+                    silent = 0
+                    if self.max_utterances is not None and count >= self.max_utterances:
+                        break
+        except Exception as exc:  # pragma: no cover - audio device errors end the capture
+            LOGGER.error("Streaming capture failed: %s", exc)
+        finally:
+            if current is not None:
+                current.close()
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+            found.put(None)
+
+
+def open_frames(audio_files: Optional[List[Path]], settings: VADSettings, *, realtime: bool = False) -> Any:
+    """``WavFrames`` over ``audio_files`` when given, else the microphone."""
+
+    if audio_files:
+        return WavFrames(audio_files, settings.frame_ms, realtime=realtime)
+    return MicrophoneFrames(settings.frame_ms, settings.sample_rate)
@@ -0,0 +1,282 @@
+"""Continuous voice session: capture, transcription, Codex and speech run as a pipeline."""
+
+from __future__ import annotations
+
+import logging
+import queue
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
+
+import metrics
+
+if TYPE_CHECKING:  # pragma: no cover
+    from server import PAIClient
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 2
+# A sentence ends at . ! ? (plus closing quotes/brackets) followed by whitespace, or at a line break.
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n+")
+MIN_SENTENCE_CHARS = 12
+
+Transcriber = Callable[[Any], Optional[str]]
+Speaker = Callable[[str], None]
+
+
+class SentenceSplitter:
+    """Turns streamed text into whole sentences as soon as each one is complete.
+
+    Fragments shorter than ``MIN_SENTENCE_CHARS`` ("Dr.", "1.") are held
+    back and joined to the next sentence so speech does not stutter.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        sentences: List[str] = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(self._buffer):
+            candidate = self._buffer[start:match.start()].strip()
+            if len(candidate) < MIN_SENTENCE_CHARS and "\n" not in match.group():
+                continue
+            if candidate:
+                sentences.append(candidate)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest or None
+
+
+@dataclass
+class TurnStats:
+    """Timings for one utterance, relative to the moment its capture finished."""
+
+    index: int
+    text: Optional[str] = None
+    sentences: int = 0
+    error: Optional[str] = None
+    captured_at: float = 0.0
+    transcribed: Optional[float] = None
+    first_sentence: Optional[float] = None
+    finished: Optional[float] = None
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "turn": self.index,
+            "text": self.text,
+            "sentences": self.sentences,
+            "error": self.error,
+            "transcribe_seconds": self.transcribed,
+            "first_audio_seconds": self.first_sentence,
+            "total_seconds": self.finished,
+        }
+
+
+@dataclass
+class _Utterance:
+    stats: TurnStats
+    payload: Any = None
+    sentences: "queue.Queue[Optional[str]]" = field(default_factory=queue.Queue)
+
+
+class VoiceSession:
+    """Keeps the recognizer, TTS engine and client warm across utterances.
+
+    ``run`` consumes ``source`` (audio items from a microphone loop or
+    files) on a capture thread; a transcription thread and a Codex thread
+    follow, joined by bounded queues. The Codex thread streams the reply
+    through ``chat_stream`` and hands each finished sentence to the calling
+    thread, which speaks it while the rest of the reply is still arriving.
+    The next utterance is transcribed and sent to Codex while the current
+    one is being spoken, so a turn costs roughly its slowest stage rather
+    than the sum of all of them.
+
+    ``quiet`` is set while nothing is being spoken; microphone sources wait
+    on it so the assistant does not transcribe itself.
+    """
+
+    def __init__(
+        self,
+        client: "PAIClient",
+        transcribe: Transcriber,
+        speak: Optional[Speaker],
+        *,
+        project: Optional[str] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        self.client = client
+        self.transcribe = transcribe
+        self.speak = speak
+        self.project = project
+        self.queue_size = max(queue_size, 1)
+        self.stopped = threading.Event()
+        self.quiet = threading.Event()
+        self.quiet.set()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def run(self, source: Iterable[Any]) -> List[TurnStats]:
+        """Process every utterance ``source`` yields; returns per-turn timings in order."""
+
+        captured: "queue.Queue[Optional[_Utterance]]" = queue.Queue(self.queue_size)
+        transcribed: "queue.Queue[Optional[_Utterance]]" = queue.Queue(self.queue_size)
+        # Utterances in spoken order; each carries its own sentence queue.
+        replies: "queue.Queue[Optional[_Utterance]]" = queue.Queue(self.queue_size)
+        stages = [
+            threading.Thread(target=self._capture, args=(source, captured), name="pai-voice-capture", daemon=True),
+            threading.Thread(target=self._transcribe, args=(captured, transcribed), name="pai-voice-stt", daemon=True),
+            threading.Thread(target=self._converse, args=(transcribed, replies), name="pai-voice-codex", daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+        turns: List[TurnStats] = []
+        try:
+            while True:
+                utterance = replies.get()
+                if utterance is None:
+                    break
+                self._play(utterance)
+                turns.append(utterance.stats)
+        except KeyboardInterrupt:
+            LOGGER.info("Voice session interrupted")
+        finally:
+            self.stop()
+            self.quiet.set()
+        return turns
+
+    # -- stages -------------------------------------------------------------------
+
+    def _capture(self, source: Iterable[Any], out: "queue.Queue[Optional[_Utterance]]") -> None:
+        index = 0
+        try:
+            for payload in source:
+                if self.stopped.is_set():
+                    break
+                index += 1
+                stats = TurnStats(index, captured_at=time.perf_counter())
+                LOGGER.info("Captured utterance %s", index)
+                self._put(out, _Utterance(stats, payload))
+        except Exception as exc:  # pragma: no cover - audio device errors end the session
+            LOGGER.error("Voice capture failed: %s", exc)
+        finally:
+            out.put(None)
+
+    def _transcribe(self, inbox: "queue.Queue[Optional[_Utterance]]", out: "queue.Queue[Optional[_Utterance]]") -> None:
+        try:
+            while True:
+                utterance = inbox.get()
+                if utterance is None:
+                    break
+                stats = utterance.stats
+                try:
+                    stats.text = self.transcribe(utterance.payload)
+                except Exception as exc:  # pragma: no cover - backend-specific failures
+                    stats.error = f"transcription failed: {exc}"
+                # Streamed utterances are queued at speech onset; time the turn from the end of speech.
+                stats.captured_at = getattr(utterance.payload, "ended_at", None) or stats.captured_at
+                stats.transcribed = _since(stats.captured_at)
+                utterance.payload = None
+                if stats.text:
+                    LOGGER.info("Transcribed input %s: %s", stats.index, stats.text)
+                else:
+                    LOGGER.warning("Utterance %s: %s", stats.index, stats.error or "could not understand audio")
+                self._put(out, utterance)
+        except Exception as exc:  # pragma: no cover - runtime guard
+            LOGGER.exception("Voice transcription stage failed: %s", exc)
+            self.stop()
+        finally:
+            out.put(None)
+
+    def _converse(self, inbox: "queue.Queue[Optional[_Utterance]]", out: "queue.Queue[Optional[_Utterance]]") -> None:
+        try:
+            while True:
+                utterance = inbox.get()
+                if utterance is None:
+                    break
+                # Queue the turn first so playback can start on its first sentence.
+                self._put(out, utterance)
+                try:
+                    if utterance.stats.text and not self.stopped.is_set():
+                        with metrics.labels(command="voice"):
+                            self._stream_reply(utterance)
+                except Exception as exc:
+                    LOGGER.exception("Codex reply failed for utterance %s: %s", utterance.stats.index, exc)
+                    utterance.stats.error = f"reply failed: {exc}"
+                finally:
+                    utterance.sentences.put(None)
+        finally:
+            out.put(None)
+
+    def _stream_reply(self, utterance: _Utterance) -> None:
+        splitter = SentenceSplitter()
+        streamed = ""
+        for event in self.client.chat_stream(utterance.stats.text or "", project=self.project):
+            if self.stopped.is_set():
+                break
+            kind = event.get("type")
+            if kind == "delta":
+                streamed += event["text"]
+                sentences = splitter.feed(event["text"])
+            elif kind == "message":
+                # A full message repeats any deltas already spoken; voice only the new part.
+                text = event["text"]
+                fresh = text[len(streamed):] if text.startswith(streamed) else "\n" + text
+                streamed = text
+                sentences = splitter.feed(fresh)
+            elif kind == "done":
+                utterance.stats.error = event.get("error")
+                if not streamed and event.get("last"):
+                    sentences = splitter.feed(event["last"])
+                else:
+                    sentences = []
+                rest = splitter.flush()
+                sentences += [rest] if rest else []
+            else:
+                continue
+            for sentence in sentences:
+                utterance.sentences.put(sentence)
+
+    def _play(self, utterance: _Utterance) -> None:
+        stats = utterance.stats
+        while True:
+            sentence = utterance.sentences.get()
+            if sentence is None:
+                break
+            if stats.first_sentence is None:
+                stats.first_sentence = _since(stats.captured_at)
+                self.client.metrics.observe("voice_first_audio_seconds", stats.first_sentence)
+            stats.sentences += 1
+            if self.speak is None:
+                LOGGER.info("Assistant: %s", sentence)
+                continue
+            self.quiet.clear()
+            try:
+                self.speak(sentence)
+            except Exception as exc:  # pragma: no cover - runtime guard
+                LOGGER.exception("Text-to-speech playback failed: %s", exc)
+            finally:
+                self.quiet.set()
+        stats.finished = _since(stats.captured_at)
+        self.client.metrics.observe("voice_turn_seconds", stats.finished)
+
+    def _put(self, out: "queue.Queue[Optional[_Utterance]]", item: _Utterance) -> None:
+        # Bounded queues apply back-pressure; keep checking for stop while waiting.
+        while not self.stopped.is_set():
+            try:
+                out.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+
+def _since(moment: float) -> float:
+    return round(time.perf_counter() - moment, 4)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Benchmark the search fallback scanners on a synthetic workspace."""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+PAI_DIR = Path(__file__).resolve().parents[1] / "pai"
+sys.path.insert(0, str(PAI_DIR))
+
+import fast_scan  # noqa: E402
+
+EXCLUDED_DIRS = {".git", "node_modules", "__pycache__"}
+TEXTUAL_SUFFIXES = {".md", ".txt", ".py", ".json"}
+WORDS = (
+    "atlas codex memory project schedule context voice search index token budget "
+    "summary archive backup prompt session daemon worker latency cache"
+).split()
+NEEDLE = "Needle-Marker-7f3a"
+
+
+def build_tree(root: Path, files: int, lines_per_file: int, needles: int, seed: int) -> None:
+    """Write ``files`` text files (plus a few binaries) with ``needles`` planted at random."""
+
+    rng = random.Random(seed)
+    needle_files = set(rng.sample(range(files), min(needles, files)))
+    suffixes = sorted(TEXTUAL_SUFFIXES)
+    for index in range(files):
+        directory = root / f"dir{index // 1000:03d}"
+        directory.mkdir(parents=True, exist_ok=True)
+        lines = [" ".join(rng.choices(WORDS, k=10)) for _ in range(lines_per_file)]
+        if index in needle_files:
+            lines[rng.randrange(lines_per_file)] += f" {NEEDLE.lower()}"
+        path = directory / f"file{index:06d}{suffixes[index % len(suffixes)]}"
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    (root / "dir000" / "blob.bin").write_bytes(os.urandom(4096))
+
+
+def legacy_fallback(root: Path, query: str, limit: int) -> List[Tuple[str, int]]:
+    """The pre-mmap fallback from ``pai/bin/tool``: serial, decode everything, first hit per file."""
+
+    results: List[Tuple[str, int]] = []
+    lowered = query.lower()
+    for current, dirs, files in os.walk(root):
+        rel_root = os.path.relpath(Path(current), root)
+        if rel_root == ".":
+            rel_root = ""
+        if any(rel_root == excluded or rel_root.startswith(f"{excluded}{os.sep}") for excluded in EXCLUDED_DIRS):
+            dirs[:] = []
+            continue
+        for name in files:
+            path = Path(current) / name
+            suffix = path.suffix.lower()
+            if suffix and suffix not in TEXTUAL_SUFFIXES:
+                continue
+            try:
+                text = path.read_text(encoding="utf-8")
+            except (UnicodeDecodeError, OSError):
+                continue
+            for idx, line in enumerate(text.splitlines(), start=1):
+                if lowered in line.lower():
+                    results.append((os.path.relpath(path, root), idx))
+                    break
+            if len(results) >= limit:
+                return results
+    return results
+
+
+def timed(label: str, func: Callable[[], list], repeat: int) -> Tuple[str, float, int]:
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = len(func())
+        best = min(best, time.perf_counter() - started)
+    return label, best, count
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=100_000, help="Synthetic files to generate (default 100k).")
+    parser.add_argument("--lines", type=int, default=40, help="Lines per file (default 40).")
+    parser.add_argument("--needles", type=int, default=25, help="Files containing the query (default 25).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per engine; the best time is reported.")
+    parser.add_argument("--workers", type=int, default=None, help="Scanner pool size.")
+    parser.add_argument("--root", help="Reuse or create the tree here instead of a temp directory.")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated tree.")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    root = Path(args.root) if args.root else Path(tempfile.mkdtemp(prefix="pai-bench-search-"))
+    try:
+        if not any(root.iterdir()):
+            print(f"[bench] generating {args.files} files under {root}", file=sys.stderr)
+            started = time.perf_counter()
+            build_tree(root, args.files, args.lines, args.needles, args.seed)
+            print(f"[bench] generated in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        # A limit above the needle count forces every engine to walk the whole tree.
+        limit = args.needles + 1
+        query = NEEDLE
+        rows = [
+            timed("legacy serial fallback", lambda: legacy_fallback(root, query, limit), args.repeat),
+            timed(
+                "mmap scan (threads)",
+                lambda: fast_scan.scan(root, query, limit=limit, excluded_dirs=EXCLUDED_DIRS, workers=args.workers),
+                args.repeat,
+            ),
+            timed(
+                "mmap scan (processes)",
+                lambda: fast_scan.scan(
+                    root,
+                    query,
+                    limit=limit,
+                    excluded_dirs=EXCLUDED_DIRS,
+                    workers=args.workers,
+                    use_processes=True,
+                ),
+                args.repeat,
+            ),
+        ]
+        baseline = rows[0][1]
+        print(f"{'engine':<24} {'best (s)':>10} {'matches':>8} {'speedup':>8}")
+        for label, seconds, count in rows:
+            print(f"{label:<24} {seconds:>10.3f} {count:>8} {baseline / seconds:>7.2f}x")
+        return 0
+    finally:
+        if not args.keep and not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main(sys.argv[1:]))
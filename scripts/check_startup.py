@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Profile PAI entry-point imports and fail when short CLI calls exceed a startup budget."""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PAI_DIR = Path(__file__).resolve().parents[1] / "pai"
+PAI_SH = PAI_DIR / "pai.sh"
+ENTRY_POINTS = ("server", "daemon", "scheduler", "voice", "optimize_memory", "async_client", "replay")
+BUDGET_COMMANDS: Tuple[Tuple[str, ...], ...] = (("--help",), ("load-context",))
+DEFAULT_BUDGET_MS = 100.0
+# Modules only some subcommands need; pulling one in on the short path is a regression.
+LAZY_MODULES = (
+    "subprocess",
+    "asyncio",
+    "sqlite3",
+    "tempfile",
+    "pexpect",
+    "concurrent.futures",
+    "http.server",
+    "hashlib",
+)
+
+
+def _environment(home: Path) -> Dict[str, str]:
+    env = os.environ.copy()
+    # Measure what users see: the warm-up run writes bytecode that later runs load.
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env.update(
+        {
+            "PAI_HOME": str(home),
+            "PYTHONPATH": f"{PAI_DIR}{os.pathsep}{env.get('PYTHONPATH', '')}",
+            "PAI_NO_DAEMON": "1",
+            "PAI_METRICS": "0",
+        }
+    )
+    return env
+
+
+def import_profile(module: str, env: Dict[str, str]) -> List[Tuple[int, int, str]]:
+    """``(self_us, cumulative_us, dotted_name_with_depth)`` rows from ``-X importtime``."""
+
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=PAI_DIR,
+        check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {completed.stderr.strip().splitlines()[-1:]}")
+    return _parse_importtime(completed.stderr)
+
+
+def _parse_importtime(text: str) -> List[Tuple[int, int, str]]:
+    rows = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # column header
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def _depth(name: str) -> int:
+    # importtime indents nested imports by two spaces after a single leading space.
+    return (len(name) - len(name.lstrip()) - 1) // 2
+
+
+def top_level(rows: List[Tuple[int, int, str]], module: str) -> Tuple[int, List[Tuple[int, str]]]:
+    """Total import time of ``module`` and its direct imports, heaviest first."""
+
+    # Rows are printed as imports finish, so a module's children precede it.
+    children: List[Tuple[int, str]] = []
+    for _, cumulative, name in rows:
+        depth = _depth(name)
+        if depth == 1:
+            children.append((cumulative, name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                return cumulative, sorted(children, reverse=True)
+            children = []
+    return 0, []
+
+
+def time_command(argv: Tuple[str, ...], env: Dict[str, str], runs: int) -> Tuple[float, List[str]]:
+    """Median wall time (ms) of ``pai.sh argv`` and the lazy modules it imported."""
+
+    samples: List[float] = []
+    for _ in range(runs + 1):
+        started = time.perf_counter()
+        completed = subprocess.run(["bash", str(PAI_SH), *argv], capture_output=True, env=env, check=False)
+        samples.append((time.perf_counter() - started) * 1000)
+        if completed.returncode != 0:
+            raise RuntimeError(f"pai.sh {' '.join(argv)} exited {completed.returncode}: {completed.stderr[-400:]!r}")
+    traced = subprocess.run(
+        [sys.executable, "-X", "importtime", str(PAI_DIR / "cli.py"), *argv],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=False,
+    )
+    imported = {name.strip() for _, _, name in _parse_importtime(traced.stderr)}
+    # The first run warms the page cache and bytecode and is discarded.
+    return statistics.median(samples[1:]), [module for module in LAZY_MODULES if module in imported]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("PAI_STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS)),
+        help=f"Median wall-time budget per command (default $PAI_STARTUP_BUDGET_MS or {DEFAULT_BUDGET_MS:g}).",
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per command (default 5).")
+    parser.add_argument("--top", type=int, default=8, help="Heaviest direct imports to list per entry point.")
+    parser.add_argument("--profile-only", action="store_true", help="Print the import profile and skip the budget.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args(argv)
+
+    failures: List[str] = []
+    report: Dict[str, object] = {"imports": {}, "commands": {}, "budget_ms": args.budget_ms}
+    with tempfile.TemporaryDirectory(prefix="pai-startup-") as workdir:
+        home = Path(workdir)
+        for name in ("config.json", "context.md", "memory.md"):
+            if (PAI_DIR / name).exists():
+                (home / name).write_bytes((PAI_DIR / name).read_bytes())
+        env = _environment(home)
+
+        for module in ENTRY_POINTS:
+            total, children = top_level(import_profile(module, env), module)
+            report["imports"][module] = {  # type: ignore[index]
+                "total_ms": round(total / 1000, 2),
+                "top": [{"module": child, "ms": round(us / 1000, 2)} for us, child in children[: args.top]],
+            }
+
+        if not args.profile_only:
+            for command in BUDGET_COMMANDS:
+                median_ms, eager = time_command(command, env, args.runs)
+                label = " ".join(command)
+                report["commands"][label] = {  # type: ignore[index]
+                    "median_ms": round(median_ms, 1),
+                    "lazy_modules_imported": eager,
+                }
+                if median_ms > args.budget_ms:
+                    failures.append(f"pai.sh {label}: {median_ms:.1f} ms over the {args.budget_ms:g} ms budget")
+                if eager:
+                    failures.append(f"pai.sh {label} imported {', '.join(eager)}; import them where they are used")
+
+    report["failures"] = failures
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for module, profile in report["imports"].items():  # type: ignore[union-attr]
+            heaviest = ", ".join(f"{item['module']} {item['ms']:.1f}" for item in profile["top"])
+            print(f"import {module:<16} {profile['total_ms']:>7.1f} ms  ({heaviest})")
+        for label, result in report["commands"].items():  # type: ignore[union-attr]
+            print(f"pai.sh {label:<14} {result['median_ms']:>7.1f} ms median (budget {args.budget_ms:g} ms)")
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Load-test the PAI orchestration layer against the bundled Codex stub."""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+PAI_DIR = Path(__file__).resolve().parents[1] / "pai"
+STUB_BIN = PAI_DIR / "bin" / "codex-stub"
+TARGETS = ("chat", "run-tool", "scheduler", "dispatcher")
+sys.path.insert(0, str(PAI_DIR))
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Point every client at the stub and turn off anything that would skip or skew work."""
+
+    os.environ.update(
+        {
+            "CODEX_BIN": str(STUB_BIN),
+            "PAI_STUB_LATENCY": args.latency,
+            "PAI_STUB_FIRST_EVENT": str(args.first_event),
+            "PAI_STUB_EVENTS": str(args.events),
+            "PAI_STUB_PAYLOAD_BYTES": str(args.payload_bytes),
+            "PAI_STUB_ERROR_RATE": str(args.error_rate),
+            "PAI_STUB_SEED": str(args.seed),
+            "PAI_CACHE": "0",
+            "PAI_TRACE": "0",
+            "PAI_METRICS": "0",
+            "PAI_CODEX_POOL": "1" if args.pool else "0",
+            "PAI_NO_DAEMON": "1",
+        }
+    )
+
+
+def drive(call: Callable[[int], bool], requests: int, concurrency: int) -> Tuple[List[float], int, float]:
+    """Run ``call(i)`` ``requests`` times on ``concurrency`` threads; returns latencies, errors, wall."""
+
+    def timed(index: int) -> Tuple[float, bool]:
+        started = time.perf_counter()
+        ok = call(index)
+        return time.perf_counter() - started, ok
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="pai-load") as pool:
+        results = list(pool.map(timed, range(requests)))
+    wall = time.perf_counter() - wall_started
+    return [latency for latency, _ in results], sum(1 for _, ok in results if not ok), wall
+
+
+def chat_target(args: argparse.Namespace) -> Callable[[int], bool]:
+    if args.mode == "cli":
+        return _cli_call(["chat", "Load test prompt {index}"])
+    from server import PAIClient
+
+    client = PAIClient()
+    if client.pool is not None:
+        client.pool.warm()
+    return lambda index: client.chat(f"Load test prompt {index}").get("error") is None
+
+
+def run_tool_target(args: argparse.Namespace) -> Callable[[int], bool]:
+    # create_image has no local handler, so every call is a Codex run.
+    params = '{{"prompt": "load test {index}"}}'
+    if args.mode == "cli":
+        return _cli_call(["run-tool", "create_image", "--params", params])
+    from server import PAIClient
+
+    client = PAIClient()
+    if client.pool is not None:
+        client.pool.warm()
+    return lambda index: client.run_tool("create_image", {"prompt": f"load test {index}"}).get("error") is None
+
+
+def dispatcher_target(args: argparse.Namespace) -> Callable[[int], bool]:
+    from tool_registry import ToolExecutionError, ToolRegistry
+
+    config = json.loads((PAI_DIR / "config.json").read_text(encoding="utf-8"))
+    registry = ToolRegistry(config, PAI_DIR)
+    queries = ("context", "schedule", "memory", "voice", "budget")
+
+    def call(index: int) -> bool:
+        try:
+            registry.run_local("search", {"query": queries[index % len(queries)], "max_results": 5})
+        except ToolExecutionError:
+            return False
+        return True
+
+    return call
+
+
+def _cli_call(template: List[str]) -> Callable[[int], bool]:
+    """End-to-end: a fresh CLI process per request, as ``pai.sh`` runs it."""
+
+    def call(index: int) -> bool:
+        argv = [part.format(index=index) for part in template]
+        completed = subprocess.run(
+            [sys.executable, str(PAI_DIR / "cli.py"), *argv],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        try:
+            return completed.returncode == 0 and json.loads(completed.stdout).get("ok", False)
+        except json.JSONDecodeError:
+            return False
+
+    return call
+
+
+def scheduler_run(args: argparse.Namespace) -> Dict[str, object]:
+    """Register ``--jobs`` interval jobs on a temp queue and measure due-to-finish latency.
+
+    Latency runs from each queue entry's due time to the end of its run, so
+    it covers queue wait plus the chat itself (reported as ``run_p95``).
+    """
+
+    from metrics import latency_report
+    from scheduler_engine import Interval, Job, JobStore, SchedulerEngine
+    from server import PAIClient
+
+    client = PAIClient()
+    run_times: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    completed = 0
+
+    with tempfile.TemporaryDirectory(prefix="pai-load-scheduler-") as workdir:
+        store = JobStore(Path(workdir) / "scheduler.sqlite")
+        engine = SchedulerEngine(store, workers=args.concurrency)
+
+        def make_job(name: str) -> Callable[[], None]:
+            def run() -> None:
+                nonlocal completed, errors
+                started = time.perf_counter()
+                data = client.chat(f"Scheduled load test {name}")
+                with lock:
+                    run_times.append(time.perf_counter() - started)
+                    completed += 1
+                    errors += 1 if data.get("error") else 0
+                    if completed >= args.requests:
+                        engine.stop()
+
+            return run
+
+        for index in range(args.jobs):
+            engine.add(Job(f"load_{index}", make_job(f"load_{index}"), Interval(args.job_interval)))
+        runner = threading.Thread(target=engine.run, daemon=True)
+        wall_started = time.perf_counter()
+        runner.start()
+        runner.join(timeout=args.timeout)
+        engine.stop()
+        runner.join()
+        wall = time.perf_counter() - wall_started
+        history = store.history(limit=args.requests * 2)
+        store.close()
+
+    latencies = [row["finished"] - row["due"] for row in history]
+    waits = [row["started"] - row["due"] for row in history if row["started"]]
+    report = latency_report(latencies, wall)
+    report.update(
+        {"errors": errors, "jobs": args.jobs, "queue_wait_p95": _p95(waits), "run_p95": _p95(run_times)}
+    )
+    return report
+
+
+def _p95(values: List[float]) -> Optional[float]:
+    from metrics import percentile
+
+    value = percentile(values, 0.95)
+    return round(value, 6) if value is not None else None
+
+
+def run_target(target: str, args: argparse.Namespace) -> Dict[str, object]:
+    from metrics import latency_report
+
+    if target == "scheduler":
+        return scheduler_run(args)
+    factory = {"chat": chat_target, "run-tool": run_tool_target, "dispatcher": dispatcher_target}[target]
+    call = factory(args)
+    if args.warmup:
+        drive(call, args.warmup, args.concurrency)
+    latencies, errors, wall = drive(call, args.requests, args.concurrency)
+    report = latency_report(latencies, wall)
+    report["errors"] = errors
+    return report
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    # No ``choices`` here: argparse rejects an empty ``nargs="*"`` list against them.
+    parser.add_argument("targets", nargs="*", help=f"What to drive: {', '.join(TARGETS)} (default: all).")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per target (default 100).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight (default 8).")
+    parser.add_argument("--warmup", type=int, default=0, help="Untimed requests before measuring.")
+    parser.add_argument(
+        "--mode",
+        choices=("inprocess", "cli"),
+        default="inprocess",
+        help="Call PAIClient directly or spawn pai/cli.py per request (chat/run-tool only).",
+    )
+    parser.add_argument("--pool", action="store_true", help="Route Codex calls through the session pool.")
+    parser.add_argument("--latency", default="0.2", help="Stub seconds per turn, or min-max (default 0.2).")
+    parser.add_argument("--first-event", type=float, default=0.05, help="Stub seconds to first event.")
+    parser.add_argument("--events", type=int, default=8, help="Stub delta events per turn.")
+    parser.add_argument("--payload-bytes", type=int, default=512, help="Stub final message size.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Stub failure probability.")
+    parser.add_argument("--jobs", type=int, default=10, help="Scheduler: interval jobs to register.")
+    parser.add_argument("--job-interval", type=float, default=0.5, help="Scheduler: seconds between runs of a job.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Scheduler: give up after this many seconds.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args(argv)
+    unknown = [target for target in args.targets if target not in TARGETS]
+    if unknown:
+        parser.error(f"unknown target(s): {', '.join(unknown)}")
+    return args
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+    reports = {target: run_target(target, args) for target in args.targets or TARGETS}
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return 0
+    print(f"{'target':<12} {'calls':>6} {'errors':>6} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} {'req/s':>8}")
+    for target, report in reports.items():
+        print(
+            f"{target:<12} {report['calls']:>6} {report['errors']:>6} {report['p50'] or 0:>9.4f} "
+            f"{report['p95'] or 0:>9.4f} {report['p99'] or 0:>9.4f} {report['throughput_per_second'] or 0:>8.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main(sys.argv[1:]))